@@ -23,8 +23,10 @@ from oslo.config import cfg
 
 from ceilometer.openstack.common import context
 from ceilometer.openstack.common import log
+from ceilometer.openstack.common import loopingcall
 from ceilometer import pipeline
 from ceilometer import publisher
+from ceilometer import service  # For cfg.CONF.periodic_interval
 from ceilometer import transformer
 
 LOG = log.getLogger(__name__)
@@ -37,9 +39,12 @@ class PollingTask(object):
     def __init__(self, agent_manager):
         self.manager = agent_manager
         self.pollsters = set()
+        # Counters are held across cycles by the manager buffer, when
+        # publish_coalesce_max_latency enables one
         self.publish_context = pipeline.PublishContext(
             agent_manager.context,
-            cfg.CONF.counter_source)
+            cfg.CONF.counter_source,
+            buffer=agent_manager.pipeline_manager.buffer)
 
     def add(self, pollster, pipelines):
         self.publish_context.add_pipelines(pipelines)
@@ -65,6 +70,8 @@ class AgentManager(object):
         self.pollster_manager = extension_manager
 
         self.context = context.RequestContext('admin', 'admin', is_admin=True)
+        self.polling_tasks = {}
+        self.flush_interval = None
 
     @abc.abstractmethod
     def create_polling_task(self):
@@ -86,12 +93,65 @@ class AgentManager(object):
 
         return polling_tasks
 
+    def _setup_timers(self):
+        """Start the timers of the polling tasks and of the flush.
+
+        Called again after a pipeline reload, in which case only the
+        timers whose interval appeared are added. Tasks of intervals
+        still in use are updated in place, and tasks of intervals no
+        longer in use are emptied, which stops their timer.
+        """
+        polling_tasks = self.setup_polling_tasks()
+        for interval, task in self.polling_tasks.items():
+            if interval not in polling_tasks:
+                task.pollsters = set()
+                del self.polling_tasks[interval]
+        for interval, task in polling_tasks.iteritems():
+            current = self.polling_tasks.get(interval)
+            if current is None:
+                self.polling_tasks[interval] = task
+                self.service.tg.add_timer(interval,
+                                          self.interval_task,
+                                          task=task)
+            else:
+                current.pollsters = task.pollsters
+                current.publish_context = task.publish_context
+
+        flush_interval = self.pipeline_manager.get_flush_interval()
+        if flush_interval != self.flush_interval:
+            self.flush_interval = flush_interval
+            if flush_interval:
+                self.service.tg.add_timer(flush_interval,
+                                          self.flush_task,
+                                          flush_interval=flush_interval)
+
     def initialize_service_hook(self, service):
         self.service = service
-        for interval, task in self.setup_polling_tasks().iteritems():
-            self.service.tg.add_timer(interval,
-                                      self.interval_task,
-                                      task=task)
+        self._setup_timers()
+        if cfg.CONF.pipeline_reload_interval > 0:
+            self.service.tg.add_timer(cfg.CONF.pipeline_reload_interval,
+                                      self.reload_pipeline)
+        self.service.tg.add_timer(cfg.CONF.periodic_interval,
+                                  self.log_stats)
+
+    def log_stats(self):
+        stats = self.pipeline_manager.publisher_manager.get_stats()
+        if stats:
+            LOG.info('Publishers: %s', stats)
+
+    def reload_pipeline(self):
+        if self.pipeline_manager.reload(self.context,
+                                        cfg.CONF.counter_source):
+            self._setup_timers()
+
+    def flush_task(self, flush_interval):
+        if flush_interval != self.flush_interval:
+            # Superseded by a timer with the new interval
+            raise loopingcall.LoopingCallDone()
+        self.pipeline_manager.flush(self.context, cfg.CONF.counter_source)
 
     def interval_task(self, task):
+        if not task.pollsters:
+            # The task has been dropped by a pipeline reload
+            raise loopingcall.LoopingCallDone()
         task.poll_and_publish()
@@ -41,17 +41,20 @@ class PollingTask(agent.PollingTask):
     def poll_and_publish(self):
         """Tasks to be run at a periodic interval."""
         with self.publish_context as publisher:
+            # Counters of the whole cycle are published at once
+            counters = []
             # TODO(yjiang5) passing counters into get_counters to avoid
             # polling all counters one by one
             for pollster in self.pollsters:
                 try:
                     LOG.info("Polling pollster %s", pollster.name)
-                    publisher(list(pollster.obj.get_counters(
+                    counters.extend(list(pollster.obj.get_counters(
                         self.manager)))
                 except Exception as err:
                     LOG.warning('Continue after error from %s: %s',
                                 pollster.name, err)
                     LOG.exception(err)
+            publisher(counters)
 
 
 class AgentManager(agent.AgentManager):
@@ -0,0 +1,145 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Encode metering messages for the wire.
+
+A batch of meters is encoded as a table, the field names listed once
+followed by one row of values per meter, serialized with compact JSON
+or msgpack. Payloads over a size threshold are compressed with zlib.
+encode() base64 encodes the result so it can travel in an RPC
+message, dumps() returns it as is for binary transports.
+"""
+
+import base64
+import json
+import zlib
+
+from oslo.config import cfg
+
+from ceilometer.openstack.common import jsonutils
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+OPTS = [
+    cfg.StrOpt('metering_codec',
+               default='none',
+               help='Codec used to send metering messages to the '
+               'collector: none, json or msgpack. Collectors older '
+               'than this release only understand none'),
+    cfg.IntOpt('metering_compress_threshold',
+               default=1024,
+               help='Encoded metering batches larger than this number of '
+               'bytes are compressed, 0 disables compression'),
+]
+
+cfg.CONF.register_opts(OPTS)
+
+
+def _json_dumps(value):
+    return json.dumps(value, separators=(',', ':'),
+                      default=jsonutils.to_primitive)
+
+
+def _msgpack_dumps(value):
+    return msgpack.packb(value, default=jsonutils.to_primitive)
+
+
+def _msgpack_loads(data):
+    try:
+        return msgpack.unpackb(data, raw=False)
+    except TypeError:
+        # msgpack < 0.5
+        return msgpack.unpackb(data, encoding='utf-8')
+
+
+CODECS = {
+    'json': (_json_dumps, json.loads),
+    'msgpack': (_msgpack_dumps, _msgpack_loads),
+}
+
+
+def _get_codec(name):
+    if name not in CODECS:
+        raise ValueError('Unknown metering codec %s' % name)
+    if name == 'msgpack' and msgpack is None:
+        raise ValueError('The msgpack codec needs the msgpack module')
+    return CODECS[name]
+
+
+def dumps(meters, codec, threshold=None):
+    """Serialize a list of meters.
+
+    :param meters: meter dictionaries, as made by
+                   ceilometer.collector.meter.meter_message_from_counter
+    :param codec: name of the codec.
+    :param threshold: compress payloads larger than this number of
+                      bytes, metering_compress_threshold if not given.
+    :returns: a (payload, compressed) tuple.
+    """
+    dumps, _loads = _get_codec(codec)
+    if threshold is None:
+        threshold = cfg.CONF.metering_compress_threshold
+    fields = sorted(meters[0]) if meters else []
+    keys = frozenset(fields)
+    if all(len(m) == len(keys) and keys.issuperset(m) for m in meters):
+        table = {'fields': fields,
+                 'rows': [[m[f] for f in fields] for m in meters]}
+    else:
+        # Meters do not all have the same fields, send them as they are
+        table = {'meters': meters}
+    payload = dumps(table)
+    compressed = bool(threshold) and len(payload) > threshold
+    if compressed:
+        payload = zlib.compress(payload)
+    return payload, compressed
+
+
+def loads(codec, payload, compressed=False):
+    """Deserialize meters serialized by dumps().
+
+    :returns: the list of meter dictionaries.
+    """
+    _dumps, loads = _get_codec(codec)
+    if compressed:
+        payload = zlib.decompress(payload)
+    table = loads(payload)
+    if 'meters' in table:
+        return table['meters']
+    fields = table['fields']
+    return [dict(zip(fields, row)) for row in table['rows']]
+
+
+def encode(meters, codec, threshold=None):
+    """Encode a list of meters for an RPC message.
+
+    :param meters: meter dictionaries.
+    :param codec: name of the codec.
+    :param threshold: compression threshold, see dumps().
+    :returns: the arguments of a record_metering_data_encoded call.
+    """
+    payload, compressed = dumps(meters, codec, threshold)
+    return {'codec': codec,
+            'compressed': compressed,
+            'payload': base64.b64encode(payload)}
+
+
+def decode(codec, payload, compressed=False):
+    """Decode meters encoded by encode().
+
+    :returns: the list of meter dictionaries.
+    """
+    return loads(codec, base64.b64decode(payload), compressed)
@@ -20,17 +20,41 @@
 
 import hashlib
 import hmac
+import json
 import uuid
 
 from oslo.config import cfg
 
+from ceilometer.openstack.common import jsonutils
+
 METER_OPTS = [
     cfg.StrOpt('metering_secret',
                default='change this or be hacked',
                help='Secret value for signing metering messages',
                ),
+    cfg.IntOpt('metering_signature_version',
+               default=1,
+               help='Version of the signature of the metering messages '
+               'published. Version 2 is faster to compute, and is '
+               'verified by collectors of this release onward, which '
+               'also keep verifying version 1 signatures',
+               ),
+    cfg.BoolOpt('metering_metadata_by_reference',
+                default=False,
+                help='Send a digest in place of resource metadata already '
+                'sent in full in the same batch. Needs collectors of this '
+                'release onward',
+                ),
 ]
 
+# Prefix of version 2 signatures, version 1 ones are bare hex digests
+SIGNATURE_V2_PREFIX = 'v2:'
+
+# Message fields replacing or annotating resource_metadata on the wire,
+# removed before the signature is verified
+METADATA_REF = 'resource_metadata_ref'
+METADATA_DIGEST = 'resource_metadata_digest'
+
 
 def register_opts(config):
     """Register the options for signing metering messages.
@@ -72,13 +96,103 @@ def compute_signature(message, secret):
     return digest_maker.hexdigest()
 
 
+def _canonical_message(message):
+    """Return the canonical serialization of a message dictionary.
+
+    This is compact JSON with sorted keys, the signature excluded.
+    Values are converted like the RPC layer converts them, so the
+    serialization is the same before and after a trip on the bus.
+    """
+    if 'message_signature' in message:
+        message = dict((k, v) for k, v in message.iteritems()
+                       if k != 'message_signature')
+    return json.dumps(message, sort_keys=True, separators=(',', ':'),
+                      default=jsonutils.to_primitive)
+
+
+def compute_signatures_v2(messages, secret):
+    """Return the version 2 signatures of a list of message dictionaries.
+
+    A version 2 signature is the HMAC of the canonical serialization of
+    the message, so the message is hashed in a single update. The HMAC
+    keyed with secret is set up once for the whole list.
+    """
+    keyed = hmac.new(secret, '', hashlib.sha256)
+    signatures = []
+    for message in messages:
+        digest_maker = keyed.copy()
+        digest_maker.update(_canonical_message(message))
+        signatures.append(SIGNATURE_V2_PREFIX + digest_maker.hexdigest())
+    return signatures
+
+
+def compute_signature_v2(message, secret):
+    """Return the version 2 signature for a message dictionary.
+    """
+    return compute_signatures_v2([message], secret)[0]
+
+
+def sign_messages(messages, secret, version=None):
+    """Set the signature of a list of message dictionaries.
+
+    :param version: signature version, metering_signature_version when
+                    not given.
+    """
+    if version is None:
+        version = cfg.CONF.metering_signature_version
+    if version == 2:
+        signatures = compute_signatures_v2(messages, secret)
+    elif version == 1:
+        signatures = [compute_signature(m, secret) for m in messages]
+    else:
+        raise ValueError('Unknown signature version %s' % version)
+    for message, signature in zip(messages, signatures):
+        message['message_signature'] = signature
+
+
+def verify_signatures(messages, secret):
+    """Check the signatures of a list of messages.
+
+    Version 1 and version 2 signatures are both accepted.
+
+    :returns: a list of booleans, True for messages correctly signed.
+    """
+    results = []
+    v2 = []
+    for i, message in enumerate(messages):
+        signature = message.get('message_signature')
+        if (isinstance(signature, basestring) and
+                signature.startswith(SIGNATURE_V2_PREFIX)):
+            v2.append(i)
+            results.append(None)
+        else:
+            results.append(compute_signature(message, secret) == signature)
+    signatures = compute_signatures_v2([messages[i] for i in v2], secret)
+    for i, signature in zip(v2, signatures):
+        results[i] = signature == messages[i]['message_signature']
+    return results
+
+
 def verify_signature(message, secret):
     """Check the signature in the message against the value computed
     from the rest of the contents.
     """
-    old_sig = message.get('message_signature')
-    new_sig = compute_signature(message, secret)
-    return new_sig == old_sig
+    return verify_signatures([message], secret)[0]
+
+
+def _meter_message(counter, source):
+    return {'source': source,
+            'counter_name': counter.name,
+            'counter_type': counter.type,
+            'counter_unit': counter.unit,
+            'counter_volume': counter.volume,
+            'user_id': counter.user_id,
+            'project_id': counter.project_id,
+            'resource_id': counter.resource_id,
+            'timestamp': counter.timestamp,
+            'resource_metadata': counter.resource_metadata,
+            'message_id': str(uuid.uuid1()),
+            }
 
 
 def meter_message_from_counter(counter, secret, source):
@@ -86,18 +200,83 @@ def meter_message_from_counter(counter, secret, source):
 
     Returns a dictionary containing a metering message
     for a notification message and a Counter instance.
+    The message is not signed if secret is None.
     """
-    msg = {'source': source,
-           'counter_name': counter.name,
-           'counter_type': counter.type,
-           'counter_unit': counter.unit,
-           'counter_volume': counter.volume,
-           'user_id': counter.user_id,
-           'project_id': counter.project_id,
-           'resource_id': counter.resource_id,
-           'timestamp': counter.timestamp,
-           'resource_metadata': counter.resource_metadata,
-           'message_id': str(uuid.uuid1()),
-           }
-    msg['message_signature'] = compute_signature(msg, secret)
+    msg = _meter_message(counter, source)
+    if secret is not None:
+        sign_messages([msg], secret)
     return msg
+
+
+def meter_messages_from_counters(counters, secret, source):
+    """Make metering messages for a list of counters, signed in a batch.
+
+    The messages are not signed if secret is None.
+    """
+    msgs = [_meter_message(counter, source) for counter in counters]
+    if secret is not None:
+        sign_messages(msgs, secret)
+    return msgs
+
+
+def metadata_digest(metadata):
+    """Return the content digest of a resource metadata dictionary."""
+    return hashlib.sha1(json.dumps(metadata, sort_keys=True,
+                                   separators=(',', ':'),
+                                   default=jsonutils.to_primitive)
+                        ).hexdigest()
+
+
+def reference_metadata(messages):
+    """Return copies of signed messages with the resource metadata
+    carried by an earlier message of the batch replaced by its digest.
+
+    Messages carrying metadata in full are annotated with its digest.
+    Each batch is self-contained, so it can be resolved by whichever
+    collector consumes it.
+    """
+    digests = {}
+    sent = set()
+    referenced = []
+    for msg in messages:
+        metadata = msg.get('resource_metadata')
+        if not metadata:
+            referenced.append(msg)
+            continue
+        # Counters of a resource often share their metadata dict
+        digest = digests.get(id(metadata))
+        if digest is None:
+            digest = digests[id(metadata)] = metadata_digest(metadata)
+        msg = dict(msg)
+        if digest in sent:
+            del msg['resource_metadata']
+            msg[METADATA_REF] = digest
+        else:
+            sent.add(digest)
+            msg[METADATA_DIGEST] = digest
+        referenced.append(msg)
+    return referenced
+
+
+def resolve_metadata(messages):
+    """Replace in place the metadata references of a batch of messages
+    by the metadata they refer to.
+
+    :returns: a list of booleans, False for the messages referring to
+              metadata not carried by an earlier message of the batch.
+    """
+    cache = {}
+    resolved = []
+    for msg in messages:
+        digest = msg.pop(METADATA_DIGEST, None)
+        if digest is not None:
+            cache[digest] = msg.get('resource_metadata')
+        ref = msg.pop(METADATA_REF, None)
+        if ref is not None:
+            metadata = cache.get(ref)
+            if metadata is None:
+                resolved.append(False)
+                continue
+            msg['resource_metadata'] = metadata
+        resolved.append(True)
+    return resolved
@@ -0,0 +1,116 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Batch preparation of the metering messages received by the collector.
+
+Checking the signature of a message and parsing its timestamp are the
+CPU-bound part of recording it. They are done for a whole batch at once,
+inline or split in chunks run by native threads. Green threads do not
+run in parallel, while native threads at least run the hashing of large
+messages in parallel, since hashlib releases the GIL over 2 KiB, and
+leave the hub free to consume and write meters meanwhile.
+"""
+
+import itertools
+
+from eventlet import greenpool
+from eventlet import tpool
+from oslo.config import cfg
+
+from ceilometer.collector import meter as meter_api
+from ceilometer.openstack.common import log
+from ceilometer import utils
+
+
+LOG = log.getLogger(__name__)
+
+OPTS = [
+    cfg.IntOpt('collector_prepare_threads',
+               default=0,
+               help='Number of native threads checking signatures and '
+               'parsing timestamps of metering messages, 0 to do it '
+               'inline'),
+    cfg.IntOpt('collector_prepare_chunk_size',
+               default=100,
+               help='Number of metering messages prepared at once by a '
+               'native thread'),
+]
+
+cfg.CONF.register_opts(OPTS)
+
+
+def prepare_meters(messages, secret):
+    """Check the signatures of messages and convert their timestamps to
+    datetime instances.
+
+    Storage engines are responsible for converting the timestamps to
+    something they can store.
+
+    :returns: a list with, for each message, None if it can be recorded
+              or the reason why it cannot.
+    """
+    errors = []
+    for message, valid in zip(messages,
+                              meter_api.verify_signatures(messages, secret)):
+        if not valid:
+            errors.append('message signature invalid')
+            continue
+        try:
+            if message.get('timestamp'):
+                message['timestamp'] = utils.parse_timestamp(
+                    message['timestamp'])
+        except Exception as err:
+            errors.append('invalid timestamp: %s' % err)
+            continue
+        errors.append(None)
+    return errors
+
+
+class Preparer(object):
+    """Prepare batches of metering messages with native threads.
+
+    Batches are split in chunks prepared in parallel, and the results
+    put back in order. Small batches, and batches the threads fail to
+    prepare, are prepared inline.
+    """
+
+    def __init__(self, threads=None, chunk_size=None):
+        if threads is None:
+            threads = cfg.CONF.collector_prepare_threads
+        if chunk_size is None:
+            chunk_size = cfg.CONF.collector_prepare_chunk_size
+        self.chunk_size = max(chunk_size, 1)
+        self.pool = greenpool.GreenPool(threads) if threads > 0 else None
+        if self.pool is not None:
+            tpool.set_num_threads(threads)
+
+    def prepare(self, messages, secret):
+        """Prepare messages like prepare_meters()."""
+        if self.pool is None or len(messages) <= self.chunk_size:
+            return prepare_meters(messages, secret)
+        chunks = [messages[i:i + self.chunk_size]
+                  for i in range(0, len(messages), self.chunk_size)]
+        return list(itertools.chain.from_iterable(
+            self.pool.imap(self._prepare_chunk, chunks,
+                           itertools.repeat(secret))))
+
+    @staticmethod
+    def _prepare_chunk(messages, secret):
+        try:
+            return tpool.execute(prepare_meters, messages, secret)
+        except Exception as err:
+            # prepare_meters() fails before converting any timestamp,
+            # so the chunk can be prepared again
+            LOG.warning('Preparing %d metering messages inline after '
+                        'error: %s', len(messages), err)
+            return prepare_meters(messages, secret)
@@ -16,12 +16,19 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import socket
+
 from oslo.config import cfg
 
+from ceilometer.collector import codec as codec_api
 from ceilometer.collector import meter as meter_api
+from ceilometer.collector import prepare
+from ceilometer.collector import udp
+from ceilometer.collector import writer
 from ceilometer import extension_manager
 from ceilometer.openstack.common import context
 from ceilometer.openstack.common import log
+from ceilometer.openstack.common import loopingcall
 from ceilometer.openstack.common.rpc import dispatcher as rpc_dispatcher
 
 # Import rpc_notifier to register `notification_topics` flag so that
@@ -29,7 +36,6 @@ from ceilometer.openstack.common.rpc import dispatcher as rpc_dispatcher
 # FIXME(dhellmann): Use option importing feature of oslo.config instead.
 import ceilometer.openstack.common.notifier.rpc_notifier
 
-from ceilometer.openstack.common import timeutils
 from ceilometer import pipeline
 from ceilometer import publisher
 from ceilometer import service
@@ -41,6 +47,11 @@ OPTS = [
                 default=[],
                 help='list of listener plugins to disable',
                 ),
+    cfg.IntOpt('collector_workers',
+               default=1,
+               help='Number of collector processes consuming the metering '
+               'and notification queues. Several processes cannot share '
+               'a publisher spool, so publisher_spool_dir must be empty'),
 ]
 
 cfg.CONF.register_opts(OPTS)
@@ -48,10 +59,36 @@ cfg.CONF.register_opts(OPTS)
 LOG = log.getLogger(__name__)
 
 
+def get_workers():
+    """Return the number of collector processes to launch, None to run
+    the collector in the current process.
+
+    :raises ValueError: if the processes would share a publisher spool.
+    """
+    workers = cfg.CONF.collector_workers
+    if workers <= 1:
+        return None
+    if cfg.CONF.publisher_spool_dir:
+        raise ValueError('collector_workers over 1 cannot be used with '
+                         'publisher_spool_dir, the workers would share '
+                         'the spool')
+    return workers
+
+
 class CollectorService(service.PeriodicService):
 
     COLLECTOR_NAMESPACE = 'ceilometer.collector'
 
+    # 1.1 adds record_metering_data_encoded
+    RPC_API_VERSION = '1.1'
+
+    def __init__(self, host, topic, manager=None):
+        super(CollectorService, self).__init__(host, topic, manager)
+        self.preparer = prepare.Preparer()
+        self.writer = None
+        if cfg.CONF.collector_write_buffer_size > 0:
+            self.writer = writer.WriteBehindBuffer(self._record_meters)
+
     def start(self):
         super(CollectorService, self).start()
 
@@ -70,6 +107,11 @@ class CollectorService(service.PeriodicService):
                 'ceilometer.publisher',
             ),
         )
+        self.flush_interval = None
+        self._setup_flush_timer()
+        if cfg.CONF.pipeline_reload_interval > 0:
+            self.tg.add_timer(cfg.CONF.pipeline_reload_interval,
+                              self.reload_pipeline)
 
         LOG.debug('loading notification handlers from %s',
                   self.COLLECTOR_NAMESPACE)
@@ -92,6 +134,32 @@ class CollectorService(service.PeriodicService):
             'ceilometer.collector.' + cfg.CONF.metering_topic,
         )
 
+        self.udp_tracker = None
+        if cfg.CONF.udp_address:
+            self.udp_tracker = udp.LossTracker()
+            self.tg.add_thread(self.start_udp)
+
+    def _setup_flush_timer(self):
+        flush_interval = self.pipeline_manager.get_flush_interval()
+        if flush_interval != self.flush_interval:
+            self.flush_interval = flush_interval
+            if flush_interval:
+                self.tg.add_timer(flush_interval,
+                                  self.flush_task,
+                                  flush_interval=flush_interval)
+
+    def flush_task(self, flush_interval):
+        if flush_interval != self.flush_interval:
+            # Superseded by a timer with the new interval
+            raise loopingcall.LoopingCallDone()
+        self.pipeline_manager.flush(context.get_admin_context(),
+                                    cfg.CONF.counter_source)
+
+    def reload_pipeline(self):
+        if self.pipeline_manager.reload(context.get_admin_context(),
+                                        cfg.CONF.counter_source):
+            self._setup_flush_timer()
+
     def _setup_subscription(self, ext, *args, **kwds):
         handler = ext.obj
         LOG.debug('Event types from %s: %s',
@@ -133,28 +201,109 @@ class CollectorService(service.PeriodicService):
         if not isinstance(data, list):
             data = [data]
 
-        for meter in data:
+        resolved = meter_api.resolve_metadata(data)
+        errors = self.preparer.prepare(data, cfg.CONF.metering_secret)
+        meters = []
+        for meter, known, error in zip(data, resolved, errors):
             LOG.info('metering data %s for %s @ %s: %s',
                      meter['counter_name'],
                      meter['resource_id'],
                      meter.get('timestamp', 'NO TIMESTAMP'),
                      meter['counter_volume'])
-            if meter_api.verify_signature(meter, cfg.CONF.metering_secret):
-                try:
-                    # Convert the timestamp to a datetime instance.
-                    # Storage engines are responsible for converting
-                    # that value to something they can store.
-                    if meter.get('timestamp'):
-                        ts = timeutils.parse_isotime(meter['timestamp'])
-                        meter['timestamp'] = timeutils.normalize_time(ts)
-                    self.storage_conn.record_metering_data(meter)
-                except Exception as err:
-                    LOG.error('Failed to record metering data: %s', err)
-                    LOG.exception(err)
-            else:
+            if not known:
                 LOG.warning(
-                    'message signature invalid, discarding message: %r',
-                    meter)
+                    'unknown resource metadata reference, discarding '
+                    'message: %r', meter)
+            elif error is None:
+                meters.append(meter)
+            else:
+                LOG.warning('%s, discarding message: %r', error, meter)
+        if not meters:
+            return
+        if self.writer is not None:
+            self.writer.put(meters)
+        else:
+            self._record_meters(meters)
+
+    def _record_meters(self, meters):
+        try:
+            self.storage_conn.record_metering_data_batch(meters)
+            return
+        except Exception as err:
+            if len(meters) == 1:
+                LOG.error('Failed to record metering data: %s', err)
+                LOG.exception(err)
+                return
+            LOG.warning('Failed to record a batch of %d meters, recording '
+                        'them one by one: %s', len(meters), err)
+        # Do not lose the whole batch because of one bad meter
+        for meter in meters:
+            try:
+                self.storage_conn.record_metering_data(meter)
+            except Exception as err:
+                LOG.error('Failed to record metering data: %s', err)
+                LOG.exception(err)
+
+    def record_metering_data_encoded(self, context, codec, payload,
+                                     compressed=False):
+        """This method is triggered when an encoded batch of metering
+        data is cast from an agent.
+        """
+        try:
+            data = codec_api.decode(codec, payload, compressed)
+        except Exception as err:
+            LOG.error('Unable to decode metering data with codec %s: %s',
+                      codec, err)
+            return
+        self.record_metering_data(context, data)
+
+    def start_udp(self):
+        family, socktype, proto, _name, address = socket.getaddrinfo(
+            cfg.CONF.udp_address, cfg.CONF.udp_port, 0, socket.SOCK_DGRAM)[0]
+        udp_socket = socket.socket(family, socktype, proto)
+        udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if cfg.CONF.collector_workers > 1:
+            # Let the kernel spread datagrams over the workers, the
+            # datagrams of a sender all going to the same worker.
+            # Python 2 does not expose the constant (15 on Linux).
+            udp_socket.setsockopt(socket.SOL_SOCKET,
+                                  getattr(socket, 'SO_REUSEPORT', 15), 1)
+        udp_socket.bind(address)
+        while True:
+            datagram, sender = udp_socket.recvfrom(udp.MAX_DATAGRAM_SIZE)
+            self.process_datagram(datagram, sender)
+
+    def process_datagram(self, datagram, sender):
+        """Record the metering data of a datagram sent by the udp
+        publisher.
+        """
+        try:
+            seq, data = udp.unpack(datagram)
+        except Exception as err:
+            self.udp_tracker.invalid += 1
+            LOG.warning('Invalid metering datagram from %s: %s', sender, err)
+            return
+        self.udp_tracker.track(sender, seq)
+        try:
+            self.record_metering_data(context.get_admin_context(), data)
+        except Exception as err:
+            # Datagrams are not authenticated, a malformed one must not
+            # stop the listener
+            self.udp_tracker.invalid += 1
+            LOG.warning('Invalid metering data in datagram from %s: %s',
+                        sender, err)
+
+    def stop(self):
+        super(CollectorService, self).stop()
+        if self.writer is not None:
+            self.writer.stop()
 
     def periodic_tasks(self, context):
-        pass
+        if self.udp_tracker is not None:
+            LOG.info('UDP metering datagrams: %s',
+                     self.udp_tracker.get_stats())
+        if self.writer is not None:
+            LOG.info('Write-behind buffer: %s', self.writer.get_stats())
+        stats = self.pipeline_manager.publisher_manager.get_stats()
+        if stats:
+            LOG.info('Publishers: %s', stats)
@@ -0,0 +1,148 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Metering datagrams sent by the udp publisher.
+
+Each datagram starts with a fixed header giving the format version,
+the codec, whether the payload is compressed and a sequence number
+incremented by the sender for every datagram. The payload is a batch
+of signed meters serialized by ceilometer.collector.codec.dumps().
+
+Sequence numbers let the collector count the datagrams lost or
+reordered on the way from each sender.
+"""
+
+import struct
+
+from oslo.config import cfg
+
+from ceilometer.collector import codec as codec_api
+from ceilometer.openstack.common import log
+from ceilometer import utils
+
+LOG = log.getLogger(__name__)
+
+OPTS = [
+    cfg.StrOpt('udp_address',
+               default='',
+               help='Address the collector listens on for metering '
+               'datagrams sent by the udp publisher, empty to disable '
+               'the UDP listener'),
+    cfg.IntOpt('udp_port',
+               default=4952,
+               help='Port the collector listens on for metering datagrams, '
+               'and the udp publisher sends them to'),
+]
+
+cfg.CONF.register_opts(OPTS)
+
+VERSION = 1
+HEADER = struct.Struct('!BBBI')
+CODECS = ('json', 'msgpack')
+FLAG_COMPRESSED = 0x01
+SEQUENCE_MODULO = 2 ** 32
+
+# Largest payload of an IPv4 UDP datagram
+MAX_DATAGRAM_SIZE = 65507
+
+
+def _header(codec, compressed, seq):
+    flags = FLAG_COMPRESSED if compressed else 0
+    return HEADER.pack(VERSION, CODECS.index(codec), flags,
+                       seq % SEQUENCE_MODULO)
+
+
+def pack(meters, codec, seq, threshold=None):
+    """Return a datagram carrying meters."""
+    payload, compressed = codec_api.dumps(meters, codec, threshold)
+    return _header(codec, compressed, seq) + payload
+
+
+def unpack(datagram):
+    """Return the (sequence number, meters) carried by a datagram.
+
+    :raises ValueError: if the datagram cannot be decoded.
+    """
+    if len(datagram) < HEADER.size:
+        raise ValueError('Datagram too short')
+    version, codec, flags, seq = HEADER.unpack_from(datagram)
+    if version != VERSION:
+        raise ValueError('Unsupported datagram version %d' % version)
+    if codec >= len(CODECS):
+        raise ValueError('Unknown codec %d' % codec)
+    meters = codec_api.loads(CODECS[codec], datagram[HEADER.size:],
+                             bool(flags & FLAG_COMPRESSED))
+    return seq, meters
+
+
+def pack_all(meters, codec, seqs, max_size, threshold=None):
+    """Return datagrams no larger than max_size carrying meters.
+
+    The meters are split in as many datagrams as needed. A meter that
+    does not fit in a datagram on its own is dropped.
+
+    :param seqs: iterator yielding the sequence numbers to use.
+    """
+    payload, compressed = codec_api.dumps(meters, codec, threshold)
+    if HEADER.size + len(payload) <= max_size:
+        return [_header(codec, compressed, next(seqs)) + payload]
+    if len(meters) == 1:
+        LOG.warning('Dropping meter %s for %s: %d bytes do not fit in a '
+                    'datagram', meters[0]['counter_name'],
+                    meters[0]['resource_id'], len(payload))
+        return []
+    middle = len(meters) // 2
+    return (pack_all(meters[:middle], codec, seqs, max_size, threshold) +
+            pack_all(meters[middle:], codec, seqs, max_size, threshold))
+
+
+class LossTracker(object):
+    """Count the datagrams received, lost and reordered per sender.
+
+    A gap in the sequence numbers of a sender counts as lost datagrams.
+    A datagram arriving after a later one is counted as reordered, and
+    no longer as lost.
+    """
+
+    def __init__(self, max_senders=10000, ttl=3600):
+        self.senders = utils.BoundedCache(max_senders, ttl)
+        self.received = 0
+        self.lost = 0
+        self.reordered = 0
+        self.invalid = 0
+
+    def track(self, sender, seq):
+        self.received += 1
+        last = self.senders.get(sender)
+        if last is None:
+            self.senders[sender] = seq
+            return
+        gap = (seq - last - 1) % SEQUENCE_MODULO
+        if gap < SEQUENCE_MODULO // 2:
+            self.lost += gap
+            self.senders[sender] = seq
+        else:
+            self.reordered += 1
+            if self.lost:
+                self.lost -= 1
+
+    def get_stats(self):
+        expected = self.received + self.lost
+        return {
+            'senders': len(self.senders),
+            'received': self.received,
+            'lost': self.lost,
+            'reordered': self.reordered,
+            'invalid': self.invalid,
+            'loss_ratio': float(self.lost) / expected if expected else 0.0,
+        }
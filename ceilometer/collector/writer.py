@@ -0,0 +1,147 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Write-behind buffer between the collector consumers and the storage.
+
+Meters are queued in a bounded buffer and written by a dedicated green
+thread in groups, so that the cost of a write is shared by the meters of
+many messages and a slow write does not hold up message consumption. A
+full buffer blocks the consumers until the writer catches up.
+
+Meters are acknowledged to the bus once queued: those still in the
+buffer when the collector dies are lost.
+"""
+
+import time
+
+import eventlet
+from eventlet import queue
+from oslo.config import cfg
+
+from ceilometer.openstack.common import log
+
+
+LOG = log.getLogger(__name__)
+
+OPTS = [
+    cfg.IntOpt('collector_write_buffer_size',
+               default=0,
+               help='Number of meters the collector may hold before they '
+               'are written to the database, 0 writes them before '
+               'acknowledging each message'),
+    cfg.IntOpt('collector_group_commit_size',
+               default=500,
+               help='Maximum number of buffered meters written at once'),
+    cfg.IntOpt('collector_group_commit_interval',
+               default=100,
+               help='Maximum number of milliseconds the first buffered '
+               'meter waits for others to be written with it'),
+]
+
+cfg.CONF.register_opts(OPTS)
+
+
+class WriteBehindBuffer(object):
+    """Bounded buffer of meters written in groups by a green thread."""
+
+    def __init__(self, write, size=None, group_size=None, interval=None):
+        """:param write: callable writing a list of meters.
+        :param interval: group commit interval, in milliseconds.
+        """
+        if size is None:
+            size = cfg.CONF.collector_write_buffer_size
+        if group_size is None:
+            group_size = cfg.CONF.collector_group_commit_size
+        if interval is None:
+            interval = cfg.CONF.collector_group_commit_interval
+        self.write = write
+        self.queue = queue.Queue(size)
+        self.group_size = group_size
+        self.interval = interval / 1000.0
+        self.commits = 0
+        self.written = 0
+        self.group_max = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self._worker = None
+
+    def put(self, meters):
+        """Queue meters, blocking while the buffer is full."""
+        if self._worker is None:
+            self._worker = eventlet.spawn(self._run)
+        for meter in meters:
+            self.queue.put(meter)
+
+    def _get_group(self):
+        group = [self.queue.get()]
+        deadline = time.time() + self.interval
+        while len(group) < self.group_size:
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                break
+            try:
+                group.append(self.queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return group
+
+    def _commit(self, group):
+        start = time.time()
+        try:
+            self.write(group)
+        except Exception as err:
+            LOG.error('Failed to write %d buffered meters: %s',
+                      len(group), err)
+            LOG.exception(err)
+        latency = time.time() - start
+        self.commits += 1
+        self.written += len(group)
+        self.group_max = max(self.group_max, len(group))
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+
+    def _run(self):
+        while True:
+            group = self._get_group()
+            try:
+                self._commit(group)
+            finally:
+                for _meter in group:
+                    self.queue.task_done()
+
+    def join(self):
+        """Wait until every queued meter has been written."""
+        self.queue.join()
+
+    def stop(self):
+        """Write what is left in the buffer and stop the writer thread.
+
+        Nothing should be queued meanwhile.
+        """
+        if self._worker is not None:
+            self.join()
+            self._worker.kill()
+            self._worker = None
+
+    def get_stats(self):
+        return {
+            'occupancy': self.queue.qsize(),
+            'commits': self.commits,
+            'written': self.written,
+            'group_avg': (float(self.written) / self.commits
+                          if self.commits else 0.0),
+            'group_max': self.group_max,
+            'latency_avg': (self.latency_total / self.commits
+                            if self.commits else 0.0),
+            'latency_max': self.latency_max,
+        }
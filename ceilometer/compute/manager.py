@@ -23,6 +23,7 @@ from ceilometer.compute.virt import inspector as virt_inspector
 from ceilometer import extension_manager
 from ceilometer import nova_client
 from ceilometer.openstack.common import log
+from ceilometer import plugin
 
 
 LOG = log.getLogger(__name__)
@@ -31,20 +32,30 @@ LOG = log.getLogger(__name__)
 class PollingTask(agent.PollingTask):
     def poll_and_publish_instances(self, instances):
         with self.publish_context as publisher:
-            for instance in instances:
-                if getattr(instance, 'OS-EXT-STS:vm_state', None) != 'error':
-                    # TODO(yjiang5) passing counters to get_counters to avoid
-                    # polling all counters one by one
-                    for pollster in self.pollsters:
-                        try:
-                            LOG.info("Polling pollster %s", pollster.name)
-                            publisher(list(pollster.obj.get_counters(
-                                self.manager,
-                                instance)))
-                        except Exception as err:
-                            LOG.warning('Continue after error from %s: %s',
-                                        pollster.name, err)
-                            LOG.exception(err)
+            # Counters of the whole cycle are published at once
+            counters = []
+            # The cycle is exposed on the manager so the pollsters keep
+            # the get_counters(manager, instance) signature
+            self.manager.poll_cycle = plugin.PollCycle()
+            try:
+                for instance in instances:
+                    if getattr(instance, 'OS-EXT-STS:vm_state',
+                               None) != 'error':
+                        # TODO(yjiang5) passing counters to get_counters to
+                        # avoid polling all counters one by one
+                        for pollster in self.pollsters:
+                            try:
+                                LOG.info("Polling pollster %s", pollster.name)
+                                counters.extend(list(
+                                    pollster.obj.get_counters(self.manager,
+                                                              instance)))
+                            except Exception as err:
+                                LOG.warning('Continue after error from %s: '
+                                            '%s', pollster.name, err)
+                                LOG.exception(err)
+            finally:
+                self.manager.poll_cycle = None
+            publisher(counters)
 
     def poll_and_publish(self):
         self.poll_and_publish_instances(
@@ -62,6 +73,8 @@ class AgentManager(agent.AgentManager):
         )
         self._inspector = virt_inspector.get_hypervisor_inspector()
         self.nv = nova_client.Client()
+        # PollCycle of the polling cycle in progress, if any
+        self.poll_cycle = None
 
     def create_polling_task(self):
         return PollingTask(self)
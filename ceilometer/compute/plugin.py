@@ -32,4 +32,9 @@ class ComputePollster(plugin.PollsterBase):
     @abc.abstractmethod
     def get_counters(self, manager, context):
         """Return a sequence of Counter instances from polling the
-        resources."""
+        resources.
+
+        During a polling cycle manager.poll_cycle holds the
+        ceilometer.plugin.PollCycle shared by the pollsters, it is
+        missing or None when polling outside of a cycle.
+        """
@@ -26,6 +26,7 @@ from ceilometer.compute import plugin
 from ceilometer import counter
 from ceilometer.openstack.common import log
 from ceilometer.openstack.common import timeutils
+from ceilometer import utils
 
 LOG = log.getLogger(__name__)
 
@@ -35,7 +36,15 @@ def _instance_name(instance):
     return getattr(instance, 'OS-EXT-SRV-ATTR:instance_name', None)
 
 
-def make_counter_from_instance(instance, name, type, unit, volume):
+def make_counter_from_instance(instance, name, type, unit, volume,
+                               cycle=None):
+    if cycle is None:
+        timestamp = timeutils.isotime()
+        metadata = compute_instance.get_metadata_from_object(instance)
+    else:
+        timestamp = cycle.timestamp
+        metadata = cycle.get_metadata(
+            instance.id, compute_instance.get_metadata_from_object, instance)
     return counter.Counter(
         name=name,
         type=type,
@@ -44,8 +53,8 @@ def make_counter_from_instance(instance, name, type, unit, volume):
         user_id=instance.user_id,
         project_id=instance.tenant_id,
         resource_id=instance.id,
-        timestamp=timeutils.isotime(),
-        resource_metadata=compute_instance.get_metadata_from_object(instance),
+        timestamp=timestamp,
+        resource_metadata=metadata,
     )
 
 
@@ -58,12 +67,15 @@ class InstancePollster(plugin.ComputePollster):
         return ['instance', 'instance:*']
 
     def get_counters(self, manager, instance):
+        cycle = getattr(manager, 'poll_cycle', None)
         yield make_counter_from_instance(instance,
+                                         cycle=cycle,
                                          name='instance',
                                          type=counter.TYPE_GAUGE,
                                          unit='instance',
                                          volume=1)
         yield make_counter_from_instance(instance,
+                                         cycle=cycle,
                                          name='instance:%s' %
                                          instance.flavor['name'],
                                          type=counter.TYPE_GAUGE,
@@ -92,6 +104,7 @@ class DiskIOPollster(plugin.ComputePollster):
                 'disk.write.bytes']
 
     def get_counters(self, manager, instance):
+        cycle = getattr(manager, 'poll_cycle', None)
         instance_name = _instance_name(instance)
         try:
             r_bytes = 0
@@ -108,24 +121,28 @@ class DiskIOPollster(plugin.ComputePollster):
                 w_bytes += info.write_bytes
                 w_requests += info.write_requests
             yield make_counter_from_instance(instance,
+                                             cycle=cycle,
                                              name='disk.read.requests',
                                              type=counter.TYPE_CUMULATIVE,
                                              unit='request',
                                              volume=r_requests,
                                              )
             yield make_counter_from_instance(instance,
+                                             cycle=cycle,
                                              name='disk.read.bytes',
                                              type=counter.TYPE_CUMULATIVE,
                                              unit='B',
                                              volume=r_bytes,
                                              )
             yield make_counter_from_instance(instance,
+                                             cycle=cycle,
                                              name='disk.write.requests',
                                              type=counter.TYPE_CUMULATIVE,
                                              unit='request',
                                              volume=w_requests,
                                              )
             yield make_counter_from_instance(instance,
+                                             cycle=cycle,
                                              name='disk.write.bytes',
                                              type=counter.TYPE_CUMULATIVE,
                                              unit='B',
@@ -141,7 +158,8 @@ class CPUPollster(plugin.ComputePollster):
 
     LOG = log.getLogger(__name__ + '.cpu')
 
-    utilization_map = {}
+    # Bounded so that instances deleted from the host are forgotten
+    utilization_map = utils.BoundedCache(max_size=10000, ttl=86400)
 
     def get_cpu_util(self, instance, cpu_info):
         prev_times = self.utilization_map.get(instance.id)
@@ -165,6 +183,7 @@ class CPUPollster(plugin.ComputePollster):
         return ['cpu', 'cpu_util']
 
     def get_counters(self, manager, instance):
+        cycle = getattr(manager, 'poll_cycle', None)
         self.LOG.info('checking instance %s', instance.id)
         instance_name = _instance_name(instance)
         try:
@@ -180,12 +199,14 @@ class CPUPollster(plugin.ComputePollster):
             #                metering store, only publishing to those sinks
             #                that specifically need it
             yield make_counter_from_instance(instance,
+                                             cycle=cycle,
                                              name='cpu_util',
                                              type=counter.TYPE_GAUGE,
                                              unit='%',
                                              volume=cpu_util,
                                              )
             yield make_counter_from_instance(instance,
+                                             cycle=cycle,
                                              name='cpu',
                                              type=counter.TYPE_CUMULATIVE,
                                              unit='ns',
@@ -205,12 +226,25 @@ class NetPollster(plugin.ComputePollster):
                                   "write-bytes=%d"])
 
     @staticmethod
-    def make_vnic_counter(instance, name, type, unit, volume, vnic_data):
+    def make_vnic_metadata(instance, vnic_data):
         metadata = copy.copy(vnic_data)
         resource_metadata = dict(zip(metadata._fields, metadata))
         resource_metadata['instance_id'] = instance.id
         resource_metadata['instance_type'] = \
             instance.flavor['id'] if instance.flavor else None
+        return resource_metadata
+
+    @classmethod
+    def make_vnic_counter(cls, instance, name, type, unit, volume, vnic_data,
+                          cycle=None):
+        if cycle is None:
+            timestamp = timeutils.isotime()
+            resource_metadata = cls.make_vnic_metadata(instance, vnic_data)
+        else:
+            timestamp = cycle.timestamp
+            resource_metadata = cycle.get_metadata(
+                (instance.id, vnic_data.name),
+                cls.make_vnic_metadata, instance, vnic_data)
 
         return counter.Counter(
             name=name,
@@ -220,7 +254,7 @@ class NetPollster(plugin.ComputePollster):
             user_id=instance.user_id,
             project_id=instance.tenant_id,
             resource_id=vnic_data.fref,
-            timestamp=timeutils.isotime(),
+            timestamp=timestamp,
             resource_metadata=resource_metadata
         )
 
@@ -232,6 +266,7 @@ class NetPollster(plugin.ComputePollster):
                 'network.outgoing.packets']
 
     def get_counters(self, manager, instance):
+        cycle = getattr(manager, 'poll_cycle', None)
         instance_name = _instance_name(instance)
         self.LOG.info('checking instance %s', instance.id)
         try:
@@ -239,6 +274,7 @@ class NetPollster(plugin.ComputePollster):
                 self.LOG.info(self.NET_USAGE_MESSAGE, instance_name,
                               vnic.name, info.rx_bytes, info.tx_bytes)
                 yield self.make_vnic_counter(instance,
+                                             cycle=cycle,
                                              name='network.incoming.bytes',
                                              type=counter.TYPE_CUMULATIVE,
                                              unit='B',
@@ -246,6 +282,7 @@ class NetPollster(plugin.ComputePollster):
                                              vnic_data=vnic,
                                              )
                 yield self.make_vnic_counter(instance,
+                                             cycle=cycle,
                                              name='network.outgoing.bytes',
                                              type=counter.TYPE_CUMULATIVE,
                                              unit='B',
@@ -253,6 +290,7 @@ class NetPollster(plugin.ComputePollster):
                                              vnic_data=vnic,
                                              )
                 yield self.make_vnic_counter(instance,
+                                             cycle=cycle,
                                              name='network.incoming.packets',
                                              type=counter.TYPE_CUMULATIVE,
                                              unit='packet',
@@ -260,6 +298,7 @@ class NetPollster(plugin.ComputePollster):
                                              vnic_data=vnic,
                                              )
                 yield self.make_vnic_counter(instance,
+                                             cycle=cycle,
                                              name='network.outgoing.packets',
                                              type=counter.TYPE_CUMULATIVE,
                                              unit='packet',
@@ -24,6 +24,7 @@ from oslo.config import cfg
 from ceilometer import agent
 from ceilometer import extension_manager
 from ceilometer.openstack.common import log
+from ceilometer import plugin
 from ceilometer.hardware.inspector import manager as inspector_manager
 from ceilometer.hardware.host import HardwareHost as Host
 import json
@@ -46,16 +47,27 @@ LOG = log.getLogger(__name__)
 class PollingTask(agent.PollingTask):
     def poll_and_publish_hosts(self, hosts):
         with self.publish_context as publisher:
-            for host in hosts:
-                for pollster in self.pollsters:
-                    try:
-                        LOG.info("Polling pollster %s", pollster.name)
-                        if not pollster.name in host.disabled_pollsters:
-                            publisher(list(pollster.obj.get_counters(self.manager, host)))
-                    except Exception as err:
-                        LOG.warning('Continue after error from %s: %s',
-                            pollster.name, err)
-                        LOG.exception(err)
+            # Counters of the whole cycle are published at once
+            counters = []
+            # The cycle is exposed on the manager so the pollsters keep
+            # the get_counters(manager, host) signature
+            self.manager.poll_cycle = plugin.PollCycle()
+            try:
+                for host in hosts:
+                    for pollster in self.pollsters:
+                        try:
+                            LOG.info("Polling pollster %s", pollster.name)
+                            if not pollster.name in host.disabled_pollsters:
+                                counters.extend(list(
+                                    pollster.obj.get_counters(self.manager,
+                                                              host)))
+                        except Exception as err:
+                            LOG.warning('Continue after error from %s: %s',
+                                pollster.name, err)
+                            LOG.exception(err)
+            finally:
+                self.manager.poll_cycle = None
+            publisher(counters)
 
     def poll_and_publish(self):
         self.poll_and_publish_hosts(self._get_all_hosts())
@@ -78,6 +90,8 @@ class AgentManager(agent.AgentManager):
             ),
         )
         self._inspector_manager = inspector_manager.InspectorManager()
+        # PollCycle of the polling cycle in progress, if any
+        self.poll_cycle = None
 
     def create_polling_task(self):
         return PollingTask(self)
@@ -28,12 +28,25 @@ from ceilometer.openstack.common import timeutils
 
 LOG = log.getLogger(__name__)
 
-def make_counter_from_host(host, name, type, unit, volume, res_metadata=None):
+def make_host_metadata(host, res_metadata=None):
     resource_metadata = dict()
     if(res_metadata is not None):
         metadata = copy.copy(res_metadata)
         resource_metadata = dict(zip(metadata._fields, metadata))
     resource_metadata.update(hardware_host.get_metadata_from_object(host))
+    return resource_metadata
+
+
+def make_counter_from_host(host, name, type, unit, volume, res_metadata=None,
+                           cycle=None):
+    if cycle is None:
+        timestamp = timeutils.isotime()
+        resource_metadata = make_host_metadata(host, res_metadata)
+    else:
+        timestamp = cycle.timestamp
+        resource_metadata = cycle.get_metadata((host.id, res_metadata),
+                                               make_host_metadata,
+                                               host, res_metadata)
 
     return counter.Counter(
         name=name,
@@ -43,7 +56,7 @@ def make_counter_from_host(host, name, type, unit, volume, res_metadata=None):
         user_id=None,
         project_id=None,
         resource_id=host.id,
-        timestamp=timeutils.isotime(),
+        timestamp=timestamp,
         resource_metadata=resource_metadata,
     )
 
@@ -56,6 +69,7 @@ class CPUPollster(plugin.HardwarePollster):
         return ['cpu_util_1_min', 'cpu_util_5_min', 'cpu_util_15_min']
 
     def get_counters(self, manager, host):
+        cycle = getattr(manager, 'poll_cycle', None)
         self.LOG.info('checking host %s with id %s', host.ip_address, host.id)
         try:
             cpu_info = manager.inspector_manager.inspect_cpu(host)
@@ -73,6 +87,7 @@ class CPUPollster(plugin.HardwarePollster):
                 host.__dict__, cpu_util_15_min)
 
             yield make_counter_from_host(host,
+                cycle=cycle,
                 name='cpu_util_1_min',
                 type=counter.TYPE_GAUGE,
                 unit='%',
@@ -80,6 +95,7 @@ class CPUPollster(plugin.HardwarePollster):
             )
 
             yield make_counter_from_host(host,
+                cycle=cycle,
                 name='cpu_util_5_min',
                 type=counter.TYPE_GAUGE,
                 unit='%',
@@ -87,6 +103,7 @@ class CPUPollster(plugin.HardwarePollster):
             )
 
             yield make_counter_from_host(host,
+                cycle=cycle,
                 name='cpu_util_15_min',
                 type=counter.TYPE_GAUGE,
                 unit='%',
@@ -112,6 +129,7 @@ class NetPollster(plugin.HardwarePollster):
                 'network.outgoing.errors']
 
     def get_counters(self, manager, host):
+        cycle = getattr(manager, 'poll_cycle', None)
 
         self.LOG.info('checking host %s with id ', host.ip_address, host.id)
         try:
@@ -119,6 +137,7 @@ class NetPollster(plugin.HardwarePollster):
                 self.LOG.info(self.NET_USAGE_MESSAGE, host.ip_address, host.id,
                     nic.name, info.rx_bytes, info.tx_bytes)
                 yield make_counter_from_host(host,
+                    cycle=cycle,
                     name='network.bandwidth.bytes',
                     type=counter.TYPE_CUMULATIVE,
                     unit='B',
@@ -127,6 +146,7 @@ class NetPollster(plugin.HardwarePollster):
                 )
 
                 yield make_counter_from_host(host,
+                    cycle=cycle,
                     name='network.incoming.bytes',
                     type=counter.TYPE_CUMULATIVE,
                     unit='B',
@@ -134,6 +154,7 @@ class NetPollster(plugin.HardwarePollster):
                     res_metadata=nic,
                 )
                 yield make_counter_from_host(host,
+                    cycle=cycle,
                     name='network.outgoing.bytes',
                     type=counter.TYPE_CUMULATIVE,
                     unit='B',
@@ -141,6 +162,7 @@ class NetPollster(plugin.HardwarePollster):
                     res_metadata=nic,
                 )
                 yield make_counter_from_host(host,
+                    cycle=cycle,
                     name='network.outgoing.errors',
                     type=counter.TYPE_CUMULATIVE,
                     unit='packet',
@@ -170,6 +192,7 @@ class DiskSpacePollster(plugin.HardwarePollster):
                 'disk.size.used']
 
     def get_counters(self, manager, host):
+        cycle = getattr(manager, 'poll_cycle', None)
 
         try:
             for disk, info in manager.inspector_manager.inspect_diskspace(host):
@@ -179,6 +202,7 @@ class DiskSpacePollster(plugin.HardwarePollster):
                     disk.path)
 
             yield make_counter_from_host(host,
+                cycle=cycle,
                 name='disk.size.total',
                 type=counter.TYPE_GAUGE,
                 unit='B',
@@ -187,6 +211,7 @@ class DiskSpacePollster(plugin.HardwarePollster):
             )
 
             yield make_counter_from_host(host,
+                cycle=cycle,
                 name='disk.size.used',
                 type=counter.TYPE_GAUGE,
                 unit='B',
@@ -214,16 +239,19 @@ class MemorySpacePollster(plugin.HardwarePollster):
                 'memory.size.used']
 
     def get_counters(self, manager, host):
+        cycle = getattr(manager, 'poll_cycle', None)
 
         try:
             memoryinfo = manager.inspector_manager.inspect_memoryspace(host)
             yield make_counter_from_host(host,
+                cycle=cycle,
                 name='memory.size.total',
                 type=counter.TYPE_GAUGE,
                 unit='B',
                 volume=memoryinfo.total
             )
             yield make_counter_from_host(host,
+                cycle=cycle,
                 name='memory.size.used',
                 type=counter.TYPE_GAUGE,
                 unit='B',
@@ -16,25 +16,52 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
-import itertools
+import collections
+import operator
 import os
 
 from oslo.config import cfg
 import yaml
 
 from ceilometer.openstack.common import log
+from ceilometer.openstack.common import timeutils
+from ceilometer import utils
 
 OPTS = [
     cfg.StrOpt('pipeline_cfg_file',
                default="pipeline.yaml",
                help="Configuration file for pipeline definition"
                ),
+    cfg.IntOpt('pipeline_route_cache_size',
+               default=1024,
+               help="Maximum number of resolved counter names kept in "
+               "the pipeline routing cache"
+               ),
+    cfg.IntOpt('pipeline_reload_interval',
+               default=0,
+               help="Interval in seconds between checks of the pipeline "
+               "configuration file for changes, 0 disables reloading"
+               ),
+    cfg.IntOpt('publish_coalesce_max_counters',
+               default=1000,
+               help="Maximum number of counters a publisher is given at "
+               "once when coalescing the counters published in a polling "
+               "cycle or notification"
+               ),
+    cfg.IntOpt('publish_coalesce_max_latency',
+               default=0,
+               help="Number of seconds counters may be held to be "
+               "published together with the ones of the next polling "
+               "cycles, 0 publishes at the end of each cycle"
+               ),
 ]
 
 cfg.CONF.register_opts(OPTS)
 
 LOG = log.getLogger(__name__)
 
+_counter_name = operator.attrgetter('name')
+
 
 class PipelineException(Exception):
     def __init__(self, message, pipeline_cfg):
@@ -45,27 +72,161 @@ class PipelineException(Exception):
         return 'Pipeline %s: %s' % (self.pipeline_cfg, self.msg)
 
 
+# (yjiang5) To support counters like instance:m1.tiny,
+# which include variable part at the end starting with ':'.
+# Hope we will not add such counters in future.
+def _variable_counter_name(name):
+    m = name.partition(':')
+    if m[1] == ':':
+        return m[1].join((m[0], '*'))
+    else:
+        return name
+
+
+class CounterRouter(object):
+    """Compiled routing table from counter names to pipelines.
+
+    The counter rules of every pipeline are indexed once, so resolving
+    the pipelines interested in a counter name is a dict lookup instead
+    of a scan over every pipeline's counter list. Resolved names are
+    memoized in a cache bounded by cache_size.
+    """
+
+    def __init__(self, pipelines, cache_size=None):
+        self.pipelines = list(pipelines)
+        if cache_size is None:
+            cache_size = cfg.CONF.pipeline_route_cache_size
+        self.cache_size = cache_size
+        self._cache = {}
+        # counter name -> pipelines explicitly including it
+        self._included = collections.defaultdict(list)
+        # pipelines accepting every counter they do not exclude
+        self._catch_all = []
+        for pipe in self.pipelines:
+            if pipe.included_counters:
+                for name in pipe.included_counters:
+                    self._included[name].append(pipe)
+            else:
+                self._catch_all.append(pipe)
+
+    def _resolve(self, counter_name):
+        name = _variable_counter_name(counter_name)
+        matched = set(self._included.get(name, ()))
+        matched.update(p for p in self._catch_all
+                       if name not in p.excluded_counters)
+        # Keep the pipeline definition order
+        return tuple(p for p in self.pipelines if p in matched)
+
+    def route(self, counter_name):
+        """Return the pipelines that support counter_name."""
+        try:
+            return self._cache[counter_name]
+        except KeyError:
+            pipelines = self._resolve(counter_name)
+            if len(self._cache) >= self.cache_size:
+                self._cache.clear()
+            self._cache[counter_name] = pipelines
+            return pipelines
+
+
+class PublishBuffer(object):
+    """Counters waiting to be published, grouped by publisher.
+
+    Counters given to the same publisher by several pipelines or
+    several calls are coalesced, so that publishers sending messages
+    send as few as possible. A publisher is given max_counters counters
+    as soon as that many are waiting. Otherwise the counters are
+    published by publish(), at once or only when the oldest of them has
+    been waiting for max_latency seconds.
+    """
+
+    def __init__(self, max_counters=None, max_latency=0):
+        if max_counters is None:
+            max_counters = cfg.CONF.publish_coalesce_max_counters
+        self.max_counters = max_counters
+        self.max_latency = max_latency
+        # (publisher name, source) -> (pipeline, counters)
+        self.pending = {}
+        self.first_timestamp = None
+
+    def add(self, pipeline, ctxt, counters, source):
+        """Queue counters for the publishers of a pipeline."""
+        if not counters:
+            return
+        if self.first_timestamp is None:
+            self.first_timestamp = timeutils.utcnow()
+        for name in pipeline.publishers:
+            pending = self.pending.setdefault((name, source),
+                                              (pipeline, []))[1]
+            pending.extend(counters)
+            while self.max_counters and len(pending) >= self.max_counters:
+                pipeline.publish_to(name, ctxt,
+                                    pending[:self.max_counters], source)
+                del pending[:self.max_counters]
+
+    def expired(self):
+        return (self.first_timestamp is not None and
+                timeutils.is_older_than(self.first_timestamp,
+                                        self.max_latency))
+
+    def publish(self, ctxt, force=True):
+        """Publish the waiting counters.
+
+        :param force: publish even if max_latency is not over yet.
+        """
+        if not self.pending or not (force or self.expired()):
+            return
+        pending, self.pending = self.pending, {}
+        self.first_timestamp = None
+        for (name, source), (pipeline, counters) in pending.iteritems():
+            if counters:
+                pipeline.publish_to(name, ctxt, counters, source)
+
+
 class PublishContext(object):
 
-    def __init__(self, context, source, pipelines=[]):
+    def __init__(self, context, source, pipelines=[], router=None,
+                 buffer=None):
         self.pipelines = set(pipelines)
         self.context = context
         self.source = source
+        self.router = router
+        # A buffer outliving the context holds counters across cycles
+        self.buffer = buffer
+        self.keep_buffer = buffer is not None
 
     def add_pipelines(self, pipelines):
         self.pipelines.update(pipelines)
+        self.router = None
 
     def __enter__(self):
+        if self.router is None:
+            self.router = CounterRouter(self.pipelines)
+
+        if self.buffer is None:
+            self.buffer = PublishBuffer()
+
         def p(counters):
-            for p in self.pipelines:
-                p.publish_counters(self.context,
-                                   counters,
-                                   self.source)
+            for counter_name, counters in utils.partition_by(counters,
+                                                             _counter_name):
+                # Output of the shared stages, computed once for all
+                # the pipelines sharing them
+                shared = {}
+                for pipe in self.router.route(counter_name):
+                    pipe.publish_supported_counters(self.context,
+                                                    counters,
+                                                    self.source,
+                                                    shared,
+                                                    self.buffer)
         return p
 
     def __exit__(self, exc_type, exc_value, traceback):
+        shared = {}
         for p in self.pipelines:
-            p.flush(self.context, self.source)
+            p.flush(self.context, self.source, shared, self.buffer)
+        self.buffer.publish(self.context, force=not self.keep_buffer)
+        if not self.keep_buffer:
+            self.buffer = None
 
 
 class Pipeline(object):
@@ -90,7 +251,8 @@ class Pipeline(object):
 
     """
 
-    def __init__(self, cfg, publisher_manager, transformer_manager):
+    def __init__(self, cfg, publisher_manager, transformer_manager,
+                 stages=None):
         self.cfg = cfg
 
         try:
@@ -112,10 +274,16 @@ class Pipeline(object):
             raise PipelineException("Interval value should > 0", cfg)
 
         self._check_counters()
+        self.included_counters = frozenset(x for x in self.counters
+                                           if x[0] not in '!*')
+        self.excluded_counters = frozenset(x[1:] for x in self.counters
+                                           if x[0] == '!')
+        self._supported = {}
 
         self._check_publishers(cfg, publisher_manager)
 
-        self.transformers = self._setup_transformers(cfg, transformer_manager)
+        self.transformers = self._setup_transformers(cfg, transformer_manager,
+                                                     stages)
 
     def __str__(self):
         return self.name
@@ -154,24 +322,62 @@ class Pipeline(object):
                 set(self.publishers).difference(
                     set(self.publisher_manager.names())), cfg)
 
-    def _setup_transformers(self, cfg, transformer_manager):
+    def _setup_transformers(self, cfg, transformer_manager, stages=None):
+        """Build the transformer instances of the pipeline.
+
+        Transformers given a 'stage' name are shared stages: the first
+        pipeline defining a stage registers its instance in stages and
+        the following ones reuse it. Shared stages must come first in
+        the chain, and pipelines sharing a stage must have the same
+        counters, interval and preceding stages, so the stage always
+        sees the same input whatever the pipeline.
+        """
         transformer_cfg = cfg['transformers'] or []
         transformers = []
+        stage_names = []
+        self.shared_stages = {}
         for transformer in transformer_cfg:
             parameter = transformer['parameters'] or {}
+            stage = transformer.get('stage')
+            if stage is not None:
+                if len(stage_names) != len(transformers):
+                    raise PipelineException(
+                        "Shared stage %s follows an unshared transformer" %
+                        stage, cfg)
+                stage_names.append(stage)
+                definition = (tuple(stage_names), transformer['name'],
+                              parameter, sorted(self.counters),
+                              self.interval)
+                if stages is not None and stage in stages:
+                    shared_definition, instance = stages[stage]
+                    if shared_definition != definition:
+                        raise PipelineException(
+                            "Shared stage %s defined differently in "
+                            "another pipeline" % stage, cfg)
+                    transformers.append(instance)
+                    self.shared_stages[stage] = stages[stage]
+                    LOG.info("Pipeline %s: Use shared stage %s",
+                             self, stage)
+                    continue
             try:
                 ext = transformer_manager.get_ext(transformer['name'])
             except KeyError:
                 raise PipelineException(
                     "No transformer named %s loaded" % transformer['name'],
                     cfg)
-            transformers.append(ext.plugin(**parameter))
+            instance = ext.plugin(**parameter)
+            if stage is not None:
+                self.shared_stages[stage] = (definition, instance)
+                if stages is not None:
+                    stages[stage] = (definition, instance)
+            transformers.append(instance)
             LOG.info("Pipeline %s: Setup transformer instance %s "
                      "with parameter %s",
                      self,
                      transformer['name'],
                      parameter)
 
+        self.shared_depth = len(stage_names)
         return transformers
 
     def _publish_counters_to_one_publisher(self, ext, ctxt, counters, source):
@@ -182,22 +388,67 @@ class Pipeline(object):
                         "from publisher %s", self, ext.name)
             LOG.exception(err)
 
-    def _transform_counter(self, start, ctxt, counter, source):
-        try:
-            for transformer in self.transformers[start:]:
-                counter = transformer.handle_sample(ctxt, counter, source)
-                if not counter:
-                    LOG.debug("Pipeline %s: Counter dropped by transformer %s",
-                              self, transformer)
-                    return
-            return counter
-        except Exception as err:
-            LOG.warning("Pipeline %s: Exit after error from transformer"
-                        "%s for %s",
-                        self, transformer, counter)
-            LOG.exception(err)
+    def _transform(self, transformer, ctxt, counters, source):
+        """Push a batch of counters through one transformer.
 
-    def _publish_counters(self, start, ctxt, counters, source):
+        Transformers implementing handle_samples() get the whole batch in
+        one call, the others get the counters one by one through
+        handle_sample().
+        """
+        handle_samples = getattr(transformer, 'handle_samples', None)
+        if handle_samples is not None:
+            try:
+                return handle_samples(ctxt, counters, source)
+            except Exception as err:
+                LOG.warning("Pipeline %s: Exit after error from "
+                            "transformer %s for %d counters",
+                            self, transformer, len(counters))
+                LOG.exception(err)
+                return []
+        transformed = []
+        for counter in counters:
+            try:
+                counter = transformer.handle_sample(ctxt, counter, source)
+            except Exception as err:
+                LOG.warning("Pipeline %s: Exit after error from "
+                            "transformer %s for %s",
+                            self, transformer, counter)
+                LOG.exception(err)
+                continue
+            if counter:
+                transformed.append(counter)
+        if len(transformed) < len(counters):
+            LOG.debug("Pipeline %s: %d counters dropped by "
+                      "transformer %s", self,
+                      len(counters) - len(transformed), transformer)
+        return transformed
+
+    def _transform_counters(self, start, ctxt, counters, source,
+                            shared=None):
+        """Push a batch of counters through the transformers.
+
+        param shared: output of the shared stages for this batch, keyed
+                      by stage instance. The deepest stage already run
+                      by another pipeline is reused instead of being run
+                      again, and the stages run here are recorded.
+        """
+        depth = self.shared_depth if shared is not None else 0
+        for i in range(depth - 1, start - 1, -1):
+            if self.transformers[i] in shared:
+                counters = list(shared[self.transformers[i]])
+                start = i + 1
+                break
+        for i in range(start, len(self.transformers)):
+            if not counters:
+                break
+            transformer = self.transformers[i]
+            counters = self._transform(transformer, ctxt, counters, source)
+            if i < depth:
+                shared[transformer] = counters
+        return counters
+
+    def _publish_counters(self, start, ctxt, counters, source,
+                          shared=None, buffer=None):
         """Push counter into pipeline for publishing.
 
         param start: the first transformer that the counter will be injected.
@@ -206,16 +457,21 @@ class Pipeline(object):
         param ctxt: execution context from the manager or service
         param counters: counter list
         param source: counter source
+        param shared: output of the shared stages, see _transform_counters
+        param buffer: PublishBuffer coalescing the transformed counters,
+                      if not given they are published at once
 
         """
 
-        transformed_counters = []
-        for counter in counters:
-            LOG.audit("Pipeline %s: Transform counter %s from %s transformer",
-                      self, counter, start)
-            counter = self._transform_counter(start, ctxt, counter, source)
-            if counter:
-                transformed_counters.append(counter)
+        LOG.audit("Pipeline %s: Transform %d counters from %s transformer",
+                  self, len(counters), start)
+        transformed_counters = self._transform_counters(start, ctxt,
+                                                        counters, source,
+                                                        shared)
+
+        if buffer is not None:
+            buffer.add(self, ctxt, transformed_counters, source)
+            return
 
         LOG.audit("Pipeline %s: Publishing counters", self)
         self.publisher_manager.map(self.publishers,
@@ -227,46 +483,74 @@ class Pipeline(object):
 
         LOG.audit("Pipeline %s: Published counters", self)
 
+    def publish_to(self, publisher_name, ctxt, counters, source):
+        """Publish already transformed counters to one publisher."""
+        LOG.audit("Pipeline %s: Publishing %d counters to %s",
+                  self, len(counters), publisher_name)
+        self.publisher_manager.map([publisher_name],
+                                   self._publish_counters_to_one_publisher,
+                                   ctxt=ctxt,
+                                   counters=counters,
+                                   source=source,
+                                   )
+
     def publish_counter(self, ctxt, counter, source):
         self.publish_counters(ctxt, [counter], source)
 
     def publish_counters(self, ctxt, counters, source):
-        for counter_name, counters in itertools.groupby(
-                sorted(counters, key=lambda c: c.name),
-                lambda c: c.name):
+        for counter_name, counters in utils.partition_by(counters,
+                                                         _counter_name):
             if self.support_counter(counter_name):
                 self._publish_counters(0, ctxt, counters, source)
 
-    # (yjiang5) To support counters like instance:m1.tiny,
-    # which include variable part at the end starting with ':'.
-    # Hope we will not add such counters in future.
-    def _variable_counter_name(self, name):
-        m = name.partition(':')
-        if m[1] == ':':
-            return m[1].join((m[0], '*'))
-        else:
-            return name
+    def publish_supported_counters(self, ctxt, counters, source,
+                                   shared=None, buffer=None):
+        """Publish counters already known to be supported by the pipeline.
 
-    def support_counter(self, counter_name):
-        counter_name = self._variable_counter_name(counter_name)
-        if ('!' + counter_name) in self.counters:
-            return False
-        if '*' in self.counters:
-            return True
-        elif self.counters[0][0] == '!':
-            return not ('!' + counter_name) in self.counters
-        else:
-            return counter_name in self.counters
+        This is used by callers that have resolved the counter names
+        through a CounterRouter and skips the per-name support check.
+        The same shared dict should be given for every pipeline the
+        counters are routed to, so shared stages run only once.
+        """
+        self._publish_counters(0, ctxt, counters, source, shared, buffer)
 
-    def flush(self, ctxt, source):
-        """Flush data after all counter have been injected to pipeline."""
+    def support_counter(self, counter_name):
+        try:
+            return self._supported[counter_name]
+        except KeyError:
+            name = _variable_counter_name(counter_name)
+            if self.included_counters:
+                supported = name in self.included_counters
+            else:
+                supported = name not in self.excluded_counters
+            if len(self._supported) >= cfg.CONF.pipeline_route_cache_size:
+                self._supported.clear()
+            self._supported[counter_name] = supported
+            return supported
+
+    def flush(self, ctxt, source, shared=None, buffer=None):
+        """Flush data after all counter have been injected to pipeline.
+
+        The same shared dict should be given when flushing every pipeline
+        of a manager, so shared stages are flushed only once and what
+        they release is published by all the pipelines sharing them.
+        What is released is added to buffer when one is given.
+        """
 
         LOG.audit("Flush pipeline %s", self)
         for (i, transformer) in enumerate(self.transformers):
             try:
+                if shared is not None and i < self.shared_depth:
+                    if transformer not in shared:
+                        shared[transformer] = (
+                            list(transformer.flush(ctxt, source)), {})
+                    counters, downstream = shared[transformer]
+                    self._publish_counters(i + 1, ctxt, list(counters),
+                                           source, downstream, buffer)
+                    continue
                 self._publish_counters(i + 1, ctxt,
                                        list(transformer.flush(ctxt, source)),
-                                       source)
+                                       source, buffer=buffer)
             except Exception as err:
                 LOG.warning(
                     "Pipeline %s: Error flushing "
@@ -277,6 +561,15 @@ class Pipeline(object):
     def get_interval(self):
         return self.interval
 
+    def get_flush_interval(self):
+        """Return the shortest periodic flush interval of the transformers.
+
+        None is returned when no transformer needs periodic flushing.
+        """
+        intervals = [t.flush_interval for t in self.transformers
+                     if getattr(t, 'flush_interval', None)]
+        return min(intervals) if intervals else None
+
 
 class PipelineManager(object):
     """Pipeline Manager
@@ -289,7 +582,8 @@ class PipelineManager(object):
 
     def __init__(self, cfg,
                  transformer_manager,
-                 publisher_manager):
+                 publisher_manager,
+                 cfg_file=None):
         """Setup the pipelines according to config.
 
         The top of the cfg is a list of pipeline definitions.
@@ -328,12 +622,100 @@ class PipelineManager(object):
 
         Transformer's name is plugin name in setup.py.
 
+        A transformer may also be given a "stage" name, making it a
+        shared stage: pipelines naming the same stage use a single
+        transformer instance, and each counter goes through the stage
+        once before fanning out to the rest of these pipelines. Shared
+        stages must be at the head of the transformer chain, and be
+        defined identically, with the same preceding stages, in
+        pipelines having the same counters and interval.
+
         Publisher's name is plugin name in setup.py
 
+        cfg_file is the file cfg was loaded from, checked for changes by
+        reload().
+
+        """
+        self.transformer_manager = transformer_manager
+        self.publisher_manager = publisher_manager
+        self.cfg_file = cfg_file
+        self.cfg_mtime = os.path.getmtime(cfg_file) if cfg_file else None
+        self.pipelines = self._setup_pipelines(cfg)
+        self.router = CounterRouter(self.pipelines)
+        self.buffer = self._setup_buffer()
+
+    @staticmethod
+    def _setup_buffer():
+        """Return the buffer holding counters across polling cycles, if
+        publish_coalesce_max_latency enables one.
+        """
+        if cfg.CONF.publish_coalesce_max_latency > 0:
+            return PublishBuffer(
+                max_latency=cfg.CONF.publish_coalesce_max_latency)
+
+    def _setup_pipelines(self, cfg, current=()):
+        """Build the pipelines defined in cfg.
+
+        Pipelines of current whose definition is unchanged are reused
+        as they are, keeping their transformers and the state held by
+        them.
+        """
+        current = list(current)
+        kept = {}
+        stages = {}
+        for i, pipedef in enumerate(cfg):
+            for pipe in current:
+                if pipe.cfg == pipedef:
+                    current.remove(pipe)
+                    kept[i] = pipe
+                    stages.update(pipe.shared_stages)
+                    break
+        return [kept[i] if i in kept else
+                Pipeline(pipedef, self.publisher_manager,
+                         self.transformer_manager, stages)
+                for i, pipedef in enumerate(cfg)]
+
+    def reload(self, context, source):
+        """Rebuild the pipelines whose definition changed in cfg_file.
+
+        Nothing is done if the file has not been modified since it was
+        last loaded. Unchanged pipelines keep their transformers, while
+        the transformers of the pipelines dropped are flushed, so the
+        counters they hold are not lost. An invalid file is logged and
+        the current pipelines are kept.
+
+        Return True if the pipelines changed.
         """
-        self.pipelines = [Pipeline(pipedef, publisher_manager,
-                                   transformer_manager)
-                          for pipedef in cfg]
+        if not self.cfg_file:
+            return False
+        try:
+            mtime = os.path.getmtime(self.cfg_file)
+            if mtime == self.cfg_mtime:
+                return False
+            self.cfg_mtime = mtime
+            pipelines = self._setup_pipelines(
+                _load_pipeline_cfg(self.cfg_file), self.pipelines)
+        except Exception as err:
+            LOG.error("Unable to reload pipeline config file %s: %s",
+                      self.cfg_file, err)
+            return False
+
+        retired = [p for p in self.pipelines if p not in pipelines]
+        if not retired and len(pipelines) == len(self.pipelines):
+            return False
+        LOG.info("Pipelines reloaded, %d rebuilt, %d removed",
+                 len([p for p in pipelines if p not in self.pipelines]),
+                 len(retired))
+
+        # Shared stages still in use must not be flushed with the
+        # pipelines being removed, mark them as already flushed
+        shared = dict((t, ([], {}))
+                      for p in pipelines for t in p.transformers)
+        for p in retired:
+            p.flush(context, source, shared)
+        self.pipelines = pipelines
+        self.router = CounterRouter(self.pipelines)
+        return True
 
     def publisher(self, context, source):
         """Build a new Publisher for these manager pipelines.
@@ -341,23 +723,49 @@ class PipelineManager(object):
         :param context: The context.
         :param source: Counter source.
         """
-        return PublishContext(context, source, self.pipelines)
+        return PublishContext(context, source, self.pipelines, self.router,
+                              self.buffer)
 
+    def get_flush_interval(self):
+        """Return the interval at which flush() should be called periodically.
 
-def setup_pipeline(transformer_manager, publisher_manager):
-    """Setup pipeline manager according to yaml config file."""
-    cfg_file = cfg.CONF.pipeline_cfg_file
-    if not os.path.exists(cfg_file):
-        cfg_file = cfg.CONF.find_file(cfg_file)
+        None is returned when no pipeline needs periodic flushing.
+        """
+        intervals = [p.get_flush_interval() for p in self.pipelines]
+        if self.buffer is not None:
+            intervals.append(self.buffer.max_latency)
+        intervals = [i for i in intervals if i]
+        return min(intervals) if intervals else None
+
+    def flush(self, context, source):
+        """Flush the transformers of every pipeline, and publish the
+        counters held across cycles for long enough.
+        """
+        shared = {}
+        buffer = self.buffer or PublishBuffer()
+        for p in self.pipelines:
+            p.flush(context, source, shared, buffer)
+        buffer.publish(context, force=buffer is not self.buffer)
 
-    LOG.debug("Pipeline config file: %s", cfg_file)
 
+def _load_pipeline_cfg(cfg_file):
     with open(cfg_file) as fap:
         data = fap.read()
 
     pipeline_cfg = yaml.safe_load(data)
     LOG.info("Pipeline config: %s", pipeline_cfg)
+    return pipeline_cfg
+
+
+def setup_pipeline(transformer_manager, publisher_manager):
+    """Setup pipeline manager according to yaml config file."""
+    cfg_file = cfg.CONF.pipeline_cfg_file
+    if not os.path.exists(cfg_file):
+        cfg_file = cfg.CONF.find_file(cfg_file)
+
+    LOG.debug("Pipeline config file: %s", cfg_file)
 
-    return PipelineManager(pipeline_cfg,
+    return PipelineManager(_load_pipeline_cfg(cfg_file),
                            transformer_manager,
-                           publisher_manager)
+                           publisher_manager,
+                           cfg_file)
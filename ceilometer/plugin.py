@@ -21,11 +21,38 @@
 import abc
 import collections
 
+from ceilometer.openstack.common import timeutils
+
 
 ExchangeTopics = collections.namedtuple('ExchangeTopics',
                                         ['exchange', 'topics'])
 
 
+class PollCycle(object):
+    """Data shared by the pollsters during one polling cycle.
+
+    The cycle timestamp is formatted once, so the counters of a cycle
+    all carry the same timestamp, and the metadata of each resource is
+    built once per cycle however many counters are made from it.
+    """
+
+    def __init__(self):
+        self.timestamp = timeutils.isotime()
+        self._metadata = {}
+
+    def get_metadata(self, key, build, *args):
+        """Return the metadata cached under key.
+
+        On first use the metadata is built by calling build(*args). The
+        returned dict is shared and must not be modified.
+        """
+        try:
+            return self._metadata[key]
+        except KeyError:
+            metadata = self._metadata[key] = build(*args)
+            return metadata
+
+
 class PluginBase(object):
     """Base class for all plugins.
     """
@@ -19,8 +19,13 @@
 # under the License.
 
 import abc
+
+from oslo.config import cfg
 from stevedore import dispatch
 
+from ceilometer.publisher import fanout
+from ceilometer.publisher import spool
+
 
 class PublisherExtensionManager(dispatch.NameDispatchExtensionManager):
 
@@ -30,6 +35,23 @@ class PublisherExtensionManager(dispatch.NameDispatchExtensionManager):
             check_func=lambda x: True,
             invoke_on_load=True,
         )
+        if cfg.CONF.publisher_spool_dir:
+            for ext in self.extensions:
+                ext.obj = spool.SpoolingPublisher(ext.name, ext.obj)
+        if cfg.CONF.publisher_async:
+            for ext in self.extensions:
+                ext.obj = fanout.QueuedPublisher(ext.name, ext.obj)
+
+    def get_stats(self):
+        """Return the queue and spool statistics of the publishers."""
+        stats = {}
+        for ext in self.extensions:
+            obj = ext.obj
+            while isinstance(obj, (fanout.QueuedPublisher,
+                                   spool.SpoolingPublisher)):
+                stats.setdefault(ext.name, {}).update(obj.get_stats())
+                obj = obj.publisher
+        return stats
 
 
 class PublisherBase(object):
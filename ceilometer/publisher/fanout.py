@@ -0,0 +1,133 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Asynchronous publisher fan-out.
+
+Each publisher is given its own bounded queue drained by a dedicated
+green thread, so a slow publisher does not hold up the other ones nor
+the polling loop feeding the pipelines.
+"""
+
+import time
+
+import eventlet
+from eventlet import queue
+from oslo.config import cfg
+
+from ceilometer.openstack.common import log
+
+
+LOG = log.getLogger(__name__)
+
+QUEUE_POLICIES = ('block', 'drop_oldest')
+
+OPTS = [
+    cfg.BoolOpt('publisher_async',
+                default=False,
+                help='Publish counters from a per-publisher queue and '
+                'green thread instead of the caller\'s thread'),
+    cfg.IntOpt('publisher_queue_size',
+               default=1024,
+               help='Maximum number of counter batches queued for each '
+               'publisher in asynchronous mode'),
+    cfg.StrOpt('publisher_queue_policy',
+               default='block',
+               help='What to do when a publisher queue is full: block the '
+               'caller, or drop_oldest queued batch'),
+]
+
+cfg.CONF.register_opts(OPTS)
+
+
+class QueuedPublisher(object):
+    """Publisher proxy feeding another publisher from a bounded queue."""
+
+    def __init__(self, name, publisher, size=None, policy=None):
+        if size is None:
+            size = cfg.CONF.publisher_queue_size
+        if policy is None:
+            policy = cfg.CONF.publisher_queue_policy
+        if policy not in QUEUE_POLICIES:
+            raise ValueError('Invalid publisher queue policy %s' % policy)
+        self.name = name
+        self.publisher = publisher
+        self.policy = policy
+        self.queue = queue.Queue(size)
+        self.published = 0
+        self.dropped = 0
+        self.errors = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self._worker = None
+
+    def publish_counters(self, context, counters, source):
+        if self._worker is None:
+            self._worker = eventlet.spawn(self._run)
+        item = (context, counters, source)
+        if self.policy == 'block':
+            self.queue.put(item)
+            return
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            try:
+                self.queue.get_nowait()
+                self.queue.task_done()
+                self.dropped += 1
+                LOG.warning('Publisher %s queue full, dropping oldest batch',
+                            self.name)
+            except queue.Empty:
+                pass
+            self.queue.put_nowait(item)
+
+    def _publish(self, context, counters, source):
+        start = time.time()
+        try:
+            self.publisher.publish_counters(context, counters, source)
+        except Exception as err:
+            self.errors += 1
+            LOG.warning('Continue after error from publisher %s', self.name)
+            LOG.exception(err)
+        else:
+            self.published += 1
+        latency = time.time() - start
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                self._publish(*item)
+            finally:
+                self.queue.task_done()
+
+    def join(self):
+        """Wait until every queued batch has been published."""
+        self.queue.join()
+
+    def stop(self):
+        if self._worker is not None:
+            self._worker.kill()
+            self._worker = None
+
+    def get_stats(self):
+        calls = self.published + self.errors
+        return {
+            'queue_depth': self.queue.qsize(),
+            'published': self.published,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'latency_avg': self.latency_total / calls if calls else 0.0,
+            'latency_max': self.latency_max,
+        }
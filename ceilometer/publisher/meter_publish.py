@@ -18,14 +18,16 @@
 """Publish a counter using the preferred RPC mechanism.
 """
 
-import itertools
+import operator
 
 from oslo.config import cfg
 
+from ceilometer.collector import codec
 from ceilometer.collector import meter as meter_api
 from ceilometer.openstack.common import log
 from ceilometer.openstack.common import rpc
 from ceilometer import publisher
+from ceilometer import utils
 
 
 LOG = log.getLogger(__name__)
@@ -35,8 +37,18 @@ PUBLISH_OPTS = [
                default='metering',
                help='the topic ceilometer uses for metering messages',
                ),
+    cfg.StrOpt('metering_topic_layout',
+               default='both',
+               help='where metering messages are sent: "aggregate" sends '
+               'every batch to the metering topic, "per_meter" sends the '
+               'meters of each counter name to <metering topic>.<name>, '
+               '"both" does both. Meters are signed once, each message is '
+               'then serialized and cast on its own by the rpc layer',
+               ),
 ]
 
+TOPIC_LAYOUTS = ('aggregate', 'per_meter', 'both')
+
 
 def register_opts(config):
     """Register the options for publishing metering messages.
@@ -56,28 +68,47 @@ class MeterPublisher(publisher.PublisherBase):
         :param source: counter source
         """
 
-        meters = [
-            meter_api.meter_message_from_counter(counter,
-                                                 cfg.CONF.metering_secret,
-                                                 source)
-            for counter in counters
-        ]
+        layout = cfg.CONF.metering_topic_layout
+        if layout not in TOPIC_LAYOUTS:
+            raise ValueError('Invalid metering topic layout %s' % layout)
+
+        meters = meter_api.meter_messages_from_counters(
+            counters,
+            cfg.CONF.metering_secret,
+            source)
 
         topic = cfg.CONF.metering_topic
-        msg = {
-            'method': 'record_metering_data',
-            'version': '1.0',
-            'args': {'data': meters},
-        }
-        LOG.debug('PUBLISH: %s', str(msg))
-        rpc.cast(context, topic, msg)
-
-        for meter_name, meter_list in itertools.groupby(
-                sorted(meters, key=lambda m: m['counter_name']),
-                lambda m: m['counter_name']):
-            msg = {
-                'method': 'record_metering_data',
-                'version': '1.0',
-                'args': {'data': list(meter_list)},
-            }
-            rpc.cast(context, topic + '.' + meter_name, msg)
+        # The meter dicts are built and signed once, and shared by the
+        # messages of every topic
+        if layout != 'per_meter':
+            aggregate = meters
+            if cfg.CONF.metering_metadata_by_reference:
+                # Only collectors read the aggregate topic and know how
+                # to resolve references
+                aggregate = meter_api.reference_metadata(meters)
+            if cfg.CONF.metering_codec == 'none':
+                msg = {
+                    'method': 'record_metering_data',
+                    'version': '1.0',
+                    'args': {'data': aggregate},
+                }
+            else:
+                # Encoded batches need a collector implementing 1.1
+                msg = {
+                    'method': 'record_metering_data_encoded',
+                    'version': '1.1',
+                    'args': codec.encode(aggregate,
+                                         cfg.CONF.metering_codec),
+                }
+            LOG.debug('PUBLISH: %s', msg)
+            rpc.cast(context, topic, msg)
+
+        if layout != 'aggregate':
+            for meter_name, meter_list in utils.partition_by(
+                    meters, operator.itemgetter('counter_name')):
+                msg = {
+                    'method': 'record_metering_data',
+                    'version': '1.0',
+                    'args': {'data': meter_list},
+                }
+                rpc.cast(context, topic + '.' + meter_name, msg)
@@ -0,0 +1,321 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Local spool for counter batches a publisher failed to publish.
+
+Batches are appended as JSON lines to segment files of a spool
+directory. A new segment is started when the current one is over
+publisher_spool_segment_size bytes, and the oldest segments are dropped
+when the spool is over publisher_spool_max_size bytes.
+
+A green thread replays the spooled batches in order, at most
+publisher_spool_replay_rate batches per second, waiting a jittered
+delay after each failure so that agents recovering from the same
+outage do not retry all at once. New batches are spooled as long as
+older ones are waiting, so ordering is kept. The replay position is
+saved after each batch: a batch may be published twice if the service
+stops right after publishing it, but none is lost.
+
+A batch failing publisher_spool_max_retries replays in a row is moved
+to the dead letter file of the spool directory, so that a batch the
+publisher always rejects does not hold back the ones behind it.
+"""
+
+import os
+import random
+import time
+
+import eventlet
+from oslo.config import cfg
+
+from ceilometer import counter as ceilocounter
+from ceilometer.openstack.common import context
+from ceilometer.openstack.common import jsonutils
+from ceilometer.openstack.common import log
+
+
+LOG = log.getLogger(__name__)
+
+OPTS = [
+    cfg.StrOpt('publisher_spool_dir',
+               default='',
+               help='Directory where counter batches that could not be '
+               'published are spooled until they can be replayed, empty '
+               'to disable spooling. Each service needs its own '
+               'directory'),
+    cfg.IntOpt('publisher_spool_segment_size',
+               default=1024 * 1024,
+               help='Size in bytes over which a new spool segment is '
+               'started'),
+    cfg.IntOpt('publisher_spool_max_size',
+               default=100 * 1024 * 1024,
+               help='Size in bytes over which the oldest spool segments '
+               'are dropped'),
+    cfg.FloatOpt('publisher_spool_replay_rate',
+                 default=10.0,
+                 help='Maximum number of spooled batches replayed per '
+                 'second'),
+    cfg.IntOpt('publisher_spool_retry_interval',
+               default=30,
+               help='Mean number of seconds to wait before replaying '
+               'again after a failure'),
+    cfg.IntOpt('publisher_spool_max_retries',
+               default=10,
+               help='Number of failed replays in a row after which a '
+               'spooled batch is moved to the dead letter file of the '
+               'spool, 0 to retry forever'),
+]
+
+cfg.CONF.register_opts(OPTS)
+
+SEGMENT_FORMAT = '%020d.spool'
+OFFSET_FILE = 'replay.offset'
+DEAD_LETTER_FILE = 'dead.letter'
+
+
+class SpoolingPublisher(object):
+    """Publisher proxy spooling the batches another publisher fails to
+    publish, and replaying them once it recovers.
+    """
+
+    def __init__(self, name, publisher, directory=None):
+        if directory is None:
+            directory = os.path.join(cfg.CONF.publisher_spool_dir, name)
+        self.name = name
+        self.publisher = publisher
+        self.directory = directory
+        self.segment_size = cfg.CONF.publisher_spool_segment_size
+        self.max_size = cfg.CONF.publisher_spool_max_size
+        self.replay_rate = cfg.CONF.publisher_spool_replay_rate
+        self.retry_interval = cfg.CONF.publisher_spool_retry_interval
+        self.max_retries = cfg.CONF.publisher_spool_max_retries
+        self.spooled = 0
+        self.replayed = 0
+        self.dropped = 0
+        self.dead = 0
+        self.failures = 0
+        self.replay_start = None
+        self.replay_count = 0
+        self._writer = None
+        self._worker = None
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.segments = sorted(int(f.split('.')[0])
+                               for f in os.listdir(directory)
+                               if f.endswith('.spool'))
+        self.offset = self._load_offset()
+        self.depth = self._count_pending()
+
+    def _segment_path(self, segment):
+        return os.path.join(self.directory, SEGMENT_FORMAT % segment)
+
+    def _load_offset(self):
+        try:
+            with open(os.path.join(self.directory, OFFSET_FILE)) as f:
+                segment, offset = map(int, f.read().split())
+        except (IOError, ValueError):
+            return 0
+        if self.segments and self.segments[0] == segment:
+            return offset
+        return 0
+
+    def _save_offset(self):
+        with open(os.path.join(self.directory, OFFSET_FILE), 'w') as f:
+            f.write('%d %d' % (self.segments[0], self.offset))
+
+    def _count_pending(self):
+        count = 0
+        for i, segment in enumerate(self.segments):
+            with open(self._segment_path(segment)) as f:
+                if i == 0:
+                    f.seek(self.offset)
+                count += sum(1 for _line in f)
+        return count
+
+    def _size(self):
+        return sum(os.path.getsize(self._segment_path(s))
+                   for s in self.segments)
+
+    def _append(self, counters, source):
+        if (self._writer is None or
+                self._writer.tell() >= self.segment_size):
+            self._rotate()
+        record = jsonutils.dumps({'timestamp': time.time(),
+                                  'source': source,
+                                  'counters': [list(c) for c in counters]})
+        self._writer.write(record + '\n')
+        self._writer.flush()
+        os.fsync(self._writer.fileno())
+        self.depth += 1
+        self.spooled += 1
+
+    def _rotate(self):
+        if self._writer is not None:
+            self._writer.close()
+        segment = self.segments[-1] + 1 if self.segments else 0
+        self.segments.append(segment)
+        self._writer = open(self._segment_path(segment), 'a')
+        self._trim()
+
+    def _trim(self):
+        while len(self.segments) > 1 and self._size() > self.max_size:
+            with open(self._segment_path(self.segments[0])) as f:
+                f.seek(self.offset)
+                dropped = sum(1 for _line in f)
+            LOG.warning('Spool of publisher %s full, dropping %d batches',
+                        self.name, dropped)
+            self.dropped += dropped
+            self.depth -= dropped
+            self._remove_head()
+
+    def _remove_head(self):
+        os.unlink(self._segment_path(self.segments.pop(0)))
+        self.offset = 0
+        self.failures = 0
+        if self.segments:
+            self._save_offset()
+
+    def _read_head(self):
+        """Return the oldest spooled record, or None if there is none
+        left in the oldest segment.
+        """
+        with open(self._segment_path(self.segments[0])) as f:
+            f.seek(self.offset)
+            line = f.readline()
+        if not line.endswith('\n'):
+            # Nothing, or a batch being written
+            return None, 0
+        return jsonutils.loads(line), len(line)
+
+    def _skip_head(self, segment, size):
+        """Move the replay position past the oldest spooled record, read
+        from segment.
+        """
+        self.failures = 0
+        if not self.segments or self.segments[0] != segment:
+            # The segment was dropped by _trim() while publishing, and
+            # the batch counted as dropped
+            return
+        self.offset += size
+        self._save_offset()
+        self.depth -= 1
+
+    def _dead_letter(self, record):
+        with open(os.path.join(self.directory, DEAD_LETTER_FILE), 'a') as f:
+            f.write(jsonutils.dumps(record) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self.dead += 1
+
+    def publish_counters(self, context, counters, source):
+        if self.depth:
+            # Keep ordering behind the batches waiting for replay
+            self._append(counters, source)
+        else:
+            try:
+                self.publisher.publish_counters(context, counters, source)
+                return
+            except Exception as err:
+                LOG.warning('Spooling counters after error from '
+                            'publisher %s: %s', self.name, err)
+                self._append(counters, source)
+        if self._worker is None:
+            self._worker = eventlet.spawn(self._run)
+
+    def _retry_delay(self):
+        return self.retry_interval * random.uniform(0.5, 1.5)
+
+    def _run(self):
+        self.replay_start = time.time()
+        self.replay_count = 0
+        try:
+            while self.replay_one():
+                if self.replay_rate:
+                    eventlet.sleep(1.0 / self.replay_rate)
+        finally:
+            self._worker = None
+
+    def replay_one(self):
+        """Replay the oldest spooled batch.
+
+        :returns: True while batches are left to replay.
+        """
+        while self.segments:
+            record, size = self._read_head()
+            if record is not None:
+                break
+            if self.segments[0] == self.segments[-1]:
+                # Caught up with the batches being spooled
+                if self._writer is not None:
+                    self._writer.close()
+                    self._writer = None
+                self._remove_head()
+                self.depth = 0
+                return False
+            self._remove_head()
+        else:
+            self.depth = 0
+            return False
+        counters = [ceilocounter.Counter(*c) for c in record['counters']]
+        segment = self.segments[0]
+        try:
+            self.publisher.publish_counters(context.get_admin_context(),
+                                            counters, record['source'])
+        except Exception as err:
+            self.failures += 1
+            if self.max_retries and self.failures >= self.max_retries:
+                LOG.error('Moving spooled counters to the dead letter file '
+                          'after %d failed replays to publisher %s: %s',
+                          self.failures, self.name, err)
+                self._dead_letter(record)
+                self._skip_head(segment, size)
+                return True
+            delay = self._retry_delay()
+            LOG.warning('Unable to replay spooled counters to publisher '
+                        '%s, retrying in %d seconds: %s',
+                        self.name, delay, err)
+            eventlet.sleep(delay)
+            return True
+        self.replayed += 1
+        self.replay_count += 1
+        self._skip_head(segment, size)
+        return True
+
+    def stop(self):
+        if self._worker is not None:
+            self._worker.kill()
+            self._worker = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def get_stats(self):
+        age = 0.0
+        if self.depth and self.segments:
+            record, _size = self._read_head()
+            if record is not None:
+                age = time.time() - record['timestamp']
+        rate = 0.0
+        if self._worker is not None and self.replay_start is not None:
+            elapsed = time.time() - self.replay_start
+            if elapsed > 0:
+                rate = self.replay_count / elapsed
+        return {
+            'spool_depth': self.depth,
+            'spool_age': age,
+            'spool_spooled': self.spooled,
+            'spool_replayed': self.replayed,
+            'spool_dropped': self.dropped,
+            'spool_dead': self.dead,
+            'spool_replay_rate': rate,
+        }
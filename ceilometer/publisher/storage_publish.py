@@ -0,0 +1,68 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Publish counters straight to the storage, without going through the
+message bus and the collector.
+"""
+
+from oslo.config import cfg
+
+from ceilometer.collector import meter as meter_api
+from ceilometer.openstack.common import log
+from ceilometer import publisher
+from ceilometer import storage
+from ceilometer import utils
+
+
+LOG = log.getLogger(__name__)
+
+
+class StoragePublisher(publisher.PublisherBase):
+    """Publisher recording counters in the configured database.
+
+    The counters of each call are written as one batch. The connection
+    is opened on first use. When a write fails, the connection is
+    reopened and the whole batch written again, then a second failure
+    is raised to the pipeline. Drivers do not tell which meters of a
+    failed batch were recorded, so those may be recorded twice.
+    """
+
+    def __init__(self):
+        self.storage_conn = None
+
+    def _connect(self):
+        self.storage_conn = storage.get_connection(cfg.CONF)
+
+    def publish_counters(self, context, counters, source):
+        """Record counters in the database.
+
+        :param context: Execution context from the service or RPC call
+        :param counters: Counters from pipeline after transformation
+        :param source: counter source
+        """
+        # Counters do not leave the process, there is no need to sign them
+        meters = meter_api.meter_messages_from_counters(counters, None,
+                                                        source)
+        for meter in meters:
+            if meter.get('timestamp'):
+                meter['timestamp'] = utils.parse_timestamp(
+                    meter['timestamp'])
+
+        if self.storage_conn is None:
+            self._connect()
+        try:
+            self.storage_conn.record_metering_data_batch(meters)
+        except Exception as err:
+            LOG.warning('Reconnecting to the database after error: %s', err)
+            self._connect()
+            self.storage_conn.record_metering_data_batch(meters)
@@ -0,0 +1,89 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Publish counters to the collector in UDP datagrams.
+
+Datagrams are sent without acknowledgement nor retry, so this publisher
+only suits meters for which some loss is acceptable.
+"""
+
+import itertools
+import socket
+
+from oslo.config import cfg
+
+from ceilometer.collector import meter as meter_api
+from ceilometer.collector import udp
+from ceilometer.openstack.common import log
+from ceilometer import publisher
+
+LOG = log.getLogger(__name__)
+
+OPTS = [
+    cfg.StrOpt('udp_publisher_host',
+               default='localhost',
+               help='Host of the collector the udp publisher sends '
+               'metering datagrams to'),
+    cfg.StrOpt('udp_publisher_codec',
+               default='json',
+               help='Codec of the metering datagrams: json or msgpack'),
+    cfg.IntOpt('udp_publisher_max_size',
+               default=8192,
+               help='Maximum size of a metering datagram, in bytes'),
+]
+
+cfg.CONF.register_opts(OPTS)
+
+
+class UDPPublisher(publisher.PublisherBase):
+
+    def __init__(self):
+        if cfg.CONF.udp_publisher_codec not in udp.CODECS:
+            raise ValueError('Invalid udp publisher codec %s' %
+                             cfg.CONF.udp_publisher_codec)
+        self.max_size = min(cfg.CONF.udp_publisher_max_size,
+                            udp.MAX_DATAGRAM_SIZE)
+        self.seqs = itertools.count()
+        self.address = None
+        self.socket = None
+
+    def _connect(self):
+        family, socktype, proto, _name, address = socket.getaddrinfo(
+            cfg.CONF.udp_publisher_host, cfg.CONF.udp_port,
+            0, socket.SOCK_DGRAM)[0]
+        self.socket = socket.socket(family, socktype, proto)
+        self.address = address
+
+    def publish_counters(self, context, counters, source):
+        """Send metering datagrams to the collector.
+
+        :param context: Execution context from the service or RPC call
+        :param counters: Counters from pipeline after transformation
+        :param source: counter source
+        """
+        meters = meter_api.meter_messages_from_counters(
+            counters,
+            cfg.CONF.metering_secret,
+            source)
+        if not meters:
+            return
+        datagrams = udp.pack_all(meters, cfg.CONF.udp_publisher_codec,
+                                 self.seqs, self.max_size)
+        if self.socket is None:
+            self._connect()
+        for datagram in datagrams:
+            try:
+                self.socket.sendto(datagram, self.address)
+            except socket.error as err:
+                LOG.warning('Unable to send metering datagram to %s: %s',
+                            self.address, err)
@@ -27,6 +27,7 @@ from stevedore import driver
 
 from ceilometer.openstack.common import log
 from ceilometer.openstack.common import timeutils
+from ceilometer import utils
 
 
 LOG = log.getLogger(__name__)
@@ -97,5 +98,5 @@ class SampleFilter(object):
         if not timestamp:
             return timestamp
         if not isinstance(timestamp, datetime.datetime):
-            timestamp = timeutils.parse_isotime(timestamp)
+            return utils.parse_timestamp(timestamp)
         return timeutils.normalize_time(timestamp)
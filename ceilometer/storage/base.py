@@ -82,6 +82,18 @@ class Connection(object):
         All timestamps must be naive utc datetime object.
         """
 
+    def record_metering_data_batch(self, data):
+        """Write a list of meters to the backend storage system.
+
+        Drivers able to write several meters at once should override
+        this, the default records them one by one.
+
+        :param data: a list of dictionaries such as returned by
+                     ceilometer.meter.meter_message_from_counter
+        """
+        for meter in data:
+            self.record_metering_data(meter)
+
     @abc.abstractmethod
     def get_users(self, source=None):
         """Return an iterable of user id strings.
@@ -61,6 +61,7 @@ from oslo.config import cfg
 from ceilometer.openstack.common import log, timeutils
 from ceilometer.storage import base
 from ceilometer.storage import models
+from ceilometer import utils
 
 LOG = log.getLogger(__name__)
 
@@ -207,43 +208,22 @@ class Connection(base.Connection):
         :param data: a dictionary such as returned by
                      ceilometer.meter.meter_message_from_counter
         """
-        # Make sure we know about the user and project
-        if data['user_id']:
-            user = self.user.row(data['user_id'])
-            sources = _load_hbase_list(user, 's')
-            # Update if source is new
-            if data['source'] not in sources:
-                user['f:s_%s' % data['source']] = "1"
-                self.user.put(data['user_id'], user)
-
-        project = self.project.row(data['project_id'])
-        sources = _load_hbase_list(project, 's')
-        # Update if source is new
-        if data['source'] not in sources:
-            project['f:s_%s' % data['source']] = "1"
-            self.project.put(data['project_id'], project)
+        self.record_metering_data_batch([data])
 
-        # Record the updated resource metadata.
-        received_timestamp = timeutils.utcnow()
-
-        resource = self.resource.row(data['resource_id'])
-        new_meter = "%s!%s!%s" % (
-            data['counter_name'], data['counter_type'], data['counter_unit'])
-        new_resource = {'f:resource_id': data['resource_id'],
-                        'f:project_id': data['project_id'],
-                        'f:user_id': data['user_id'],
-                        'f:metadata': json.dumps(data['resource_metadata']),
-                        'f:source': data["source"],
-                        'f:m_%s' % new_meter: "1",
-                        }
-        # Update if resource has new information
-        if new_resource != resource:
-            meters = _load_hbase_list(resource, 'm')
-            if new_meter not in meters:
-                new_resource['f:m_%s' % new_meter] = "1"
-
-            self.resource.put(data['resource_id'], new_resource)
+    def _add_sources(self, table, sources_by_row):
+        """Add sources to the sources list of rows, if new."""
+        for key, sources in sources_by_row.iteritems():
+            row = table.row(key)
+            new_sources = sources.difference(_load_hbase_list(row, 's'))
+            # Update if source is new
+            if new_sources:
+                for source in new_sources:
+                    row['f:s_%s' % source] = "1"
+                table.put(key, row)
 
+    @staticmethod
+    def _meter_row(data):
+        """Return the row key and columns recording a meter."""
         # Rowkey consists of reversed timestamp, meter and an md5 of
         # user+resource+project for purposes of uniqueness
         m = hashlib.md5()
@@ -278,7 +258,55 @@ class Connection(base.Connection):
         data['timestamp'] = ts
         # Save original meter.
         record['f:message'] = json.dumps(data)
-        self.meter.put(row, record)
+        return row, record
+
+    def record_metering_data_batch(self, data):
+        """Write a list of meters to the backend storage system.
+
+        The users, projects and resources of the batch are read and
+        updated once each, and the meters are sent in a single batch.
+
+        :param data: a list of dictionaries such as returned by
+                     ceilometer.meter.meter_message_from_counter
+        """
+        user_sources = defaultdict(set)
+        project_sources = defaultdict(set)
+        resources = {}
+        for meter in data:
+            # Make sure we know about the user and project
+            if meter['user_id']:
+                user_sources[meter['user_id']].add(meter['source'])
+            project_sources[meter['project_id']].add(meter['source'])
+
+            # The last meter of a resource gives its metadata
+            new_meter = "%s!%s!%s" % (meter['counter_name'],
+                                      meter['counter_type'],
+                                      meter['counter_unit'])
+            previous = resources.get(meter['resource_id'], {})
+            new_resource = dict((k, v) for k, v in previous.iteritems()
+                                if k.startswith('f:m_'))
+            new_resource.update({
+                'f:resource_id': meter['resource_id'],
+                'f:project_id': meter['project_id'],
+                'f:user_id': meter['user_id'],
+                'f:metadata': json.dumps(meter['resource_metadata']),
+                'f:source': meter["source"],
+                'f:m_%s' % new_meter: "1",
+            })
+            resources[meter['resource_id']] = new_resource
+
+        self._add_sources(self.user, user_sources)
+        self._add_sources(self.project, project_sources)
+
+        # Record the updated resource metadata.
+        for resource_id, new_resource in resources.iteritems():
+            # Update if resource has new information
+            if new_resource != self.resource.row(resource_id):
+                self.resource.put(resource_id, new_resource)
+
+        with self.meter.batch() as batch:
+            for meter in data:
+                batch.put(*self._meter_row(meter))
 
     def get_users(self, source=None):
         """Return an iterable of user id strings.
@@ -397,7 +425,7 @@ class Connection(base.Connection):
         gen = self.meter.scan(filter=q, row_start=start, row_stop=stop)
         for ignored, meter in gen:
             meter = json.loads(meter['f:message'])
-            meter['timestamp'] = timeutils.parse_strtime(meter['timestamp'])
+            meter['timestamp'] = utils.parse_timestamp(meter['timestamp'])
             yield models.Sample(**meter)
 
     def _update_meter_stats(self, stat, meter):
@@ -410,7 +438,7 @@ class Connection(base.Connection):
         :param period: length of the time bucket
         """
         vol = int(meter['f:counter_volume'])
-        ts = timeutils.parse_strtime(meter['f:timestamp'])
+        ts = utils.parse_timestamp(meter['f:timestamp'])
         stat.min = min(vol, stat.min or vol)
         stat.max = max(vol, stat.max)
         stat.sum = vol + (stat.sum or 0)
@@ -446,14 +474,14 @@ class Connection(base.Connection):
         if sample_filter.start:
             start_time = sample_filter.start
         elif meters:
-            start_time = timeutils.parse_strtime(meters[-1]['f:timestamp'])
+            start_time = utils.parse_timestamp(meters[-1]['f:timestamp'])
         else:
             start_time = None
 
         if sample_filter.end:
             end_time = sample_filter.end
         elif meters:
-            end_time = timeutils.parse_strtime(meters[0]['f:timestamp'])
+            end_time = utils.parse_timestamp(meters[0]['f:timestamp'])
         else:
             end_time = None
 
@@ -467,7 +495,7 @@ class Connection(base.Connection):
         # As our HBase meters are stored as newest-first, we need to iterate
         # in the reverse order
         for meter in meters[::-1]:
-            ts = timeutils.parse_strtime(meter['f:timestamp'])
+            ts = utils.parse_timestamp(meter['f:timestamp'])
             if period:
                 offset = int(timeutils.delta_seconds(
                     start_time, ts) / period) * period
@@ -533,6 +561,9 @@ class MTable(object):
     def put(self, key, data):
         self._rows[key] = data
 
+    def batch(self):
+        return MBatch(self)
+
     def scan(self, filter=None, columns=[], row_start=None, row_stop=None):
         sorted_keys = sorted(self._rows)
         # copy data between row_start and row_stop into a dict
@@ -602,6 +633,29 @@ class MTable(object):
         return r
 
 
+class MBatch(object):
+    """HappyBase.Batch mock
+    """
+    def __init__(self, table):
+        self.table = table
+        self._puts = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.send()
+
+    def put(self, key, data):
+        self._puts.append((key, data))
+
+    def send(self):
+        for key, data in self._puts:
+            self.table.put(key, data)
+        self._puts = []
+
+
 class MConnection(object):
     """HappyBase.Connection mock
     """
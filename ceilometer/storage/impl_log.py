@@ -62,6 +62,18 @@ class Connection(base.Connection):
                  data['resource_id'],
                  data['counter_volume'])
 
+    def record_metering_data_batch(self, data):
+        """Write a list of meters to the backend storage system.
+
+        :param data: a list of dictionaries such as returned by
+                     ceilometer.meter.meter_message_from_counter
+        """
+        LOG.info('metering data batch of %d meters: %s', len(data),
+                 ', '.join('%s for %s: %s' % (meter['counter_name'],
+                                              meter['resource_id'],
+                                              meter['counter_volume'])
+                           for meter in data))
+
     def get_users(self, source=None):
         """Return an iterable of user id strings.
 
@@ -128,6 +128,18 @@ def make_query_from_filter(sample_filter, require_meter=True):
     return q
 
 
+def _each(values):
+    """Return the $addToSet operand adding every item of values.
+
+    $each is only used for several items, so single items can still be
+    added by servers older than MongoDB 2.4.
+    """
+    values = list(values)
+    if len(values) == 1:
+        return values[0]
+    return {'$each': values}
+
+
 class Connection(base.Connection):
     """MongoDB connection.
     """
@@ -284,45 +296,64 @@ class Connection(base.Connection):
         :param data: a dictionary such as returned by
                      ceilometer.meter.meter_message_from_counter
         """
+        self.record_metering_data_batch([data])
+
+    def record_metering_data_batch(self, data):
+        """Write a list of meters to the backend storage system.
+
+        Each user, project and resource of the batch is updated once,
+        and the meters are inserted in a single call.
+
+        :param data: a list of dictionaries such as returned by
+                     ceilometer.meter.meter_message_from_counter
+        """
+        user_sources = {}
+        project_sources = {}
+        resources = {}
+        for meter in data:
+            user_sources.setdefault(meter['user_id'],
+                                    set()).add(meter['source'])
+            project_sources.setdefault(meter['project_id'],
+                                       set()).add(meter['source'])
+            # The last meter of a resource gives its metadata
+            _last, meters = resources.get(meter['resource_id'], (None, []))
+            meter_type = {'counter_name': meter['counter_name'],
+                          'counter_type': meter['counter_type'],
+                          'counter_unit': meter['counter_unit'],
+                          }
+            if meter_type not in meters:
+                meters.append(meter_type)
+            resources[meter['resource_id']] = (meter, meters)
+
         # Make sure we know about the user and project
-        self.db.user.update(
-            {'_id': data['user_id']},
-            {'$addToSet': {'source': data['source'],
-                           },
-             },
-            upsert=True,
-        )
-        self.db.project.update(
-            {'_id': data['project_id']},
-            {'$addToSet': {'source': data['source'],
-                           },
-             },
-            upsert=True,
-        )
+        for collection, sources_by_id in ((self.db.user, user_sources),
+                                          (self.db.project, project_sources)):
+            for _id, sources in sources_by_id.iteritems():
+                collection.update(
+                    {'_id': _id},
+                    {'$addToSet': {'source': _each(sources)}},
+                    upsert=True,
+                )
 
         # Record the updated resource metadata
-        self.db.resource.update(
-            {'_id': data['resource_id']},
-            {'$set': {'project_id': data['project_id'],
-                      'user_id': data['user_id'],
-                      'metadata': data['resource_metadata'],
-                      'source': data['source'],
-                      },
-             '$addToSet': {'meter': {'counter_name': data['counter_name'],
-                                     'counter_type': data['counter_type'],
-                                     'counter_unit': data['counter_unit'],
-                                     },
-                           },
-             },
-            upsert=True,
-        )
+        for resource_id, (meter, meters) in resources.iteritems():
+            self.db.resource.update(
+                {'_id': resource_id},
+                {'$set': {'project_id': meter['project_id'],
+                          'user_id': meter['user_id'],
+                          'metadata': meter['resource_metadata'],
+                          'source': meter['source'],
+                          },
+                 '$addToSet': {'meter': _each(meters)},
+                 },
+                upsert=True,
+            )
 
-        # Record the raw data for the meter. Use a copy so we do not
-        # modify a data structure owned by our caller (the driver adds
+        # Record the raw data for the meters. Use copies so we do not
+        # modify data structures owned by our caller (the driver adds
         # a new key '_id').
-        record = copy.copy(data)
-        self.db.meter.insert(record)
-        return
+        if data:
+            self.db.meter.insert([copy.copy(meter) for meter in data])
 
     def get_users(self, source=None):
         """Return an iterable of user id strings.
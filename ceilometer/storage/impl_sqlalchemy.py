@@ -148,24 +148,59 @@ class Connection(base.Connection):
         :param data: a dictionary such as returned by
                      ceilometer.meter.meter_message_from_counter
         """
+        self._record_metering_data(data, {})
+
+    def record_metering_data_batch(self, data):
+        """Write a list of meters to the backend storage system.
+
+        The meters are recorded in a single transaction, and each
+        source, user, project and resource of the batch is loaded once.
+
+        :param data: a list of dictionaries such as returned by
+                     ceilometer.meter.meter_message_from_counter
+        """
+        loaded = {}
+        with self.session.begin(subtransactions=True):
+            for meter in data:
+                self._record_metering_data(meter, loaded)
+
+    def _merge(self, loaded, model, id):
+        """Return the instance of model with this id, merged in the
+        session unless it is in loaded already.
+        """
+        try:
+            return loaded[(model, id)]
+        except KeyError:
+            instance = loaded[(model, id)] = self.session.merge(model(id=id))
+            return instance
+
+    def _record_metering_data(self, data, loaded):
+        """Record a meter.
+
+        :param loaded: sources, users, projects and resources already
+                       loaded in the session, by (model, id).
+        """
         if data['source']:
-            source = self.session.query(Source).get(data['source'])
-            if not source:
-                source = Source(id=data['source'])
-                self.session.add(source)
+            source = loaded.get((Source, data['source']))
+            if source is None:
+                source = self.session.query(Source).get(data['source'])
+                if not source:
+                    source = Source(id=data['source'])
+                    self.session.add(source)
+                loaded[(Source, data['source'])] = source
         else:
             source = None
 
         # create/update user && project, add/update their sources list
         if data['user_id']:
-            user = self.session.merge(User(id=str(data['user_id'])))
+            user = self._merge(loaded, User, str(data['user_id']))
             if not filter(lambda x: x.id == source.id, user.sources):
                 user.sources.append(source)
         else:
             user = None
 
         if data['project_id']:
-            project = self.session.merge(Project(id=str(data['project_id'])))
+            project = self._merge(loaded, Project, str(data['project_id']))
             if not filter(lambda x: x.id == source.id, project.sources):
                 project.sources.append(source)
         else:
@@ -174,7 +209,7 @@ class Connection(base.Connection):
         # Record the updated resource metadata
         rmetadata = data['resource_metadata']
 
-        resource = self.session.merge(Resource(id=str(data['resource_id'])))
+        resource = self._merge(loaded, Resource, str(data['resource_id']))
         if not filter(lambda x: x.id == source.id, resource.sources):
             resource.sources.append(source)
         resource.project = project
@@ -196,11 +231,10 @@ class Connection(base.Connection):
         meter.timestamp = data['timestamp']
         meter.resource_metadata = rmetadata
         meter.counter_volume = data['counter_volume']
-        meter.message_signature = data['message_signature']
+        # Meters recorded by the storage publisher are not signed
+        meter.message_signature = data.get('message_signature')
         meter.message_id = data['message_id']
 
-        return
-
     def get_users(self, source=None):
         """Return an iterable of user id strings.
 
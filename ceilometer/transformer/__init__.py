@@ -36,10 +36,22 @@ class TransformerExtensionManager(extension.ExtensionManager):
 
 
 class TransformerBase(object):
-    """Base class for plugins that transform the counter."""
+    """Base class for plugins that transform the counter.
+
+    Transformers may additionally implement handle_samples(context,
+    counters, source), taking a list of counters and returning the list
+    of transformed counters. When it is defined the pipeline passes each
+    batch in a single call instead of calling handle_sample() for every
+    counter. The input list must not be modified.
+    """
 
     __metaclass__ = abc.ABCMeta
 
+    # Number of seconds between periodic flush() calls needed by the
+    # transformer, e.g. to release counters held for too long. None
+    # means flush() is only called at the end of each publishing.
+    flush_interval = None
+
     def __init__(self, **kwargs):
         """Setup transformer.
 
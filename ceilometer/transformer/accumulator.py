@@ -24,8 +24,7 @@ class TransformerAccumulator(transformer.TransformerBase):
     them out in the wild. """
 
     def __init__(self, size=1, **kwargs):
-        if size >= 1:
-            self.counters = []
+        self.counters = []
         self.size = size
         super(TransformerAccumulator, self).__init__(**kwargs)
 
@@ -35,6 +34,12 @@ class TransformerAccumulator(transformer.TransformerBase):
         else:
             return counter
 
+    def handle_samples(self, context, counters, source):
+        if self.size >= 1:
+            self.counters.extend(counters)
+            return []
+        return counters
+
     def flush(self, context, source):
         if len(self.counters) >= self.size:
             x = self.counters
@@ -0,0 +1,129 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+from ceilometer.openstack.common import log
+from ceilometer.openstack.common import timeutils
+from ceilometer import transformer
+
+LOG = log.getLogger(__name__)
+
+
+class _Aggregate(object):
+    """Running aggregate of the counters of a group."""
+
+    __slots__ = ('counter', 'volume', 'count')
+
+    def __init__(self, counter):
+        self.counter = counter
+        self.volume = counter.volume
+        self.count = 1
+
+
+def _sum(aggregate, counter):
+    aggregate.volume += counter.volume
+
+
+def _last(aggregate, counter):
+    aggregate.volume = counter.volume
+
+
+def _max(aggregate, counter):
+    aggregate.volume = max(aggregate.volume, counter.volume)
+
+
+class AggregatorTransformer(transformer.TransformerBase):
+    """Transformer aggregating counters over a time window.
+
+    Counters sharing name, resource_id, project_id and user_id are merged
+    into a single counter per window, carrying the metadata and timestamp
+    of the last merged counter. Supported methods are sum, last, max and
+    mean. When the resource metadata of a group changes, the aggregate
+    built so far is emitted and a new one is started, so no metadata
+    change is lost.
+
+    Aggregates are emitted by flush() once the window is over, or
+    immediately when more than max_groups groups are held.
+    """
+
+    METHODS = {
+        'sum': _sum,
+        'last': _last,
+        'max': _max,
+        'mean': _sum,
+    }
+
+    def __init__(self, window=60, method='sum', max_groups=10000, **kwargs):
+        if method not in self.METHODS:
+            raise ValueError('Invalid aggregation method %s' % method)
+        self.window = window
+        self.method = method
+        self.merge = self.METHODS[method]
+        self.max_groups = max_groups
+        self.flush_interval = window
+        self.aggregates = {}
+        self.window_start = None
+        super(AggregatorTransformer, self).__init__(**kwargs)
+
+    def _emit(self, aggregate):
+        volume = aggregate.volume
+        if self.method == 'mean':
+            volume = float(volume) / aggregate.count
+        return aggregate.counter._replace(volume=volume)
+
+    def _release(self):
+        counters = [self._emit(a) for a in self.aggregates.itervalues()]
+        self.aggregates = {}
+        self.window_start = None
+        return counters
+
+    def _add(self, counter, emitted):
+        if self.window_start is None:
+            self.window_start = timeutils.utcnow()
+        key = (counter.name, counter.resource_id,
+               counter.project_id, counter.user_id)
+        aggregate = self.aggregates.get(key)
+        if aggregate is None:
+            self.aggregates[key] = _Aggregate(counter)
+            return
+        metadata = aggregate.counter.resource_metadata
+        if (counter.resource_metadata is not metadata and
+                counter.resource_metadata != metadata):
+            emitted.append(self._emit(aggregate))
+            self.aggregates[key] = _Aggregate(counter)
+            return
+        self.merge(aggregate, counter)
+        aggregate.count += 1
+        aggregate.counter = counter
+
+    def handle_samples(self, context, counters, source):
+        emitted = []
+        for counter in counters:
+            self._add(counter, emitted)
+        if len(self.aggregates) > self.max_groups:
+            LOG.debug('Too many aggregates, releasing %d of them',
+                      len(self.aggregates))
+            emitted.extend(self._release())
+        return emitted
+
+    def handle_sample(self, context, counter, source):
+        emitted = []
+        self._add(counter, emitted)
+        if emitted:
+            return emitted[0]
+
+    def flush(self, context, source):
+        if (self.window_start is not None and
+                timeutils.is_older_than(self.window_start, self.window)):
+            return self._release()
+        return []
@@ -0,0 +1,90 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import sys
+
+from ceilometer.openstack.common import timeutils
+from ceilometer import transformer
+
+
+def counter_size(counter):
+    """Return an estimate of the memory used by a counter, in bytes."""
+    size = sys.getsizeof(counter)
+    for field in counter:
+        size += sys.getsizeof(field)
+    for key, value in (counter.resource_metadata or {}).iteritems():
+        size += sys.getsizeof(key) + sys.getsizeof(value)
+    return size
+
+
+class BoundedAccumulator(transformer.TransformerBase):
+    """Transformer that accumulates counters until a count, age or memory
+    bound is reached.
+
+    Counters are released as soon as size counters or max_bytes bytes
+    are held. Counters older than max_age seconds are released by
+    flush(), which the agents and the collector call from a timer every
+    flush_interval seconds, so low-rate sources are not held back
+    indefinitely.
+    """
+
+    def __init__(self, size=100, max_age=60, max_bytes=None, **kwargs):
+        self.size = size
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.flush_interval = max_age / 2.0 if max_age else None
+        self._reset()
+        super(BoundedAccumulator, self).__init__(**kwargs)
+
+    def _reset(self):
+        self.counters = []
+        self.bytes = 0
+        self.first_timestamp = None
+
+    def _release(self):
+        counters = self.counters
+        self._reset()
+        return counters
+
+    def _add(self, counters):
+        if not self.counters:
+            self.first_timestamp = timeutils.utcnow()
+        self.counters.extend(counters)
+        if self.max_bytes:
+            self.bytes += sum(counter_size(c) for c in counters)
+
+    def _full(self):
+        return (len(self.counters) >= self.size or
+                (self.max_bytes and self.bytes >= self.max_bytes))
+
+    def _expired(self):
+        return (self.max_age is not None and
+                self.first_timestamp is not None and
+                timeutils.is_older_than(self.first_timestamp, self.max_age))
+
+    def handle_samples(self, context, counters, source):
+        if counters:
+            self._add(counters)
+        if self._full():
+            return self._release()
+        return []
+
+    def handle_sample(self, context, counter, source):
+        # Full batches are released by the next flush
+        self._add([counter])
+
+    def flush(self, context, source):
+        if self.counters and (self._full() or self._expired()):
+            return self._release()
+        return []
@@ -0,0 +1,66 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import json
+
+from ceilometer import counter as ceilocounter
+from ceilometer.openstack.common import timeutils
+from ceilometer import transformer
+from ceilometer import utils
+
+
+def metadata_hash(metadata):
+    """Return a hash of a resource metadata dict."""
+    return hash(json.dumps(metadata, sort_keys=True, default=str))
+
+
+class DeduplicationTransformer(transformer.TransformerBase):
+    """Transformer dropping gauge counters which did not change.
+
+    The volume and metadata hash of the last counter emitted for each
+    (counter name, resource) pair are kept in a BoundedCache. A gauge
+    counter with the same volume and metadata is dropped, unless
+    heartbeat seconds have passed since the last one was emitted, so
+    consumers still see the resource regularly. Counters of other
+    types are always emitted.
+
+    Forgetting the state of a resource, e.g. when more than
+    max_resources resources are seen, only means its next counter is
+    emitted.
+    """
+
+    def __init__(self, heartbeat=3600, max_resources=10000, **kwargs):
+        self.heartbeat = heartbeat
+        self.state = utils.BoundedCache(max_resources, heartbeat)
+        super(DeduplicationTransformer, self).__init__(**kwargs)
+
+    def handle_sample(self, context, counter, source):
+        if counter.type != ceilocounter.TYPE_GAUGE:
+            return counter
+        key = (counter.name, counter.resource_id)
+        fingerprint = (counter.volume,
+                       metadata_hash(counter.resource_metadata))
+        now = timeutils.utcnow_ts()
+        previous = self.state.get(key)
+        if previous is not None:
+            last_fingerprint, emitted_at = previous
+            if (fingerprint == last_fingerprint and
+                    now - emitted_at < self.heartbeat):
+                return
+        self.state[key] = (fingerprint, now)
+        return counter
+
+    def handle_samples(self, context, counters, source):
+        return [c for c in counters
+                if self.handle_sample(context, c, source) is not None]
@@ -0,0 +1,93 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import datetime
+
+from ceilometer import counter as ceilocounter
+from ceilometer.openstack.common import log
+from ceilometer.openstack.common import timeutils
+from ceilometer import transformer
+from ceilometer import utils
+
+LOG = log.getLogger(__name__)
+
+
+def _timestamp_seconds(timestamp):
+    """Return a counter timestamp as seconds since the epoch."""
+    if isinstance(timestamp, datetime.datetime):
+        timestamp = timeutils.normalize_time(timestamp)
+    else:
+        timestamp = utils.parse_timestamp(timestamp)
+    delta = timestamp - datetime.datetime(1970, 1, 1)
+    return delta.days * 86400 + delta.seconds + delta.microseconds / 1e6
+
+
+class RateOfChangeTransformer(transformer.TransformerBase):
+    """Transformer turning cumulative counters into rates per second.
+
+    The previous volume and timestamp of each (resource, counter) pair
+    are kept in a BoundedCache, so state of deleted resources does not
+    pile up. A volume lower than the previous one is taken as a counter
+    reset and the new volume is used as the delta. The first counter of
+    a resource only initialises the state and is dropped.
+
+    Rates are named target_name, or the counter name suffixed with
+    '.rate', and have target_unit as unit, or the counter unit per
+    second. They are multiplied by scale.
+    """
+
+    def __init__(self, target_name=None, target_unit=None,
+                 scale=1.0, max_resources=10000, ttl=3600, **kwargs):
+        self.target_name = target_name
+        self.target_unit = target_unit
+        self.scale = scale
+        self.state = utils.BoundedCache(max_resources, ttl)
+        super(RateOfChangeTransformer, self).__init__(**kwargs)
+
+    def handle_sample(self, context, counter, source):
+        key = (counter.resource_id, counter.name)
+        timestamp = _timestamp_seconds(counter.timestamp)
+        previous = self.state.get(key)
+        self.state[key] = (counter.volume, timestamp)
+        if previous is None:
+            return
+        prev_volume, prev_timestamp = previous
+        elapsed = timestamp - prev_timestamp
+        if elapsed <= 0:
+            LOG.debug('Ignoring %s for %s: no time elapsed since the '
+                      'previous counter', counter.name, counter.resource_id)
+            return
+        if counter.volume >= prev_volume:
+            delta = counter.volume - prev_volume
+        else:
+            # The counter has been reset, e.g. the instance was restarted
+            delta = counter.volume
+        return counter._replace(
+            name=self.target_name or counter.name + '.rate',
+            type=ceilocounter.TYPE_GAUGE,
+            unit=self.target_unit or counter.unit + '/s',
+            volume=self.scale * delta / elapsed)
+
+    def handle_samples(self, context, counters, source):
+        rates = []
+        for counter in counters:
+            try:
+                rate = self.handle_sample(context, counter, source)
+            except Exception as err:
+                LOG.warning('Unable to compute rate for %s', counter)
+                LOG.exception(err)
+                continue
+            if rate is not None:
+                rates.append(rate)
+        return rates
@@ -21,8 +21,12 @@
 """Utilities and helper functions."""
 
 
+import datetime
+import heapq
 import os
 
+from ceilometer.openstack.common import timeutils
+
 
 def read_cached_file(filename, cache_info, reload_func=None):
     """Read from a file if it has been modified.
@@ -42,3 +46,142 @@ def read_cached_file(filename, cache_info, reload_func=None):
         if reload_func:
             reload_func(cache_info['data'])
     return cache_info['data']
+
+
+def partition_by(iterable, key):
+    """Bucket the items of an iterable by key in a single pass.
+
+    Unlike sorted() followed by itertools.groupby(), this is O(n) and
+    consumes the iterable only once, so generators can be passed in.
+
+    :param iterable: items to partition.
+    :param key: function returning the bucket key of an item.
+
+    :returns: list of (key, items) tuples, keys in the order they were
+              first seen and items in arrival order within each bucket.
+
+    """
+    buckets = {}
+    partitions = []
+    for item in iterable:
+        k = key(item)
+        try:
+            buckets[k].append(item)
+        except KeyError:
+            bucket = buckets[k] = [item]
+            partitions.append((k, bucket))
+    return partitions
+
+
+class BoundedCache(object):
+    """Mapping holding at most max_size entries.
+
+    Each entry is stored as a (last update time, value) tuple. When the
+    cache grows over max_size, entries not updated for ttl seconds are
+    dropped first, then the least recently updated entries, evicting a
+    tenth of the cache at once to amortize the cost of the scan. Entries
+    not updated for ttl seconds are missing from the mapping even before
+    they are evicted.
+    """
+
+    def __init__(self, max_size, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = {}
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def __getitem__(self, key):
+        updated, value = self._data[key]
+        if (self.ttl is not None and
+                updated < timeutils.utcnow_ts() - self.ttl):
+            del self._data[key]
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self._data[key] = (timeutils.utcnow_ts(), value)
+        if len(self._data) > self.max_size:
+            self._evict()
+
+    def __delitem__(self, key):
+        del self._data[key]
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def _evict(self):
+        if self.ttl is not None:
+            deadline = timeutils.utcnow_ts() - self.ttl
+            for key in [k for k, (t, v) in self._data.iteritems()
+                        if t < deadline]:
+                del self._data[key]
+        excess = len(self._data) - self.max_size
+        if excess > 0:
+            excess = max(excess, self.max_size // 10)
+            for key, entry in heapq.nsmallest(excess,
+                                              self._data.iteritems(),
+                                              key=lambda x: x[1][0]):
+                del self._data[key]
+
+
+# Datetimes of the second-resolution prefixes of recently parsed
+# timestamps. A plain dict emptied when full, since it may be used by
+# native threads at once.
+_TIMESTAMP_PREFIXES = {}
+_TIMESTAMP_PREFIXES_SIZE = 1024
+
+
+def _parse_timestamp_prefix(prefix):
+    """Return the datetime of a YYYY-MM-DDTHH:MM:SS string, or None."""
+    at = _TIMESTAMP_PREFIXES.get(prefix)
+    if at is not None:
+        return at
+    fields = (prefix[0:4], prefix[5:7], prefix[8:10],
+              prefix[11:13], prefix[14:16], prefix[17:19])
+    if (prefix[4] + prefix[7] + prefix[13] + prefix[16] != '--::' or
+            prefix[10] not in 'T ' or not ''.join(fields).isdigit()):
+        return None
+    try:
+        at = datetime.datetime(*map(int, fields))
+    except ValueError:
+        return None
+    if len(_TIMESTAMP_PREFIXES) >= _TIMESTAMP_PREFIXES_SIZE:
+        _TIMESTAMP_PREFIXES.clear()
+    _TIMESTAMP_PREFIXES[prefix] = at
+    return at
+
+
+def parse_timestamp(timestr):
+    """Return a naive UTC datetime from an ISO 8601 timestamp string.
+
+    The formats ceilometer produces, YYYY-MM-DDTHH:MM:SS with optional
+    microseconds and Z suffix, are parsed by slicing, the datetimes of
+    recent seconds being cached. Other formats are parsed with
+    timeutils.parse_isotime().
+
+    :raises ValueError: if the timestamp cannot be parsed.
+    """
+    if isinstance(timestr, basestring):
+        size = len(timestr)
+        if timestr.endswith('Z'):
+            size -= 1
+        if size == 19 or (size == 26 and timestr[19] == '.' and
+                          timestr[20:26].isdigit()):
+            at = _parse_timestamp_prefix(timestr[:19])
+            if at is not None:
+                if size == 26:
+                    at = at.replace(microsecond=int(timestr[20:26]))
+                return at
+    return timeutils.normalize_time(timeutils.parse_isotime(timestr))
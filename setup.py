@@ -148,9 +148,15 @@ setuptools.setup(
 
     [ceilometer.transformer]
     accumulator = ceilometer.transformer.accumulator:TransformerAccumulator
+    bounded_accumulator = ceilometer.transformer.bounded:BoundedAccumulator
+    rate_of_change = ceilometer.transformer.rate:RateOfChangeTransformer
+    aggregator = ceilometer.transformer.aggregator:AggregatorTransformer
+    dedup = ceilometer.transformer.dedup:DeduplicationTransformer
 
     [ceilometer.publisher]
     meter_publisher = ceilometer.publisher.meter_publish:MeterPublisher
+    udp = ceilometer.publisher.udp:UDPPublisher
+    storage = ceilometer.publisher.storage_publish:StoragePublisher
 
     [paste.filter_factory]
     swift=ceilometer.objectstore.swift_middleware:filter_factory
@@ -23,12 +23,16 @@ import abc
 import datetime
 import mock
 
+from oslo.config import cfg
 from stevedore import extension
 from stevedore.tests import manager as extension_tests
 
 from ceilometer import counter
+from ceilometer.openstack.common import loopingcall
+from ceilometer.openstack.common import timeutils
 from ceilometer import pipeline
 from ceilometer import publisher
+from ceilometer.publisher import fanout
 from ceilometer.tests import base
 from ceilometer import transformer
 
@@ -246,3 +250,76 @@ class BaseAgentManagerTestCase(base.TestCase):
         task = polling_tasks.get(10)
         self.mgr.interval_task(polling_tasks.get(10))
         self.assertEqual(len(self.publisher.counters), 0)
+
+    def test_initialize_service_hook_flush_timer(self):
+        self.pipeline_cfg[0]['transformers'] = [{
+            'name': 'bounded_accumulator',
+            'parameters': {'max_age': 10},
+        }]
+        self.setup_pipeline()
+        service = mock.MagicMock()
+        self.mgr.initialize_service_hook(service)
+        service.tg.add_timer.assert_any_call(
+            5.0,
+            self.mgr.flush_task,
+            flush_interval=5.0)
+
+    def test_publish_coalesce_across_cycles(self):
+        cfg.CONF.set_override('publish_coalesce_max_latency', 10)
+        self.addCleanup(cfg.CONF.clear_override,
+                        'publish_coalesce_max_latency')
+        self.setup_pipeline()
+        task = self.mgr.setup_polling_tasks()[60]
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+        for i in range(2):
+            self.mgr.interval_task(task)
+        self.mgr.pipeline_manager.flush(self.mgr.context,
+                                        cfg.CONF.counter_source)
+        self.assertEqual(len(self.publisher.counters), 0)
+        timeutils.advance_time_seconds(11)
+        self.mgr.pipeline_manager.flush(self.mgr.context,
+                                        cfg.CONF.counter_source)
+        self.assertEqual(self.publisher.counters,
+                         [self.Pollster.test_data] * 2)
+
+    def test_log_stats(self):
+        self.publisher_manager.extensions[0].obj = fanout.QueuedPublisher(
+            'test_pub', self.publisher)
+        service = mock.MagicMock()
+        self.mgr.initialize_service_hook(service)
+        service.tg.add_timer.assert_any_call(cfg.CONF.periodic_interval,
+                                             self.mgr.log_stats)
+        with mock.patch('ceilometer.agent.LOG') as log:
+            self.mgr.log_stats()
+        stats = log.info.call_args[0][1]
+        self.assertEqual(stats['test_pub']['queue_depth'], 0)
+
+    def test_reload_pipeline_timers(self):
+        service = mock.MagicMock()
+        self.mgr.initialize_service_hook(service)
+        task = self.mgr.polling_tasks[60]
+        self.pipeline_cfg[0]['interval'] = 30
+        self.mgr.pipeline_manager.reload = mock.MagicMock(return_value=True)
+        self.mgr.pipeline_manager.pipelines = [pipeline.Pipeline(
+            self.pipeline_cfg[0],
+            self.publisher_manager,
+            self.transformer_manager)]
+        self.mgr.reload_pipeline()
+
+        self.assertEqual(self.mgr.polling_tasks.keys(), [30])
+        service.tg.add_timer.assert_called_with(
+            30,
+            self.mgr.interval_task,
+            task=self.mgr.polling_tasks[30])
+        self.assertEqual(task.pollsters, set())
+        self.assertRaises(loopingcall.LoopingCallDone,
+                          self.mgr.interval_task, task)
+
+    def test_reload_pipeline_unchanged(self):
+        service = mock.MagicMock()
+        self.mgr.initialize_service_hook(service)
+        self.mgr.pipeline_manager.reload = mock.MagicMock(return_value=False)
+        calls = service.tg.add_timer.call_count
+        self.mgr.reload_pipeline()
+        self.assertEqual(service.tg.add_timer.call_count, calls)
@@ -0,0 +1,70 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Tests for ceilometer/collector/codec.py
+"""
+
+import unittest2
+
+from ceilometer.collector import codec
+from ceilometer.collector import meter
+from ceilometer import counter
+from ceilometer.tests import base
+
+
+class TestCodec(base.TestCase):
+
+    def _meters(self, count=10):
+        counters = [counter.Counter(
+            name='cpu',
+            type=counter.TYPE_CUMULATIVE,
+            unit='ns',
+            volume=i,
+            user_id='user',
+            project_id='project',
+            resource_id='resource',
+            timestamp='2013-05-01T12:00:00',
+            resource_metadata={'display_name': u'\xe9', 'tags': ['a']},
+        ) for i in range(count)]
+        return meter.meter_messages_from_counters(counters, 'secret',
+                                                  'source')
+
+    def _roundtrip(self, name, threshold):
+        meters = self._meters()
+        encoded = codec.encode(meters, name, threshold)
+        decoded = codec.decode(**encoded)
+        self.assertEqual(decoded, meters)
+        self.assertTrue(all(meter.verify_signatures(decoded, 'secret')))
+        return encoded
+
+    def test_json(self):
+        self.assertFalse(self._roundtrip('json', 0)['compressed'])
+
+    def test_json_compressed(self):
+        self.assertTrue(self._roundtrip('json', 1)['compressed'])
+
+    @unittest2.skipIf(codec.msgpack is None, 'msgpack is not installed')
+    def test_msgpack(self):
+        self._roundtrip('msgpack', 1)
+
+    def test_different_fields(self):
+        meters = self._meters(2)
+        meters[1]['extra'] = 1
+        self.assertEqual(codec.decode(**codec.encode(meters, 'json')),
+                         meters)
+
+    def test_empty(self):
+        self.assertEqual(codec.decode(**codec.encode([], 'json')), [])
+
+    def test_unknown_codec(self):
+        self.assertRaises(ValueError, codec.encode, [], 'foo')
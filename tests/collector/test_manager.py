@@ -26,8 +26,10 @@ from oslo.config import cfg
 from stevedore import extension
 from stevedore.tests import manager as test_manager
 
+from ceilometer.collector import codec
 from ceilometer.collector import meter
 from ceilometer.collector import service
+from ceilometer.collector import udp
 from ceilometer.storage import base
 from ceilometer.tests import base as tests_base
 from ceilometer.compute import notifications
@@ -83,6 +85,13 @@ TEST_NOTICE = {
 }
 
 
+def _setup_pipeline_mock():
+    setup_pipeline = MagicMock()
+    # No flush timer
+    setup_pipeline.return_value.get_flush_interval.return_value = None
+    return setup_pipeline
+
+
 class TestCollectorService(tests_base.TestCase):
 
     def setUp(self):
@@ -91,7 +100,7 @@ class TestCollectorService(tests_base.TestCase):
         self.ctx = None
         #cfg.CONF.metering_secret = 'not-so-secret'
 
-    @patch('ceilometer.pipeline.setup_pipeline', MagicMock())
+    @patch('ceilometer.pipeline.setup_pipeline', _setup_pipeline_mock())
     def test_init_host(self):
         cfg.CONF.database_connection = 'log://localhost'
         # If we try to create a real RPC connection, init_host() never
@@ -111,7 +120,7 @@ class TestCollectorService(tests_base.TestCase):
         )
 
         self.srv.storage_conn = self.mox.CreateMock(base.Connection)
-        self.srv.storage_conn.record_metering_data(msg)
+        self.srv.storage_conn.record_metering_data_batch([msg])
         self.mox.ReplayAll()
 
         self.srv.record_metering_data(self.ctx, msg)
@@ -131,6 +140,9 @@ class TestCollectorService(tests_base.TestCase):
             def record_metering_data(self, data):
                 self.called = True
 
+            def record_metering_data_batch(self, data):
+                self.called = True
+
         self.srv.storage_conn = ErrorConnection()
 
         self.srv.record_metering_data(self.ctx, msg)
@@ -138,6 +150,67 @@ class TestCollectorService(tests_base.TestCase):
         assert not self.srv.storage_conn.called, \
             'Should not have called the storage connection'
 
+    def test_batch_failure(self):
+        msgs = []
+        for i in range(2):
+            msg = {'counter_name': 'test',
+                   'resource_id': self.id(),
+                   'counter_volume': i,
+                   }
+            msg['message_signature'] = meter.compute_signature(
+                msg,
+                cfg.CONF.metering_secret,
+            )
+            msgs.append(msg)
+
+        self.srv.storage_conn = self.mox.CreateMock(base.Connection)
+        self.srv.storage_conn.record_metering_data_batch(msgs).AndRaise(
+            Exception('bad meter'))
+        self.srv.storage_conn.record_metering_data(msgs[0]).AndRaise(
+            Exception('bad meter'))
+        self.srv.storage_conn.record_metering_data(msgs[1])
+        self.mox.ReplayAll()
+
+        self.srv.record_metering_data(self.ctx, msgs)
+        self.mox.VerifyAll()
+
+    def test_write_behind(self):
+        cfg.CONF.set_override('collector_write_buffer_size', 10)
+        self.addCleanup(cfg.CONF.clear_override,
+                        'collector_write_buffer_size')
+        self.srv = service.CollectorService('the-host', 'the-topic')
+        msg = {'counter_name': 'test',
+               'resource_id': self.id(),
+               'counter_volume': 1,
+               }
+        msg['message_signature'] = meter.compute_signature(
+            msg,
+            cfg.CONF.metering_secret,
+        )
+
+        self.srv.storage_conn = self.mox.CreateMock(base.Connection)
+        self.srv.storage_conn.record_metering_data_batch([msg, msg])
+        self.mox.ReplayAll()
+
+        self.srv.record_metering_data(self.ctx, [msg])
+        self.srv.record_metering_data(self.ctx, [msg])
+        self.srv.writer.stop()
+        self.mox.VerifyAll()
+
+    def test_get_workers(self):
+        self.assertEqual(service.get_workers(), None)
+        cfg.CONF.set_override('collector_workers', 4)
+        self.addCleanup(cfg.CONF.clear_override, 'collector_workers')
+        self.assertEqual(service.get_workers(), 4)
+
+    def test_get_workers_spool(self):
+        cfg.CONF.set_override('publisher_spool_dir', '/tmp/spool')
+        self.addCleanup(cfg.CONF.clear_override, 'publisher_spool_dir')
+        self.assertEqual(service.get_workers(), None)
+        cfg.CONF.set_override('collector_workers', 4)
+        self.addCleanup(cfg.CONF.clear_override, 'collector_workers')
+        self.assertRaises(ValueError, service.get_workers)
+
     def test_timestamp_conversion(self):
         msg = {'counter_name': 'test',
                'resource_id': self.id(),
@@ -154,7 +227,7 @@ class TestCollectorService(tests_base.TestCase):
         expected['timestamp'] = datetime(2012, 7, 2, 13, 53, 40)
 
         self.srv.storage_conn = self.mox.CreateMock(base.Connection)
-        self.srv.storage_conn.record_metering_data(expected)
+        self.srv.storage_conn.record_metering_data_batch([expected])
         self.mox.ReplayAll()
 
         self.srv.record_metering_data(self.ctx, msg)
@@ -176,13 +249,101 @@ class TestCollectorService(tests_base.TestCase):
         expected['timestamp'] = datetime(2012, 9, 30, 23, 31, 50, 262000)
 
         self.srv.storage_conn = self.mox.CreateMock(base.Connection)
-        self.srv.storage_conn.record_metering_data(expected)
+        self.srv.storage_conn.record_metering_data_batch([expected])
         self.mox.ReplayAll()
 
         self.srv.record_metering_data(self.ctx, msg)
         self.mox.VerifyAll()
 
-    @patch('ceilometer.pipeline.setup_pipeline', MagicMock())
+    def test_unknown_metadata_reference(self):
+        msg = {'counter_name': 'test',
+               'resource_id': self.id(),
+               'counter_volume': 1,
+               'resource_metadata': {'name': 'test'},
+               }
+        msg['message_signature'] = meter.compute_signature(
+            msg,
+            cfg.CONF.metering_secret,
+        )
+        known, unknown = meter.reference_metadata([msg, msg])
+        known = dict(known)
+
+        self.srv.storage_conn = self.mox.CreateMock(base.Connection)
+        self.srv.storage_conn.record_metering_data_batch([msg, msg])
+        self.mox.ReplayAll()
+
+        self.srv.record_metering_data(self.ctx, dict(unknown))
+        self.srv.record_metering_data(self.ctx, [known, dict(unknown)])
+        self.mox.VerifyAll()
+
+    def test_encoded_message(self):
+        msg = {'counter_name': 'test',
+               'resource_id': self.id(),
+               'counter_volume': 1,
+               }
+        msg['message_signature'] = meter.compute_signature(
+            msg,
+            cfg.CONF.metering_secret,
+        )
+
+        self.srv.storage_conn = self.mox.CreateMock(base.Connection)
+        self.srv.storage_conn.record_metering_data_batch([msg])
+        self.mox.ReplayAll()
+
+        self.srv.record_metering_data_encoded(self.ctx,
+                                              **codec.encode([msg], 'json'))
+        self.mox.VerifyAll()
+
+    def test_process_datagram(self):
+        msg = {'counter_name': 'test',
+               'resource_id': self.id(),
+               'counter_volume': 1,
+               }
+        msg['message_signature'] = meter.compute_signature(
+            msg,
+            cfg.CONF.metering_secret,
+        )
+
+        self.srv.storage_conn = self.mox.CreateMock(base.Connection)
+        self.srv.storage_conn.record_metering_data_batch([msg])
+        self.srv.storage_conn.record_metering_data_batch([msg])
+        self.mox.ReplayAll()
+
+        self.srv.udp_tracker = udp.LossTracker()
+        self.srv.process_datagram(udp.pack([msg], 'json', 0), 'sender')
+        self.srv.process_datagram('garbage', 'sender')
+        self.srv.process_datagram(udp.pack([msg], 'json', 2), 'sender')
+        self.mox.VerifyAll()
+        stats = self.srv.udp_tracker.get_stats()
+        self.assertEqual(stats['received'], 2)
+        self.assertEqual(stats['lost'], 1)
+        self.assertEqual(stats['invalid'], 1)
+
+    def test_process_malformed_datagram(self):
+        msg = {'counter_name': 'test',
+               'resource_id': self.id(),
+               'counter_volume': 1,
+               }
+        msg['message_signature'] = meter.compute_signature(
+            msg,
+            cfg.CONF.metering_secret,
+        )
+
+        self.srv.storage_conn = self.mox.CreateMock(base.Connection)
+        self.srv.storage_conn.record_metering_data_batch([msg])
+        self.mox.ReplayAll()
+
+        self.srv.udp_tracker = udp.LossTracker()
+        self.srv.process_datagram(udp.pack(['not a meter'], 'json', 0),
+                                  'sender')
+        self.srv.process_datagram(udp.pack([{'counter_volume': 1}],
+                                           'json', 1),
+                                  'sender')
+        self.srv.process_datagram(udp.pack([msg], 'json', 2), 'sender')
+        self.mox.VerifyAll()
+        self.assertEqual(self.srv.udp_tracker.get_stats()['invalid'], 2)
+
+    @patch('ceilometer.pipeline.setup_pipeline', _setup_pipeline_mock())
     def test_process_notification(self):
         # If we try to create a real RPC connection, init_host() never
         # returns. Mock it out so we can establish the manager
@@ -18,6 +18,8 @@
 """Tests for ceilometer.meter
 """
 
+import datetime
+
 from ceilometer.collector import meter
 from ceilometer import counter
 from ceilometer.openstack.common import jsonutils
@@ -114,6 +116,54 @@ def test_verify_signature_nested_json():
     assert meter.verify_signature(jsondata, 'not-so-secret')
 
 
+def test_compute_signature_v2_change_value():
+    sig1 = meter.compute_signature_v2({'a': 'A', 'b': 'B'}, 'not-so-secret')
+    sig2 = meter.compute_signature_v2({'a': 'a', 'b': 'B'}, 'not-so-secret')
+    assert sig1 != sig2
+    assert sig1.startswith(meter.SIGNATURE_V2_PREFIX)
+
+
+def test_compute_signature_v2_signed():
+    data = {'a': 'A', 'b': 'B'}
+    sig1 = meter.compute_signature_v2(data, 'not-so-secret')
+    data['message_signature'] = sig1
+    sig2 = meter.compute_signature_v2(data, 'not-so-secret')
+    assert sig1 == sig2
+
+
+def test_verify_signature_v2_nested_json():
+    data = {'a': 'A',
+            'b': u'\xe9',
+            'nested': {'a': 1.5,
+                       'b': datetime.datetime(2013, 5, 1, 12, 0),
+                       'c': ('c',),
+                       'd': ['d']
+                       },
+            }
+    meter.sign_messages([data], 'not-so-secret', version=2)
+    jsondata = jsonutils.loads(jsonutils.dumps(data))
+    assert meter.verify_signature(jsondata, 'not-so-secret')
+
+
+def test_verify_signatures_mixed_versions():
+    messages = [{'a': i} for i in range(4)]
+    meter.sign_messages(messages[:2], 'not-so-secret', version=1)
+    meter.sign_messages(messages[2:], 'not-so-secret', version=2)
+    messages[1]['a'] = 'changed'
+    messages[3]['a'] = 'changed'
+    assert (meter.verify_signatures(messages, 'not-so-secret') ==
+            [True, False, True, False])
+
+
+def test_sign_messages_unknown_version():
+    try:
+        meter.sign_messages([{'a': 'A'}], 'not-so-secret', version=3)
+    except ValueError:
+        pass
+    else:
+        assert False, 'ValueError not raised'
+
+
 TEST_COUNTER = counter.Counter(name='name',
                                type='typ',
                                unit='',
@@ -169,6 +219,11 @@ def test_meter_message_from_counter_signed():
     assert 'message_signature' in msg
 
 
+def test_meter_message_from_counter_unsigned():
+    msg = meter.meter_message_from_counter(TEST_COUNTER, None, 'src')
+    assert 'message_signature' not in msg
+
+
 def test_meter_message_from_counter_field():
     def compare(f, c, msg_f, msg):
         assert msg == c
@@ -182,3 +237,30 @@ def test_meter_message_from_counter_field():
     for f in TEST_COUNTER._fields:
         msg_f = name_map.get(f, f)
         yield compare, f, getattr(TEST_COUNTER, f), msg_f, msg[msg_f]
+
+
+def test_reference_metadata_resolve():
+    msgs = meter.meter_messages_from_counters([TEST_COUNTER] * 3,
+                                              'not-so-secret', 'src')
+    referenced = meter.reference_metadata(msgs)
+    assert 'resource_metadata' in referenced[0]
+    assert meter.METADATA_DIGEST in referenced[0]
+    assert 'resource_metadata' not in referenced[1]
+    assert meter.METADATA_REF in referenced[1]
+    # The messages given are left untouched
+    assert all('resource_metadata' in m for m in msgs)
+    assert meter.resolve_metadata(referenced) == [True] * 3
+    assert referenced == msgs
+    assert all(meter.verify_signatures(referenced, 'not-so-secret'))
+
+
+def test_reference_metadata_per_batch():
+    msgs = meter.meter_messages_from_counters([TEST_COUNTER] * 2,
+                                              'not-so-secret', 'src')
+    meter.reference_metadata(msgs)
+    # Metadata is sent in full again in the next batch
+    referenced = meter.reference_metadata(msgs)
+    assert 'resource_metadata' in referenced[0]
+    assert meter.METADATA_REF in referenced[1]
+    # References are only resolved within their batch
+    assert meter.resolve_metadata(referenced[1:]) == [False]
@@ -0,0 +1,70 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Tests for ceilometer/collector/prepare.py
+"""
+
+import datetime
+
+from eventlet import tpool
+
+from ceilometer.collector import meter
+from ceilometer.collector import prepare
+from ceilometer.tests import base
+
+
+SECRET = 'not-so-secret'
+
+
+def _message(i, timestamp='2012-07-02T13:53:40Z'):
+    msg = {'counter_name': 'test',
+           'resource_id': 'resource-%d' % i,
+           'counter_volume': i,
+           'timestamp': timestamp,
+           }
+    msg['message_signature'] = meter.compute_signature(msg, SECRET)
+    return msg
+
+
+class TestPrepare(base.TestCase):
+
+    def test_prepare_meters(self):
+        messages = [_message(0), _message(1), _message(2, 'not a date')]
+        messages[1]['counter_volume'] = 42
+        errors = prepare.prepare_meters(messages, SECRET)
+        self.assertEqual(errors[0], None)
+        self.assertEqual(errors[1], 'message signature invalid')
+        self.assertTrue(errors[2].startswith('invalid timestamp'))
+        self.assertEqual(messages[0]['timestamp'],
+                         datetime.datetime(2012, 7, 2, 13, 53, 40))
+
+    def test_threads_keep_order(self):
+        messages = [_message(i) for i in range(7)]
+        messages[4]['counter_volume'] = 42
+        preparer = prepare.Preparer(threads=2, chunk_size=2)
+        errors = preparer.prepare(messages, SECRET)
+        self.assertEqual([e is None for e in errors],
+                         [True, True, True, True, False, True, True])
+        for msg in messages:
+            if msg['counter_volume'] != 42:
+                self.assertTrue(isinstance(msg['timestamp'],
+                                           datetime.datetime))
+
+    def test_thread_failure(self):
+        def fail(*args):
+            raise RuntimeError('no thread')
+        self.stubs.Set(tpool, 'execute', fail)
+        messages = [_message(i) for i in range(3)]
+        preparer = prepare.Preparer(threads=2, chunk_size=1)
+        self.assertEqual(preparer.prepare(messages, SECRET),
+                         [None, None, None])
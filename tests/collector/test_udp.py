@@ -0,0 +1,88 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Tests for ceilometer/collector/udp.py
+"""
+
+import itertools
+
+from ceilometer.collector import udp
+from ceilometer.tests import base
+
+
+class TestDatagram(base.TestCase):
+
+    meters = [{'counter_name': 'test',
+               'resource_id': 'resource-%d' % i,
+               'counter_volume': i} for i in range(100)]
+
+    def test_pack_unpack(self):
+        seq, meters = udp.unpack(udp.pack(self.meters, 'json', 42))
+        self.assertEqual(seq, 42)
+        self.assertEqual(meters, self.meters)
+
+    def test_unpack_invalid(self):
+        self.assertRaises(ValueError, udp.unpack, 'ab')
+        datagram = udp.pack(self.meters, 'json', 1)
+        self.assertRaises(ValueError, udp.unpack, '\x02' + datagram[1:])
+
+    def test_pack_all_splits(self):
+        datagrams = udp.pack_all(self.meters, 'json', itertools.count(),
+                                 512, threshold=0)
+        self.assertTrue(len(datagrams) > 1)
+        self.assertTrue(all(len(d) <= 512 for d in datagrams))
+        unpacked = [udp.unpack(d) for d in datagrams]
+        self.assertEqual([seq for seq, meters in unpacked],
+                         range(len(datagrams)))
+        self.assertEqual(sum((meters for seq, meters in unpacked), []),
+                         self.meters)
+
+    def test_pack_all_drops_too_large(self):
+        meters = [{'counter_name': 'test', 'resource_id': 'x' * 1024}]
+        self.assertEqual(udp.pack_all(meters, 'json', itertools.count(),
+                                      512, threshold=0), [])
+
+
+class TestLossTracker(base.TestCase):
+
+    def setUp(self):
+        super(TestLossTracker, self).setUp()
+        self.tracker = udp.LossTracker()
+
+    def test_no_loss(self):
+        for seq in range(5):
+            self.tracker.track('a', seq)
+            self.tracker.track('b', seq + 10)
+        stats = self.tracker.get_stats()
+        self.assertEqual(stats['senders'], 2)
+        self.assertEqual(stats['received'], 10)
+        self.assertEqual(stats['lost'], 0)
+
+    def test_loss(self):
+        for seq in (0, 1, 4, 5):
+            self.tracker.track('a', seq)
+        stats = self.tracker.get_stats()
+        self.assertEqual(stats['lost'], 2)
+        self.assertEqual(stats['loss_ratio'], 2.0 / 6)
+
+    def test_reordered(self):
+        for seq in (0, 2, 1, 3):
+            self.tracker.track('a', seq)
+        stats = self.tracker.get_stats()
+        self.assertEqual(stats['lost'], 0)
+        self.assertEqual(stats['reordered'], 1)
+
+    def test_wrap_around(self):
+        self.tracker.track('a', udp.SEQUENCE_MODULO - 1)
+        self.tracker.track('a', 0)
+        self.assertEqual(self.tracker.get_stats()['lost'], 0)
@@ -0,0 +1,76 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Tests for ceilometer/collector/writer.py
+"""
+
+import eventlet
+
+from ceilometer.collector import writer
+from ceilometer.tests import base
+
+
+class TestWriteBehindBuffer(base.TestCase):
+
+    def setUp(self):
+        super(TestWriteBehindBuffer, self).setUp()
+        self.groups = []
+
+    def write(self, meters):
+        self.groups.append(meters)
+
+    def _buffer(self, size=10, group_size=3, interval=10):
+        buf = writer.WriteBehindBuffer(self.write, size, group_size,
+                                       interval)
+        self.addCleanup(buf.stop)
+        return buf
+
+    def test_group_commit(self):
+        buf = self._buffer()
+        buf.put(range(4))
+        buf.put([4])
+        buf.join()
+        self.assertEqual(self.groups, [[0, 1, 2], [3, 4]])
+        stats = buf.get_stats()
+        self.assertEqual(stats['commits'], 2)
+        self.assertEqual(stats['written'], 5)
+        self.assertEqual(stats['group_max'], 3)
+        self.assertEqual(stats['occupancy'], 0)
+
+    def test_interval(self):
+        buf = self._buffer(interval=0)
+        buf.put([0])
+        buf.join()
+        buf.put([1])
+        buf.join()
+        self.assertEqual(self.groups, [[0], [1]])
+
+    def test_backpressure(self):
+        buf = self._buffer(size=2, group_size=10, interval=100)
+        producer = eventlet.spawn(buf.put, range(5))
+        eventlet.sleep(0)
+        # The writer waits for more meters and the producer is blocked
+        self.assertEqual(buf.get_stats()['occupancy'], 2)
+        self.assertEqual(self.groups, [])
+        buf.stop()
+        producer.wait()
+        self.assertEqual(sum(self.groups, []), range(5))
+
+    def test_write_error(self):
+        def fail(meters):
+            raise Exception('database down')
+        buf = writer.WriteBehindBuffer(fail, 10, 3, 0)
+        self.addCleanup(buf.stop)
+        buf.put([0])
+        buf.join()
+        self.assertEqual(buf.get_stats()['commits'], 1)
@@ -30,6 +30,7 @@ from ceilometer import nova_client
 from ceilometer.compute import manager
 from ceilometer import counter
 from ceilometer import pipeline
+from ceilometer import plugin
 from ceilometer.tests import base
 
 from tests import agentbase
@@ -75,6 +76,19 @@ class TestRunTasks(agentbase.BaseAgentManagerTestCase):
         super(TestRunTasks, self).test_setup_polling_tasks()
         self.assertTrue(self.Pollster.counters[0][1] is self.instance)
 
+    def test_poll_cycle_on_manager(self):
+        cycles = []
+
+        def get_counters(pollster, manager, instance):
+            cycles.append(manager.poll_cycle)
+            return []
+        self.stubs.Set(self.Pollster, 'get_counters', get_counters)
+        polling_tasks = self.mgr.setup_polling_tasks()
+        self.mgr.interval_task(polling_tasks.values()[0])
+        self.assertEqual(len(cycles), 1)
+        self.assertTrue(isinstance(cycles[0], plugin.PollCycle))
+        self.assertTrue(self.mgr.poll_cycle is None)
+
     def test_interval_exception_isolation(self):
         super(TestRunTasks, self).test_interval_exception_isolation()
         self.assertEqual(len(self.PollsterException.counters), 1)
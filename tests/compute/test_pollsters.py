@@ -26,6 +26,7 @@ import time
 from ceilometer.compute import pollsters
 from ceilometer.compute import manager
 from ceilometer.compute.virt import inspector as virt_inspector
+from ceilometer import plugin
 from ceilometer.tests import base as test_base
 
 
@@ -60,6 +61,19 @@ class TestInstancePollster(TestPollsterBase):
         self.assertEqual(counters[0].name, 'instance')
         self.assertEqual(counters[1].name, 'instance:m1.small')
 
+    @mock.patch('ceilometer.pipeline.setup_pipeline', mock.MagicMock())
+    def test_get_counters_cycle(self):
+        self.mox.ReplayAll()
+
+        mgr = manager.AgentManager()
+        pollster = pollsters.InstancePollster()
+        cycle = mgr.poll_cycle = plugin.PollCycle()
+        counters = list(pollster.get_counters(mgr, self.instance))
+        self.assertEqual(counters[0].timestamp, cycle.timestamp)
+        self.assertEqual(counters[1].timestamp, cycle.timestamp)
+        self.assertTrue(counters[0].resource_metadata is
+                        counters[1].resource_metadata)
+
 
 class TestDiskIOPollster(TestPollsterBase):
 
@@ -45,14 +45,20 @@ class TestSwiftMiddleware(base.TestCase):
 
     class _faux_pipeline_manager(object):
         class _faux_pipeline(object):
+            included_counters = frozenset()
+            excluded_counters = frozenset()
+
             def __init__(self, pipeline_manager):
                 self.pipeline_manager = pipeline_manager
                 self.counters = []
 
-            def publish_counters(self, ctxt, counters, source):
+            def publish_counters(self, ctxt, counters, source, shared=None,
+                                 buffer=None):
                 self.counters.extend(counters)
 
-            def flush(self, context, source):
+            publish_supported_counters = publish_counters
+
+            def flush(self, context, source, shared=None, buffer=None):
                 pass
 
         def __init__(self):
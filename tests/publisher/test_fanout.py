@@ -0,0 +1,95 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Tests for ceilometer/publisher/fanout.py
+"""
+
+from oslo.config import cfg
+
+from ceilometer import publisher
+from ceilometer.publisher import fanout
+from ceilometer.tests import base
+
+
+class TestQueuedPublisher(base.TestCase):
+
+    class PublisherClass(object):
+        def __init__(self):
+            self.counters = []
+
+        def publish_counters(self, context, counters, source):
+            self.counters.extend(counters)
+
+    class PublisherClassException(object):
+        def publish_counters(self, context, counters, source):
+            raise Exception()
+
+    def setUp(self):
+        super(TestQueuedPublisher, self).setUp()
+        self.publisher = self.PublisherClass()
+
+    def test_invalid_policy(self):
+        self.assertRaises(ValueError, fanout.QueuedPublisher,
+                          'test', self.publisher, 1, 'invalid')
+
+    def test_publish_in_background(self):
+        p = fanout.QueuedPublisher('test', self.publisher, 10, 'block')
+        p.publish_counters(None, [1, 2], None)
+        p.publish_counters(None, [3], None)
+        self.assertEqual(self.publisher.counters, [])
+        p.join()
+        self.assertEqual(self.publisher.counters, [1, 2, 3])
+        stats = p.get_stats()
+        self.assertEqual(stats['published'], 2)
+        self.assertEqual(stats['queue_depth'], 0)
+        p.stop()
+
+    def test_drop_oldest(self):
+        p = fanout.QueuedPublisher('test', self.publisher, 2, 'drop_oldest')
+        for i in range(4):
+            p.publish_counters(None, [i], None)
+        self.assertEqual(p.get_stats()['queue_depth'], 2)
+        p.join()
+        self.assertEqual(self.publisher.counters, [2, 3])
+        self.assertEqual(p.get_stats()['dropped'], 2)
+        p.stop()
+
+    def test_publisher_exception(self):
+        p = fanout.QueuedPublisher('test', self.PublisherClassException(),
+                                   10, 'block')
+        p.publish_counters(None, [0], None)
+        p.publish_counters(None, [1], None)
+        p.join()
+        stats = p.get_stats()
+        self.assertEqual(stats['errors'], 2)
+        self.assertEqual(stats['published'], 0)
+        p.stop()
+
+
+class TestPublisherExtensionManager(base.TestCase):
+
+    def tearDown(self):
+        cfg.CONF.clear_override('publisher_async')
+        super(TestPublisherExtensionManager, self).tearDown()
+
+    def test_sync_publishers(self):
+        mgr = publisher.PublisherExtensionManager('ceilometer.publisher')
+        self.assertEqual(mgr.get_stats(), {})
+
+    def test_async_publishers(self):
+        cfg.CONF.set_override('publisher_async', True)
+        mgr = publisher.PublisherExtensionManager('ceilometer.publisher')
+        for ext in mgr.extensions:
+            self.assertIsInstance(ext.obj, fanout.QueuedPublisher)
+        self.assertEqual(sorted(mgr.get_stats().keys()),
+                         sorted(mgr.names()))
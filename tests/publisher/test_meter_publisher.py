@@ -22,6 +22,7 @@ import datetime
 
 from oslo.config import cfg
 
+from ceilometer.collector import meter
 from ceilometer.openstack.common import rpc
 from ceilometer.tests import base
 
@@ -118,3 +119,48 @@ class TestPublish(base.TestCase):
         self.assertIn(cfg.CONF.metering_topic + '.' + 'test', topics)
         self.assertIn(cfg.CONF.metering_topic + '.' + 'test2', topics)
         self.assertIn(cfg.CONF.metering_topic + '.' + 'test3', topics)
+
+    def _publish_with_layout(self, layout):
+        self.published = []
+        cfg.CONF.set_override('metering_topic_layout', layout)
+        self.addCleanup(cfg.CONF.clear_override, 'metering_topic_layout')
+        publisher = meter_publish.MeterPublisher()
+        publisher.publish_counters(None, self.test_data, 'test')
+        return [topic for topic, meter in self.published]
+
+    def test_layout_aggregate(self):
+        self.assertEqual(self._publish_with_layout('aggregate'),
+                         [cfg.CONF.metering_topic])
+
+    def test_layout_per_meter(self):
+        self.assertEqual(self._publish_with_layout('per_meter'),
+                         [cfg.CONF.metering_topic + '.' + name
+                          for name in ('test', 'test2', 'test3')])
+
+    def test_layout_invalid(self):
+        self.assertRaises(ValueError, self._publish_with_layout, 'foo')
+
+    def test_metadata_by_reference(self):
+        self.published = []
+        cfg.CONF.set_override('metering_metadata_by_reference', True)
+        self.addCleanup(cfg.CONF.clear_override,
+                        'metering_metadata_by_reference')
+        publisher = meter_publish.MeterPublisher()
+        publisher.publish_counters(None, self.test_data, 'test')
+        publisher.publish_counters(None, self.test_data, 'test')
+        for topic, rpc_call in self.published:
+            meters = rpc_call['args']['data']
+            if topic != cfg.CONF.metering_topic:
+                self.assertTrue(all('resource_metadata' in m
+                                    for m in meters))
+        aggregate = [rpc_call['args']['data']
+                     for topic, rpc_call in self.published
+                     if topic == cfg.CONF.metering_topic]
+        self.assertEqual(len(aggregate), 2)
+        self.assertEqual(len([m for m in aggregate[0]
+                              if 'resource_metadata' in m]), 1)
+        # Each batch carries the metadata it refers to
+        self.assertEqual(aggregate[1][0]['resource_metadata'],
+                         self.test_data[0].resource_metadata)
+        self.assertTrue(all(meter.METADATA_REF in m
+                            for m in aggregate[1][1:]))
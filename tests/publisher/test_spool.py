@@ -0,0 +1,200 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Tests for ceilometer/publisher/spool.py
+"""
+
+import os
+import shutil
+import tempfile
+
+from oslo.config import cfg
+
+from ceilometer import counter
+from ceilometer.openstack.common import jsonutils
+from ceilometer import publisher
+from ceilometer.publisher import spool
+from ceilometer.tests import base
+
+
+class TestSpoolingPublisher(base.TestCase):
+
+    class PublisherClass(object):
+        def __init__(self):
+            self.counters = []
+            self.fail = False
+
+        def publish_counters(self, context, counters, source):
+            if self.fail:
+                raise Exception('broker down')
+            self.counters.extend(c.volume for c in counters)
+
+    def setUp(self):
+        super(TestSpoolingPublisher, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.publisher = self.PublisherClass()
+
+    def _spooling_publisher(self):
+        p = spool.SpoolingPublisher('test', self.publisher, self.directory)
+        p._retry_delay = lambda: 0
+        self.addCleanup(p.stop)
+        return p
+
+    @staticmethod
+    def _counters(*volumes):
+        return [counter.Counter(name='test',
+                                type=counter.TYPE_GAUGE,
+                                unit='',
+                                volume=v,
+                                user_id='user',
+                                project_id='project',
+                                resource_id='resource',
+                                timestamp='2013-05-01T12:00:00',
+                                resource_metadata={'name': 'test'})
+                for v in volumes]
+
+    def _replay_all(self, p):
+        while p.replay_one():
+            pass
+
+    def test_publish_through(self):
+        p = self._spooling_publisher()
+        p.publish_counters(None, self._counters(1, 2), 'test')
+        self.assertEqual(self.publisher.counters, [1, 2])
+        self.assertEqual(p.get_stats()['spool_depth'], 0)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_spool_and_replay_in_order(self):
+        p = self._spooling_publisher()
+        self.publisher.fail = True
+        p.publish_counters(None, self._counters(1, 2), 'test')
+        self.publisher.fail = False
+        # Spooled behind the first batch even though the publisher is up
+        p.publish_counters(None, self._counters(3), 'test')
+        self.assertEqual(self.publisher.counters, [])
+        stats = p.get_stats()
+        self.assertEqual(stats['spool_depth'], 2)
+        self.assertEqual(stats['spool_spooled'], 2)
+        self.assertTrue(stats['spool_age'] >= 0)
+        self._replay_all(p)
+        self.assertEqual(self.publisher.counters, [1, 2, 3])
+        stats = p.get_stats()
+        self.assertEqual(stats['spool_depth'], 0)
+        self.assertEqual(stats['spool_replayed'], 2)
+        self.assertEqual([f for f in os.listdir(self.directory)
+                          if f.endswith('.spool')], [])
+        p.publish_counters(None, self._counters(4), 'test')
+        self.assertEqual(self.publisher.counters, [1, 2, 3, 4])
+
+    def test_replay_failure_keeps_batch(self):
+        p = self._spooling_publisher()
+        self.publisher.fail = True
+        p.publish_counters(None, self._counters(1), 'test')
+        self.assertTrue(p.replay_one())
+        self.assertEqual(p.get_stats()['spool_depth'], 1)
+        self.publisher.fail = False
+        self._replay_all(p)
+        self.assertEqual(self.publisher.counters, [1])
+
+    def test_poison_batch_dead_lettered(self):
+        cfg.CONF.set_override('publisher_spool_max_retries', 3)
+        self.addCleanup(cfg.CONF.clear_override,
+                        'publisher_spool_max_retries')
+        p = self._spooling_publisher()
+        # Replay from the test only, to count the failures
+        p._run = lambda: None
+        publish_counters = self.publisher.publish_counters
+
+        def reject_poison(context, counters, source):
+            if counters[0].volume == 0:
+                raise Exception('poison')
+            publish_counters(context, counters, source)
+        self.publisher.publish_counters = reject_poison
+        for i in range(3):
+            p.publish_counters(None, self._counters(i), 'test')
+        for i in range(2):
+            self.assertTrue(p.replay_one())
+            self.assertEqual(p.get_stats()['spool_depth'], 3)
+        self._replay_all(p)
+        self.assertEqual(self.publisher.counters, [1, 2])
+        stats = p.get_stats()
+        self.assertEqual(stats['spool_dead'], 1)
+        self.assertEqual(stats['spool_depth'], 0)
+        with open(os.path.join(self.directory, spool.DEAD_LETTER_FILE)) as f:
+            lines = f.readlines()
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(jsonutils.loads(lines[0])['counters'][0][3], 0)
+
+    def test_resume_after_restart(self):
+        p = self._spooling_publisher()
+        self.publisher.fail = True
+        for i in range(3):
+            p.publish_counters(None, self._counters(i), 'test')
+        self.publisher.fail = False
+        p.replay_one()
+        p.stop()
+        p = self._spooling_publisher()
+        self.assertEqual(p.get_stats()['spool_depth'], 2)
+        p.publish_counters(None, self._counters(3), 'test')
+        self._replay_all(p)
+        self.assertEqual(self.publisher.counters, [0, 1, 2, 3])
+
+    def test_segments_capped(self):
+        p = self._spooling_publisher()
+        p.segment_size = 1
+        p.max_size = 1000
+        self.publisher.fail = True
+        for i in range(10):
+            p.publish_counters(None, self._counters(i), 'test')
+        stats = p.get_stats()
+        self.assertTrue(stats['spool_dropped'] > 0)
+        self.assertEqual(stats['spool_depth'], 10 - stats['spool_dropped'])
+        self.publisher.fail = False
+        self._replay_all(p)
+        self.assertEqual(self.publisher.counters,
+                         range(stats['spool_dropped'], 10))
+
+    def test_segment_dropped_during_replay(self):
+        p = self._spooling_publisher()
+        p.segment_size = 1
+        self.publisher.fail = True
+        for i in range(3):
+            p.publish_counters(None, self._counters(i), 'test')
+        self.publisher.fail = False
+        publish = self.publisher.publish_counters
+
+        def publish_and_spool(context, counters, source):
+            publish(context, counters, source)
+            # Another batch spooled meanwhile fills the spool
+            self.publisher.publish_counters = publish
+            p.max_size = 1
+            p.publish_counters(None, self._counters(3), 'test')
+
+        self.publisher.publish_counters = publish_and_spool
+        self._replay_all(p)
+        self.assertEqual(self.publisher.counters, [0, 3])
+        self.assertEqual(p.get_stats()['spool_depth'], 0)
+
+
+class TestPublisherExtensionManagerSpool(base.TestCase):
+
+    def test_spooling_publishers(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        cfg.CONF.set_override('publisher_spool_dir', directory)
+        self.addCleanup(cfg.CONF.clear_override, 'publisher_spool_dir')
+        mgr = publisher.PublisherExtensionManager('ceilometer.publisher')
+        for ext in mgr.extensions:
+            self.assertIsInstance(ext.obj, spool.SpoolingPublisher)
+            self.assertIn('spool_depth', mgr.get_stats()[ext.name])
@@ -0,0 +1,91 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Tests for ceilometer/publisher/storage_publish.py
+"""
+
+import datetime
+
+from ceilometer import counter
+from ceilometer.publisher import storage_publish
+from ceilometer import storage
+from ceilometer.tests import base
+
+
+class FauxConnection(object):
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.meters = []
+
+    def record_metering_data_batch(self, data):
+        if self.failures:
+            self.failures -= 1
+            raise Exception('database down')
+        self.meters.extend(data)
+
+
+class TestStoragePublisher(base.TestCase):
+
+    test_data = [
+        counter.Counter(
+            name='test',
+            type=counter.TYPE_CUMULATIVE,
+            unit='',
+            volume=i,
+            user_id='test',
+            project_id='test',
+            resource_id='test_run_tasks',
+            timestamp='2013-05-01T12:00:00Z',
+            resource_metadata={'name': 'TestPublish'},
+        ) for i in range(3)]
+
+    def setUp(self):
+        super(TestStoragePublisher, self).setUp()
+        self.connections = []
+        self.stubs.Set(storage, 'get_connection', self.faux_get_connection)
+        self.failures = []
+
+    def faux_get_connection(self, conf):
+        conn = FauxConnection(self.failures.pop(0) if self.failures else 0)
+        self.connections.append(conn)
+        return conn
+
+    def test_published(self):
+        publisher = storage_publish.StoragePublisher()
+        publisher.publish_counters(None, self.test_data, 'test')
+        publisher.publish_counters(None, self.test_data, 'test')
+        self.assertEqual(len(self.connections), 1)
+        meters = self.connections[0].meters
+        self.assertEqual([m['counter_volume'] for m in meters],
+                         [0, 1, 2, 0, 1, 2])
+        self.assertNotIn('message_signature', meters[0])
+        self.assertEqual(meters[0]['source'], 'test')
+        self.assertEqual(meters[0]['timestamp'],
+                         datetime.datetime(2013, 5, 1, 12))
+
+    def test_reconnect(self):
+        self.failures = [1]
+        publisher = storage_publish.StoragePublisher()
+        publisher.publish_counters(None, self.test_data, 'test')
+        self.assertEqual(len(self.connections), 2)
+        self.assertEqual([m['counter_volume']
+                          for m in self.connections[1].meters],
+                         [0, 1, 2])
+
+    def test_reconnect_fails(self):
+        self.failures = [1, 1]
+        publisher = storage_publish.StoragePublisher()
+        self.assertRaises(Exception, publisher.publish_counters,
+                          None, self.test_data, 'test')
+        self.assertEqual(len(self.connections), 2)
@@ -0,0 +1,83 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Tests for ceilometer/publisher/udp.py
+"""
+
+import datetime
+
+from oslo.config import cfg
+
+from ceilometer.collector import meter
+from ceilometer.collector import udp as udp_api
+from ceilometer import counter
+from ceilometer.publisher import udp
+from ceilometer.tests import base
+
+
+class FauxSocket(object):
+
+    def __init__(self):
+        self.sent = []
+
+    def sendto(self, datagram, address):
+        self.sent.append((datagram, address))
+
+
+class TestUDPPublisher(base.TestCase):
+
+    test_data = [
+        counter.Counter(
+            name='test',
+            type=counter.TYPE_CUMULATIVE,
+            unit='',
+            volume=i,
+            user_id='test',
+            project_id='test',
+            resource_id='test_run_tasks',
+            timestamp=datetime.datetime.utcnow().isoformat(),
+            resource_metadata={'name': 'TestPublish'},
+        ) for i in range(50)]
+
+    def setUp(self):
+        super(TestUDPPublisher, self).setUp()
+        self.socket = FauxSocket()
+        self.publisher = udp.UDPPublisher()
+        self.publisher.socket = self.socket
+        self.publisher.address = ('127.0.0.1', cfg.CONF.udp_port)
+
+    def test_published(self):
+        self.publisher.publish_counters(None, self.test_data, 'test')
+        self.assertEqual(len(self.socket.sent), 1)
+        datagram, address = self.socket.sent[0]
+        self.assertEqual(address, ('127.0.0.1', cfg.CONF.udp_port))
+        seq, meters = udp_api.unpack(datagram)
+        self.assertEqual(seq, 0)
+        self.assertEqual([m['counter_volume'] for m in meters], range(50))
+        self.assertTrue(all(meter.verify_signatures(
+            meters, cfg.CONF.metering_secret)))
+
+    def test_split(self):
+        self.publisher.max_size = 1024
+        self.publisher.publish_counters(None, self.test_data, 'test')
+        self.publisher.publish_counters(None, self.test_data, 'test')
+        self.assertTrue(len(self.socket.sent) > 2)
+        unpacked = [udp_api.unpack(d) for d, a in self.socket.sent]
+        self.assertEqual([seq for seq, meters in unpacked],
+                         range(len(self.socket.sent)))
+        self.assertEqual(sum(len(meters) for seq, meters in unpacked), 100)
+
+    def test_invalid_codec(self):
+        cfg.CONF.set_override('udp_publisher_codec', 'foo')
+        self.addCleanup(cfg.CONF.clear_override, 'udp_publisher_codec')
+        self.assertRaises(ValueError, udp.UDPPublisher)
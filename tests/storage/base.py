@@ -585,6 +585,65 @@ class CounterDataTypeTest(DBTestBase):
         self.assertEqual(results[0].counter_volume, 1938495037.53697)
 
 
+class BatchRecordTest(DBTestBase):
+
+    def prepare_data(self):
+        self.msgs = []
+        for i, source in enumerate(['test-1', 'test-2', 'test-1']):
+            c = counter.Counter(
+                'instance',
+                counter.TYPE_CUMULATIVE,
+                unit='',
+                volume=i,
+                user_id='user-id',
+                project_id='project-id',
+                resource_id='resource-id',
+                timestamp=datetime.datetime(2012, 7, 2, 10, 40 + i),
+                resource_metadata={'display_name': 'test-server',
+                                   'tag': 'counter-%d' % i},
+            )
+            self.msgs.append(meter.meter_message_from_counter(
+                c, cfg.CONF.metering_secret, source))
+        c = counter.Counter(
+            'cpu',
+            counter.TYPE_CUMULATIVE,
+            unit='ns',
+            volume=1,
+            user_id='user-id-alternate',
+            project_id='project-id-alternate',
+            resource_id='resource-id-alternate',
+            timestamp=datetime.datetime(2012, 7, 2, 10, 43),
+            resource_metadata={'display_name': 'test-server'},
+        )
+        self.msgs.append(meter.meter_message_from_counter(
+            c, cfg.CONF.metering_secret, 'test-1'))
+        self.conn.record_metering_data_batch(self.msgs)
+
+    def test_samples(self):
+        f = storage.SampleFilter(meter='instance')
+        results = list(self.conn.get_samples(f))
+        self.assertEqual(sorted(r.counter_volume for r in results),
+                         [0, 1, 2])
+        f = storage.SampleFilter(meter='cpu')
+        self.assertEqual(len(list(self.conn.get_samples(f))), 1)
+
+    def test_resources(self):
+        resources = dict((r.resource_id, r)
+                         for r in self.conn.get_resources())
+        self.assertEqual(sorted(resources),
+                         ['resource-id', 'resource-id-alternate'])
+        self.assertEqual(resources['resource-id'].metadata['display_name'],
+                         'test-server')
+
+    def test_users_and_projects(self):
+        self.assertEqual(sorted(self.conn.get_users()),
+                         ['user-id', 'user-id-alternate'])
+        self.assertEqual(list(self.conn.get_users(source='test-2')),
+                         ['user-id'])
+        self.assertEqual(sorted(self.conn.get_projects()),
+                         ['project-id', 'project-id-alternate'])
+
+
 class AlarmTest(DBTestBase):
 
     def test_empty(self):
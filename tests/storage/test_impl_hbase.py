@@ -57,3 +57,7 @@ class StatisticsTest(base.StatisticsTest, HBaseEngineTestBase):
 
 class CounterDataTypeTest(base.CounterDataTypeTest, HBaseEngineTestBase):
     pass
+
+
+class BatchRecordTest(base.BatchRecordTest, HBaseEngineTestBase):
+    pass
@@ -174,3 +174,7 @@ class CompatibilityTest(MongoDBEngineTestBase):
 
 class CounterDataTypeTest(base.CounterDataTypeTest, MongoDBEngineTestBase):
     pass
+
+
+class BatchRecordTest(base.BatchRecordTest, MongoDBEngineTestBase):
+    pass
@@ -17,12 +17,19 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import copy
+import os
+import tempfile
+
+from oslo.config import cfg
 from stevedore import extension
+import yaml
 
 from ceilometer import counter
 from ceilometer import publisher
 from ceilometer import transformer
 from ceilometer.transformer import accumulator
+from ceilometer.transformer import bounded
 from ceilometer.openstack.common import timeutils
 from ceilometer import pipeline
 from ceilometer.tests import base
@@ -43,6 +50,8 @@ class TestPipeline(base.TestCase):
             'update': self.TransformerClass,
             'except': self.TransformerClassException,
             'drop': self.TransformerClassDrop,
+            'batch': self.TransformerClassBatch,
+            'bounded': bounded.BoundedAccumulator,
             'cache': accumulator.TransformerAccumulator}
 
         if name in class_name_ext:
@@ -56,8 +65,10 @@ class TestPipeline(base.TestCase):
     class PublisherClass():
         def __init__(self):
             self.counters = []
+            self.calls = 0
 
         def publish_counters(self, ctxt, counters, source):
+            self.calls += 1
             self.counters.extend(counters)
 
     class PublisherClassException():
@@ -92,6 +103,22 @@ class TestPipeline(base.TestCase):
         def handle_sample(self, ctxt, counter, source):
             raise Exception()
 
+    class TransformerClassBatch(transformer.TransformerBase):
+        batches = []
+
+        def __init__(self, fail=False):
+            self.__class__.batches = []
+            self.fail = fail
+
+        def handle_sample(self, ctxt, counter, source):
+            raise AssertionError('handle_sample should not be called')
+
+        def handle_samples(self, ctxt, counters, source):
+            self.__class__.batches.append(list(counters))
+            if self.fail:
+                raise Exception()
+            return [c._replace(name=c.name + '_batch') for c in counters]
+
     def setUp(self):
         super(TestPipeline, self).setUp()
 
@@ -676,3 +703,388 @@ class TestPipeline(base.TestCase):
                         == 'a:b_update')
         self.assertTrue(getattr(self.TransformerClass.samples[0], "name")
                         == 'a:b')
+
+    def test_router_included_counters(self):
+        self.pipeline_cfg[0]['counters'] = ['a', 'b']
+        self.pipeline_cfg.append({
+            'name': 'second_pipeline',
+            'interval': 5,
+            'counters': ['b'],
+            'transformers': [],
+            'publishers': ['new'],
+        })
+        pipeline_manager = pipeline.PipelineManager(self.pipeline_cfg,
+                                                    self.transformer_manager,
+                                                    self.publisher_manager)
+        first, second = pipeline_manager.pipelines
+        self.assertEqual(pipeline_manager.router.route('a'), (first,))
+        self.assertEqual(pipeline_manager.router.route('b'), (first, second))
+        self.assertEqual(pipeline_manager.router.route('c'), ())
+
+    def test_router_wildcard_excluded_counters(self):
+        self.pipeline_cfg[0]['counters'] = ['*', '!b']
+        self.pipeline_cfg.append({
+            'name': 'second_pipeline',
+            'interval': 5,
+            'counters': ['!a', '!b'],
+            'transformers': [],
+            'publishers': ['new'],
+        })
+        pipeline_manager = pipeline.PipelineManager(self.pipeline_cfg,
+                                                    self.transformer_manager,
+                                                    self.publisher_manager)
+        first, second = pipeline_manager.pipelines
+        self.assertEqual(pipeline_manager.router.route('a'), (first,))
+        self.assertEqual(pipeline_manager.router.route('b'), ())
+        self.assertEqual(pipeline_manager.router.route('c'), (first, second))
+
+    def test_router_variable_counter(self):
+        self.pipeline_cfg[0]['counters'] = ['a:*']
+        pipeline_manager = pipeline.PipelineManager(self.pipeline_cfg,
+                                                    self.transformer_manager,
+                                                    self.publisher_manager)
+        pipe = pipeline_manager.pipelines[0]
+        self.assertEqual(pipeline_manager.router.route('a:b'), (pipe,))
+        self.assertEqual(pipeline_manager.router.route('a'), ())
+
+    def test_router_cache_bounded(self):
+        self.pipeline_cfg[0]['counters'] = ['*']
+        pipeline_manager = pipeline.PipelineManager(self.pipeline_cfg,
+                                                    self.transformer_manager,
+                                                    self.publisher_manager)
+        router = pipeline.CounterRouter(pipeline_manager.pipelines,
+                                        cache_size=2)
+        for name in ['a', 'b', 'c']:
+            self.assertEqual(router.route(name),
+                             tuple(pipeline_manager.pipelines))
+        self.assertTrue(len(router._cache) <= 2)
+
+    def test_publish_context_added_pipelines(self):
+        pipeline_manager = pipeline.PipelineManager(self.pipeline_cfg,
+                                                    self.transformer_manager,
+                                                    self.publisher_manager)
+        publish_context = pipeline.PublishContext(None, None)
+        with publish_context as p:
+            p([self.test_counter])
+        self.assertEqual(len(self.publisher.counters), 0)
+
+        publish_context.add_pipelines(pipeline_manager.pipelines)
+        with publish_context as p:
+            p([self.test_counter])
+        self.assertEqual(len(self.publisher.counters), 1)
+
+    def test_batch_transformer(self):
+        self.pipeline_cfg[0]['counters'] = ['a', 'b']
+        self.pipeline_cfg[0]['transformers'].append({
+            'name': 'batch',
+            'parameters': {},
+        })
+        pipeline_manager = pipeline.PipelineManager(self.pipeline_cfg,
+                                                    self.transformer_manager,
+                                                    self.publisher_manager)
+        with pipeline_manager.publisher(None, None) as p:
+            p([self.test_counter,
+               self.test_counter,
+               self.test_counter._replace(name='b')])
+
+        self.assertEqual(len(self.TransformerClass.samples), 3)
+        self.assertEqual(len(self.TransformerClassBatch.batches), 2)
+        self.assertEqual([c.name for c in
+                          self.TransformerClassBatch.batches[0]],
+                         ['a_update', 'a_update'])
+        self.assertEqual([c.name for c in self.publisher.counters],
+                         ['a_update_batch', 'a_update_batch',
+                          'b_update_batch'])
+
+    def test_batch_transformer_exception(self):
+        self.pipeline_cfg[0]['transformers'].append({
+            'name': 'batch',
+            'parameters': {'fail': True},
+        })
+        pipeline_manager = pipeline.PipelineManager(self.pipeline_cfg,
+                                                    self.transformer_manager,
+                                                    self.publisher_manager)
+        with pipeline_manager.publisher(None, None) as p:
+            p([self.test_counter, self.test_counter])
+
+        self.assertEqual(len(self.TransformerClassBatch.batches), 1)
+        self.assertEqual(len(self.publisher.counters), 0)
+
+    def test_transformer_exception_isolation(self):
+        self.pipeline_cfg[0]['transformers'] = [{
+            'name': 'except',
+            'parameters': {},
+        }]
+        pipeline_manager = pipeline.PipelineManager(self.pipeline_cfg,
+                                                    self.transformer_manager,
+                                                    self.publisher_manager)
+        with pipeline_manager.publisher(None, None) as p:
+            p([self.test_counter])
+        self.assertEqual(len(self.publisher.counters), 0)
+
+    def test_accumulator_handle_samples(self):
+        acc = accumulator.TransformerAccumulator(size=3)
+        self.assertEqual(acc.handle_samples(None, [self.test_counter] * 2,
+                                            None), [])
+        self.assertEqual(acc.flush(None, None), [])
+        self.assertEqual(acc.handle_samples(None, [self.test_counter],
+                                            None), [])
+        self.assertEqual(len(acc.flush(None, None)), 3)
+
+    def test_accumulator_disabled(self):
+        acc = accumulator.TransformerAccumulator(size=0)
+        self.assertEqual(acc.handle_samples(None, [self.test_counter],
+                                            None), [self.test_counter])
+        self.assertEqual(acc.flush(None, None), [])
+
+    def test_flush_interval(self):
+        pipeline_manager = pipeline.PipelineManager(self.pipeline_cfg,
+                                                    self.transformer_manager,
+                                                    self.publisher_manager)
+        self.assertEqual(pipeline_manager.get_flush_interval(), None)
+
+        self.pipeline_cfg[0]['transformers'].append({
+            'name': 'bounded',
+            'parameters': {'max_age': 20},
+        })
+        self.pipeline_cfg.append({
+            'name': 'second_pipeline',
+            'interval': 5,
+            'counters': ['b'],
+            'transformers': [{
+                'name': 'bounded',
+                'parameters': {'max_age': 10},
+            }],
+            'publishers': ['new'],
+        })
+        pipeline_manager = pipeline.PipelineManager(self.pipeline_cfg,
+                                                    self.transformer_manager,
+                                                    self.publisher_manager)
+        self.assertEqual(pipeline_manager.pipelines[0].get_flush_interval(),
+                         10)
+        self.assertEqual(pipeline_manager.get_flush_interval(), 5)
+
+    def test_flush_pipeline_manager_expired(self):
+        self.pipeline_cfg[0]['transformers'].append({
+            'name': 'bounded',
+            'parameters': {'size': 10, 'max_age': 10},
+        })
+        pipeline_manager = pipeline.PipelineManager(self.pipeline_cfg,
+                                                    self.transformer_manager,
+                                                    self.publisher_manager)
+        timeutils.set_time_override()
+        try:
+            with pipeline_manager.publisher(None, None) as p:
+                p([self.test_counter])
+            self.assertEqual(len(self.publisher.counters), 0)
+            pipeline_manager.flush(None, None)
+            self.assertEqual(len(self.publisher.counters), 0)
+            timeutils.advance_time_seconds(11)
+            pipeline_manager.flush(None, None)
+            self.assertEqual(len(self.publisher.counters), 1)
+        finally:
+            timeutils.clear_time_override()
+
+    def _shared_stage_cfg(self, *transformers):
+        self.pipeline_cfg = [{
+            'name': name,
+            'interval': 5,
+            'counters': ['a'],
+            'transformers': [
+                {'name': 'batch', 'stage': 'shared', 'parameters': {}},
+            ] + list(transformers),
+            'publishers': [publisher],
+        } for name, publisher in (('first_pipeline', 'test'),
+                                  ('second_pipeline', 'new'))]
+
+    def test_shared_stage(self):
+        self._shared_stage_cfg()
+        self.pipeline_cfg[1]['transformers'].append({'name': 'update',
+                                                     'parameters': {}})
+        pipeline_manager = pipeline.PipelineManager(self.pipeline_cfg,
+                                                    self.transformer_manager,
+                                                    self.publisher_manager)
+        first, second = pipeline_manager.pipelines
+        self.assertTrue(first.transformers[0] is second.transformers[0])
+        with pipeline_manager.publisher(None, None) as p:
+            p([self.test_counter])
+
+        self.assertEqual(len(self.TransformerClassBatch.batches), 1)
+        self.assertEqual([c.name for c in self.publisher.counters],
+                         ['a_batch'])
+        self.assertEqual([c.name for c in self.new_publisher.counters],
+                         ['a_batch_update'])
+
+    def test_shared_stage_different_parameters(self):
+        self._shared_stage_cfg()
+        self.pipeline_cfg[1]['transformers'][0]['parameters'] = {
+            'fail': True}
+        self._exception_create_pipelinemanager()
+
+    def test_shared_stage_different_counters(self):
+        self._shared_stage_cfg()
+        self.pipeline_cfg[1]['counters'] = ['b']
+        self._exception_create_pipelinemanager()
+
+    def test_shared_stage_after_unshared(self):
+        self._shared_stage_cfg()
+        for pipedef in self.pipeline_cfg:
+            pipedef['transformers'].insert(0, {'name': 'update',
+                                               'parameters': {}})
+        self._exception_create_pipelinemanager()
+
+    def test_shared_stage_flush(self):
+        self._shared_stage_cfg()
+        for pipedef in self.pipeline_cfg:
+            pipedef['transformers'].append({'name': 'bounded',
+                                            'stage': 'buffer',
+                                            'parameters': {'size': 10}})
+        pipeline_manager = pipeline.PipelineManager(self.pipeline_cfg,
+                                                    self.transformer_manager,
+                                                    self.publisher_manager)
+        timeutils.set_time_override()
+        try:
+            with pipeline_manager.publisher(None, None) as p:
+                p([self.test_counter])
+            self.assertEqual(len(self.publisher.counters), 0)
+            timeutils.advance_time_seconds(61)
+            pipeline_manager.flush(None, None)
+        finally:
+            timeutils.clear_time_override()
+        self.assertEqual(len(self.TransformerClassBatch.batches), 1)
+        self.assertEqual(len(self.publisher.counters), 1)
+        self.assertEqual(len(self.new_publisher.counters), 1)
+
+    def _reload_pipeline_manager(self):
+        fd, cfg_file = tempfile.mkstemp()
+        self.addCleanup(os.unlink, cfg_file)
+        with os.fdopen(fd, 'w') as f:
+            f.write(yaml.safe_dump(self.pipeline_cfg))
+        pipeline_manager = pipeline.PipelineManager(
+            copy.deepcopy(self.pipeline_cfg),
+            self.transformer_manager,
+            self.publisher_manager,
+            cfg_file)
+        return pipeline_manager
+
+    def _write_pipeline_cfg(self, pipeline_manager, data):
+        with open(pipeline_manager.cfg_file, 'w') as f:
+            f.write(data)
+        # Make sure the modification is seen whatever the mtime resolution
+        pipeline_manager.cfg_mtime = None
+
+    def test_reload_unmodified(self):
+        pipeline_manager = self._reload_pipeline_manager()
+        pipelines = pipeline_manager.pipelines
+        self.assertFalse(pipeline_manager.reload(None, None))
+        self.assertEqual(pipeline_manager.pipelines, pipelines)
+
+    def test_reload_incremental(self):
+        self.pipeline_cfg.append({
+            'name': 'second_pipeline',
+            'interval': 5,
+            'counters': ['b'],
+            'transformers': [],
+            'publishers': ['new'],
+        })
+        pipeline_manager = self._reload_pipeline_manager()
+        first, second = pipeline_manager.pipelines
+        self.pipeline_cfg[1]['counters'] = ['a']
+        self._write_pipeline_cfg(pipeline_manager,
+                                 yaml.safe_dump(self.pipeline_cfg))
+
+        self.assertTrue(pipeline_manager.reload(None, None))
+        self.assertTrue(pipeline_manager.pipelines[0] is first)
+        self.assertFalse(pipeline_manager.pipelines[1] is second)
+        with pipeline_manager.publisher(None, None) as p:
+            p([self.test_counter])
+        self.assertEqual(len(self.publisher.counters), 1)
+        self.assertEqual(len(self.new_publisher.counters), 1)
+
+    def test_reload_unchanged_definition(self):
+        pipeline_manager = self._reload_pipeline_manager()
+        pipelines = pipeline_manager.pipelines
+        self._write_pipeline_cfg(pipeline_manager,
+                                 yaml.safe_dump(self.pipeline_cfg))
+        self.assertFalse(pipeline_manager.reload(None, None))
+        self.assertEqual(pipeline_manager.pipelines, pipelines)
+
+    def test_reload_invalid(self):
+        pipeline_manager = self._reload_pipeline_manager()
+        pipelines = pipeline_manager.pipelines
+        del self.pipeline_cfg[0]['publishers']
+        self._write_pipeline_cfg(pipeline_manager,
+                                 yaml.safe_dump(self.pipeline_cfg))
+        self.assertFalse(pipeline_manager.reload(None, None))
+        self.assertEqual(pipeline_manager.pipelines, pipelines)
+
+    def test_reload_flush_removed(self):
+        self.pipeline_cfg[0]['transformers'] = [{
+            'name': 'bounded',
+            'parameters': {'size': 10, 'max_age': 10},
+        }]
+        pipeline_manager = self._reload_pipeline_manager()
+        self.pipeline_cfg[0]['transformers'] = []
+        self._write_pipeline_cfg(pipeline_manager,
+                                 yaml.safe_dump(self.pipeline_cfg))
+        timeutils.set_time_override()
+        try:
+            with pipeline_manager.publisher(None, None) as p:
+                p([self.test_counter])
+            self.assertEqual(len(self.publisher.counters), 0)
+            timeutils.advance_time_seconds(11)
+            self.assertTrue(pipeline_manager.reload(None, None))
+        finally:
+            timeutils.clear_time_override()
+        self.assertEqual(len(self.publisher.counters), 1)
+
+    def test_publish_coalesced(self):
+        self.pipeline_cfg[0]['counters'] = ['a', 'b']
+        self.pipeline_cfg.append(copy.deepcopy(self.pipeline_cfg[0]))
+        self.pipeline_cfg[1]['name'] = 'second_pipeline'
+        self.pipeline_cfg[1]['transformers'] = []
+        pipeline_manager = pipeline.PipelineManager(self.pipeline_cfg,
+                                                    self.transformer_manager,
+                                                    self.publisher_manager)
+        with pipeline_manager.publisher(None, None) as p:
+            p([self.test_counter, self.test_counter._replace(name='b')])
+            p([self.test_counter])
+            self.assertEqual(self.publisher.calls, 0)
+        self.assertEqual(self.publisher.calls, 1)
+        self.assertEqual(sorted(c.name for c in self.publisher.counters),
+                         ['a', 'a', 'a_update', 'a_update', 'b', 'b_update'])
+
+    def test_publish_coalesce_max_counters(self):
+        cfg.CONF.set_override('publish_coalesce_max_counters', 2)
+        self.addCleanup(cfg.CONF.clear_override,
+                        'publish_coalesce_max_counters')
+        pipeline_manager = pipeline.PipelineManager(self.pipeline_cfg,
+                                                    self.transformer_manager,
+                                                    self.publisher_manager)
+        with pipeline_manager.publisher(None, None) as p:
+            p([self.test_counter] * 3)
+            self.assertEqual(len(self.publisher.counters), 2)
+        self.assertEqual(self.publisher.calls, 2)
+        self.assertEqual(len(self.publisher.counters), 3)
+
+    def test_publish_coalesce_across_cycles(self):
+        cfg.CONF.set_override('publish_coalesce_max_latency', 10)
+        self.addCleanup(cfg.CONF.clear_override,
+                        'publish_coalesce_max_latency')
+        pipeline_manager = pipeline.PipelineManager(self.pipeline_cfg,
+                                                    self.transformer_manager,
+                                                    self.publisher_manager)
+        self.assertEqual(pipeline_manager.get_flush_interval(), 10)
+        timeutils.set_time_override()
+        try:
+            for i in range(2):
+                with pipeline_manager.publisher(None, None) as p:
+                    p([self.test_counter])
+            pipeline_manager.flush(None, None)
+            self.assertEqual(self.publisher.calls, 0)
+            timeutils.advance_time_seconds(11)
+            pipeline_manager.flush(None, None)
+        finally:
+            timeutils.clear_time_override()
+        self.assertEqual(self.publisher.calls, 1)
+        self.assertEqual(len(self.publisher.counters), 2)
@@ -0,0 +1,118 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Tests for ceilometer/utils.py
+"""
+
+import datetime
+
+from ceilometer.openstack.common import timeutils
+from ceilometer.tests import base
+from ceilometer import utils
+
+
+class TestUtils(base.TestCase):
+
+    def test_partition_by(self):
+        items = [('b', 1), ('a', 2), ('b', 3), ('c', 4), ('a', 5)]
+        partitions = utils.partition_by(items, lambda x: x[0])
+        self.assertEqual(partitions,
+                         [('b', [('b', 1), ('b', 3)]),
+                          ('a', [('a', 2), ('a', 5)]),
+                          ('c', [('c', 4)])])
+
+    def test_partition_by_generator(self):
+        partitions = utils.partition_by((x for x in range(5)),
+                                        lambda x: x % 2)
+        self.assertEqual(partitions, [(0, [0, 2, 4]), (1, [1, 3])])
+
+    def test_partition_by_empty(self):
+        self.assertEqual(utils.partition_by([], lambda x: x), [])
+
+    def test_parse_timestamp(self):
+        expected = datetime.datetime(2012, 7, 2, 13, 53, 40)
+        for timestr in ('2012-07-02T13:53:40Z',
+                        '2012-07-02T13:53:40',
+                        '2012-07-02 13:53:40',
+                        '2012-07-02T15:53:40+02:00'):
+            self.assertEqual(utils.parse_timestamp(timestr), expected)
+        for timestr in ('2012-07-02T13:53:40.000042Z',
+                        '2012-07-02T13:53:40.000042',
+                        '2012-07-02T13:53:40.000042-00:00'):
+            self.assertEqual(utils.parse_timestamp(timestr),
+                             expected.replace(microsecond=42))
+
+    def test_parse_timestamp_cached_prefix(self):
+        utils.parse_timestamp('2012-07-02T13:53:40Z')
+        self.assertEqual(utils.parse_timestamp('2012-07-02T13:53:40.5Z'),
+                         datetime.datetime(2012, 7, 2, 13, 53, 40, 500000))
+
+    def test_parse_timestamp_invalid(self):
+        for timestr in ('2012-13-02T13:53:40Z',
+                        '2012-07-02T13:5a:40',
+                        'not a timestamp',
+                        None):
+            self.assertRaises(ValueError, utils.parse_timestamp, timestr)
+
+
+class TestBoundedCache(base.TestCase):
+
+    def setUp(self):
+        super(TestBoundedCache, self).setUp()
+        timeutils.set_time_override()
+
+    def tearDown(self):
+        timeutils.clear_time_override()
+        super(TestBoundedCache, self).tearDown()
+
+    def test_mapping(self):
+        cache = utils.BoundedCache(10)
+        cache['a'] = 1
+        self.assertEqual(cache['a'], 1)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('b'), None)
+        self.assertTrue('a' in cache)
+        self.assertEqual(len(cache), 1)
+        del cache['a']
+        self.assertFalse('a' in cache)
+
+    def test_evict_least_recently_updated(self):
+        cache = utils.BoundedCache(10)
+        for i in range(10):
+            cache[i] = i
+            timeutils.advance_time_seconds(1)
+        cache[0] = 0
+        cache[10] = 10
+        self.assertEqual(len(cache), 10)
+        self.assertTrue(0 in cache)
+        self.assertFalse(1 in cache)
+        self.assertTrue(10 in cache)
+
+    def test_expired_missing(self):
+        cache = utils.BoundedCache(4, ttl=60)
+        cache['a'] = 1
+        timeutils.advance_time_seconds(61)
+        self.assertEqual(cache.get('a'), None)
+        self.assertFalse('a' in cache)
+        self.assertRaises(KeyError, cache.__getitem__, 'a')
+        cache['a'] = 2
+        self.assertEqual(cache.get('a'), 2)
+
+    def test_evict_expired(self):
+        cache = utils.BoundedCache(4, ttl=60)
+        for i in range(3):
+            cache[i] = i
+        timeutils.advance_time_seconds(120)
+        cache[3] = 3
+        cache[4] = 4
+        self.assertEqual(sorted(cache._data.keys()), [3, 4])
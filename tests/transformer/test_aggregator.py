@@ -0,0 +1,121 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Tests for ceilometer/transformer/aggregator.py
+"""
+
+import datetime
+
+from ceilometer import counter
+from ceilometer.openstack.common import timeutils
+from ceilometer.tests import base
+from ceilometer.transformer import aggregator
+
+
+class TestAggregatorTransformer(base.TestCase):
+
+    test_counter = counter.Counter(
+        name='storage.api.request',
+        type=counter.TYPE_DELTA,
+        unit='request',
+        volume=1,
+        user_id='user',
+        project_id='project',
+        resource_id='resource',
+        timestamp=datetime.datetime.utcnow().isoformat(),
+        resource_metadata={'version': 'v1'},
+    )
+
+    def setUp(self):
+        super(TestAggregatorTransformer, self).setUp()
+        timeutils.set_time_override()
+
+    def tearDown(self):
+        timeutils.clear_time_override()
+        super(TestAggregatorTransformer, self).tearDown()
+
+    def _aggregate(self, method, volumes):
+        t = aggregator.AggregatorTransformer(window=60, method=method)
+        self.assertEqual(t.handle_samples(None, [
+            self.test_counter._replace(volume=v) for v in volumes
+        ], None), [])
+        self.assertEqual(t.flush(None, None), [])
+        timeutils.advance_time_seconds(61)
+        counters = t.flush(None, None)
+        self.assertEqual(len(counters), 1)
+        return counters[0].volume
+
+    def test_invalid_method(self):
+        self.assertRaises(ValueError, aggregator.AggregatorTransformer,
+                          method='invalid')
+
+    def test_sum(self):
+        self.assertEqual(self._aggregate('sum', [1, 2, 3]), 6)
+
+    def test_last(self):
+        self.assertEqual(self._aggregate('last', [1, 3, 2]), 2)
+
+    def test_max(self):
+        self.assertEqual(self._aggregate('max', [1, 3, 2]), 3)
+
+    def test_mean(self):
+        self.assertEqual(self._aggregate('mean', [1, 2, 6]), 3.0)
+
+    def test_groups(self):
+        t = aggregator.AggregatorTransformer(window=60)
+        t.handle_samples(None, [
+            self.test_counter,
+            self.test_counter._replace(resource_id='other'),
+            self.test_counter._replace(user_id='other'),
+            self.test_counter,
+        ], None)
+        timeutils.advance_time_seconds(61)
+        counters = t.flush(None, None)
+        self.assertEqual(sorted((c.resource_id, c.user_id, c.volume)
+                                for c in counters),
+                         [('other', 'user', 1),
+                          ('resource', 'other', 1),
+                          ('resource', 'user', 2)])
+
+    def test_metadata_change(self):
+        t = aggregator.AggregatorTransformer(window=60)
+        counters = t.handle_samples(None, [
+            self.test_counter,
+            self.test_counter,
+            self.test_counter._replace(resource_metadata={'version': 'v2'}),
+        ], None)
+        self.assertEqual(len(counters), 1)
+        self.assertEqual(counters[0].volume, 2)
+        self.assertEqual(counters[0].resource_metadata, {'version': 'v1'})
+        timeutils.advance_time_seconds(61)
+        counters = t.flush(None, None)
+        self.assertEqual(counters[0].volume, 1)
+        self.assertEqual(counters[0].resource_metadata, {'version': 'v2'})
+
+    def test_max_groups(self):
+        t = aggregator.AggregatorTransformer(window=60, max_groups=2)
+        counters = t.handle_samples(None, [
+            self.test_counter._replace(resource_id=str(i))
+            for i in range(3)
+        ], None)
+        self.assertEqual(len(counters), 3)
+        self.assertEqual(t.aggregates, {})
+
+    def test_handle_sample(self):
+        t = aggregator.AggregatorTransformer(window=60)
+        self.assertEqual(t.handle_sample(None, self.test_counter, None),
+                         None)
+        self.assertEqual(t.handle_sample(None, self.test_counter, None),
+                         None)
+        timeutils.advance_time_seconds(61)
+        self.assertEqual(t.flush(None, None)[0].volume, 2)
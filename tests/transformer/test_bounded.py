@@ -0,0 +1,89 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Tests for ceilometer/transformer/bounded.py
+"""
+
+import datetime
+
+from ceilometer import counter
+from ceilometer.openstack.common import timeutils
+from ceilometer.tests import base
+from ceilometer.transformer import bounded
+
+
+class TestBoundedAccumulator(base.TestCase):
+
+    test_counter = counter.Counter(
+        name='test',
+        type=counter.TYPE_GAUGE,
+        unit='',
+        volume=1,
+        user_id='test',
+        project_id='test',
+        resource_id='test_run_tasks',
+        timestamp=datetime.datetime.utcnow().isoformat(),
+        resource_metadata={'name': 'TestAccumulator'},
+    )
+
+    def setUp(self):
+        super(TestBoundedAccumulator, self).setUp()
+        timeutils.set_time_override()
+
+    def tearDown(self):
+        timeutils.clear_time_override()
+        super(TestBoundedAccumulator, self).tearDown()
+
+    def test_size_bound(self):
+        acc = bounded.BoundedAccumulator(size=3)
+        self.assertEqual(acc.handle_samples(None, [self.test_counter] * 2,
+                                            None), [])
+        self.assertEqual(acc.flush(None, None), [])
+        self.assertEqual(len(acc.handle_samples(None, [self.test_counter],
+                                                None)), 3)
+        self.assertEqual(acc.counters, [])
+
+    def test_age_bound(self):
+        acc = bounded.BoundedAccumulator(size=100, max_age=10)
+        self.assertEqual(acc.flush_interval, 5)
+        acc.handle_samples(None, [self.test_counter], None)
+        timeutils.advance_time_seconds(5)
+        acc.handle_samples(None, [self.test_counter], None)
+        self.assertEqual(acc.flush(None, None), [])
+        timeutils.advance_time_seconds(6)
+        self.assertEqual(len(acc.flush(None, None)), 2)
+        self.assertEqual(acc.flush(None, None), [])
+
+    def test_bytes_bound(self):
+        size = bounded.counter_size(self.test_counter)
+        acc = bounded.BoundedAccumulator(size=100, max_bytes=size * 2)
+        self.assertEqual(acc.handle_samples(None, [self.test_counter],
+                                            None), [])
+        self.assertEqual(acc.bytes, size)
+        self.assertEqual(len(acc.handle_samples(None, [self.test_counter],
+                                                None)), 2)
+        self.assertEqual(acc.bytes, 0)
+
+    def test_no_age_bound(self):
+        acc = bounded.BoundedAccumulator(size=100, max_age=None)
+        self.assertEqual(acc.flush_interval, None)
+        acc.handle_samples(None, [self.test_counter], None)
+        timeutils.advance_time_seconds(3600)
+        self.assertEqual(acc.flush(None, None), [])
+
+    def test_handle_sample(self):
+        acc = bounded.BoundedAccumulator(size=2)
+        self.assertEqual(acc.handle_sample(None, self.test_counter, None),
+                         None)
+        acc.handle_sample(None, self.test_counter, None)
+        self.assertEqual(len(acc.flush(None, None)), 2)
@@ -0,0 +1,74 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Tests for ceilometer/transformer/dedup.py
+"""
+
+from ceilometer import counter
+from ceilometer.openstack.common import timeutils
+from ceilometer.tests import base
+from ceilometer.transformer import dedup
+
+
+class TestDeduplicationTransformer(base.TestCase):
+
+    def setUp(self):
+        super(TestDeduplicationTransformer, self).setUp()
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+
+    def _counter(self, volume=1, resource_id='resource',
+                 type=counter.TYPE_GAUGE, metadata=None):
+        return counter.Counter(
+            name='memory',
+            type=type,
+            unit='MB',
+            volume=volume,
+            user_id='user',
+            project_id='project',
+            resource_id=resource_id,
+            timestamp=timeutils.utcnow().isoformat(),
+            resource_metadata=metadata or {'flavor': 'm1.tiny'},
+        )
+
+    def test_drop_unchanged(self):
+        t = dedup.DeduplicationTransformer()
+        counters = [self._counter(), self._counter(), self._counter(2),
+                    self._counter(2, resource_id='other')]
+        self.assertEqual(t.handle_samples(None, counters, None),
+                         [counters[0], counters[2], counters[3]])
+
+    def test_metadata_change(self):
+        t = dedup.DeduplicationTransformer()
+        self.assertTrue(t.handle_sample(None, self._counter(), None))
+        self.assertTrue(t.handle_sample(
+            None, self._counter(metadata={'flavor': 'm1.small'}), None))
+
+    def test_heartbeat(self):
+        t = dedup.DeduplicationTransformer(heartbeat=60)
+        self.assertTrue(t.handle_sample(None, self._counter(), None))
+        timeutils.advance_time_seconds(59)
+        self.assertEqual(t.handle_sample(None, self._counter(), None), None)
+        timeutils.advance_time_seconds(1)
+        self.assertTrue(t.handle_sample(None, self._counter(), None))
+
+    def test_not_gauge(self):
+        t = dedup.DeduplicationTransformer()
+        c = self._counter(type=counter.TYPE_CUMULATIVE)
+        self.assertEqual(t.handle_samples(None, [c, c], None), [c, c])
+
+    def test_bounded_state(self):
+        t = dedup.DeduplicationTransformer(max_resources=10)
+        for i in range(100):
+            t.handle_sample(None, self._counter(resource_id=str(i)), None)
+        self.assertTrue(len(t.state) <= 10)
@@ -0,0 +1,112 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Tests for ceilometer/transformer/rate.py
+"""
+
+import datetime
+
+from ceilometer import counter
+from ceilometer.openstack.common import timeutils
+from ceilometer.tests import base
+from ceilometer.transformer import rate
+
+
+class TestRateOfChangeTransformer(base.TestCase):
+
+    start = datetime.datetime(2013, 5, 1, 12, 0, 0)
+
+    def _counter(self, volume, seconds, resource_id='resource',
+                 name='cpu'):
+        timestamp = self.start + datetime.timedelta(seconds=seconds)
+        return counter.Counter(
+            name=name,
+            type=counter.TYPE_CUMULATIVE,
+            unit='ns',
+            volume=volume,
+            user_id='user',
+            project_id='project',
+            resource_id=resource_id,
+            timestamp=timestamp.isoformat() + 'Z',
+            resource_metadata={},
+        )
+
+    def test_rate(self):
+        t = rate.RateOfChangeTransformer()
+        self.assertEqual(t.handle_sample(None, self._counter(100, 0), None),
+                         None)
+        c = t.handle_sample(None, self._counter(400, 60), None)
+        self.assertEqual(c.name, 'cpu.rate')
+        self.assertEqual(c.unit, 'ns/s')
+        self.assertEqual(c.type, counter.TYPE_GAUGE)
+        self.assertEqual(c.volume, 5.0)
+
+    def test_rate_scale_and_name(self):
+        t = rate.RateOfChangeTransformer(target_name='cpu_util',
+                                         target_unit='%', scale=100.0)
+        t.handle_sample(None, self._counter(0, 0), None)
+        c = t.handle_sample(None, self._counter(30, 60), None)
+        self.assertEqual(c.name, 'cpu_util')
+        self.assertEqual(c.unit, '%')
+        self.assertEqual(c.volume, 50.0)
+
+    def test_counter_reset(self):
+        t = rate.RateOfChangeTransformer()
+        t.handle_sample(None, self._counter(1000, 0), None)
+        c = t.handle_sample(None, self._counter(120, 60), None)
+        self.assertEqual(c.volume, 2.0)
+
+    def test_no_elapsed_time(self):
+        t = rate.RateOfChangeTransformer()
+        t.handle_sample(None, self._counter(0, 0), None)
+        self.assertEqual(t.handle_sample(None, self._counter(10, 0), None),
+                         None)
+
+    def test_handle_samples_per_resource(self):
+        t = rate.RateOfChangeTransformer()
+        self.assertEqual(t.handle_samples(None, [
+            self._counter(0, 0, 'a'),
+            self._counter(0, 0, 'b'),
+            self._counter(0, 0, 'a', name='disk.read.bytes'),
+        ], None), [])
+        rates = t.handle_samples(None, [
+            self._counter(60, 60, 'a'),
+            self._counter(120, 60, 'b'),
+            self._counter(180, 60, 'a', name='disk.read.bytes'),
+        ], None)
+        self.assertEqual([(c.resource_id, c.name, c.volume) for c in rates],
+                         [('a', 'cpu.rate', 1.0),
+                          ('b', 'cpu.rate', 2.0),
+                          ('a', 'disk.read.bytes.rate', 3.0)])
+
+    def test_handle_samples_invalid_timestamp(self):
+        t = rate.RateOfChangeTransformer()
+        self.assertEqual(t.handle_samples(None, [
+            self._counter(0, 0)._replace(timestamp='invalid'),
+        ], None), [])
+
+    def test_state_expired(self):
+        t = rate.RateOfChangeTransformer(ttl=60)
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+        t.handle_sample(None, self._counter(0, 0), None)
+        timeutils.advance_time_seconds(120)
+        # No rate across the gap
+        self.assertEqual(t.handle_sample(None, self._counter(60, 120), None),
+                         None)
+
+    def test_state_bounded(self):
+        t = rate.RateOfChangeTransformer(max_resources=10)
+        for i in range(100):
+            t.handle_sample(None, self._counter(0, 0, str(i)), None)
+        self.assertTrue(len(t.state) <= 10)